@@ -2,6 +2,8 @@ import { systemPrompt } from "@/lib/prompts/systemprompt";
 import { getCleanCode } from "@/lib/utils";
 import axios from "axios";
 import { NextRequest, NextResponse } from "next/server";
+import { getServerSession } from "next-auth";
+import { authOptions } from "@/lib/auth";
 import OpenAI from 'openai';
 import prisma  from "@/db";
 
@@ -10,21 +12,65 @@ const openai = new OpenAI({
   baseURL: 'https://integrate.api.nvidia.com/v1',
 })
 
-async function generateVideo(code: string, conversationId: string) {
+const JOB_POLL_INTERVAL_MS = 1000;
+const TERMINAL_JOB_STATES = ["done", "failed", "cancelled"];
+const VIDEO_QUALITY = "medium";
+
+async function waitForJob(jobId: string) {
+    const SANDBOX_URL = process.env.SANDBOX_URL || "http://localhost:8000";
+
+    let job = (await axios.get(`${SANDBOX_URL}/jobs/${jobId}`)).data;
+    while (!TERMINAL_JOB_STATES.includes(job.status)) {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        job = (await axios.get(`${SANDBOX_URL}/jobs/${jobId}`)).data;
+    }
+    return job;
+}
+
+async function generateVideo(code: string, conversationId: string, userId?: string) {
     console.log("🎬 Sending clean code to sandbox:");
     console.log("=".repeat(50));
     console.log(code);
     console.log("=".repeat(50));
     
     const SANDBOX_URL = process.env.SANDBOX_URL || "http://localhost:8000";
-    const video = await axios.post(`${SANDBOX_URL}/run-manim`, {
+
+    // Submit a render job and poll it, so no single request has to stay
+    // open for the whole render and upload. In preview mode the job finishes
+    // with a quick draft and the full-quality render follows as another job.
+    const submitted = await axios.post(`${SANDBOX_URL}/jobs`, {
         code: code,
-        conversationId: conversationId
+        conversationId: conversationId,
+        // Render slots are shared fairly between users
+        user_id: userId,
+        quality: VIDEO_QUALITY,
+        preview: true
     });
+    const jobId = submitted.data.job_id;
+    console.log("🎬 Render job queued:", jobId);
+
+    const job = await waitForJob(jobId);
+    console.log(`🎬 Render job ${jobId} finished with status: ${job.status}`);
 
     // Format S3 URL if needed
-    const s3Url = video.data.video_urls?.[0] || video.data.thumbnailUrl;
-    return { ...video, data: { ...video.data, s3Url } };
+    const result = job.result || {};
+    const s3Url = result.video_urls?.[0] || result.video_url;
+    return { data: { ...result, s3Url } };
+}
+
+// Swap the draft for the full-quality video once its follow-up job is done
+async function replaceWithFinalVideo(videoId: string, followupJobId: string) {
+    const job = await waitForJob(followupJobId);
+    const finalUrl = job.result?.video_urls?.[0];
+    if (job.status !== "done" || !finalUrl) {
+        console.log(`🎬 Final render ${followupJobId} ended with status ${job.status}, keeping the draft`);
+        return;
+    }
+    await prisma.video.update({
+        where: { id: videoId },
+        data: { thumbnailUrl: finalUrl }
+    });
+    console.log("🎬 Final video ready:", finalUrl);
 }
 
 
@@ -110,9 +156,10 @@ export async function POST(req: NextRequest) {
         console.log("=".repeat(40));
 
         // Generate video with clean code only
-        const video = await generateVideo(cleanCode, conversationId);
+        const session = await getServerSession(authOptions);
+        const video = await generateVideo(cleanCode, conversationId, session?.user?.id);
 
-        await prisma.video.create({
+        const videoRecord = await prisma.video.create({
             data: {
                 thumbnailUrl: video.data.s3Url,
                 message: {
@@ -123,6 +170,12 @@ export async function POST(req: NextRequest) {
             }
         });
 
+        if (video.data.followup_job_id) {
+            replaceWithFinalVideo(videoRecord.id, video.data.followup_job_id).catch((error) => {
+                console.error("❌ Error waiting for the final video:", error);
+            });
+        }
+
         console.log("🔍 Video URL:", video.data.s3Url);
         return NextResponse.json({ 
             message: response, 
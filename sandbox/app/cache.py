@@ -0,0 +1,112 @@
+import ast
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Finished renders kept in the result cache, and for how long
+RENDER_CACHE_MAX_ENTRIES = int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "1000"))
+RENDER_CACHE_TTL_SECONDS = int(os.getenv("RENDER_CACHE_TTL_SECONDS", "86400"))
+
+
+def normalize_code(code: str, tree: ast.AST = None) -> str:
+    """
+    Canonical form of Python source for cache keys
+
+    Two programs that differ only in comments, blank lines, indentation style
+    or line breaks inside brackets produce the same AST dump. Code that does
+    not parse is used verbatim, minus surrounding whitespace. ``tree`` is the
+    code's AST, if the caller has parsed it already.
+    """
+    if tree is not None:
+        return ast.dump(tree)
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        return code.strip()
+
+
+def code_digest(code: str, tree: ast.AST = None) -> str:
+    """Hash of the normalized code, which stands for the code in cache keys"""
+    return hashlib.sha256(normalize_code(code, tree).encode()).hexdigest()
+
+
+def render_cache_key(code: str, settings: Dict[str, Any], digest: str = None) -> str:
+    """
+    Hash normalized code together with the settings that affect the rendered output
+
+    A ``digest`` of the code taken earlier (see ``code_digest``) saves parsing it again.
+    """
+    key = hashlib.sha256()
+    key.update((digest or code_digest(code)).encode())
+    key.update(b"\0")
+    key.update(json.dumps(settings, sort_keys=True).encode())
+    return key.hexdigest()
+
+
+class RenderCache:
+    """
+    Thread-safe LRU cache of finished renders, keyed by ``render_cache_key``
+
+    Values are the stored video URLs and metadata of a successful render.
+    Entries expire ``ttl_seconds`` after they were stored, and the least
+    recently used entry is evicted once ``max_entries`` is exceeded.
+    """
+
+    def __init__(self, max_entries: int = RENDER_CACHE_MAX_ENTRIES, ttl_seconds: int = RENDER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached value, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry['stored_at'] > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry['value'])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = {'value': copy.deepcopy(value), 'stored_at': time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+render_cache = RenderCache()
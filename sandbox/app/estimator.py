@@ -0,0 +1,206 @@
+"""
+Predict how long a Manim render will take before it runs.
+
+The prediction is a linear model over what ``preflight.check`` finds in the
+code, at the quality it is rendered in:
+
+- megapixel-frames to draw, for 2D and 3D scenes separately, as the 3D
+  renderer is far slower per frame
+- partial movies to encode, one per ``play`` and ``wait``
+- LaTeX and Pango text objects to typeset
+- a fixed overhead per job
+
+It starts from hand-picked coefficients. Every successful render is recorded
+with the time it actually took, and once ``ESTIMATOR_MIN_SAMPLES`` renders
+are known the coefficients are refitted to them. Recorded timings are
+appended to ``ESTIMATOR_HISTORY_FILE``, so calibration survives a restart.
+"""
+import json
+import os
+import statistics
+import tempfile
+import threading
+from collections import deque
+from typing import Any, Dict
+
+from worker import QUALITY_PRESETS
+
+# Timings of past renders; an empty path keeps them in memory only
+ESTIMATOR_HISTORY_FILE = os.getenv(
+    "ESTIMATOR_HISTORY_FILE", os.path.join(tempfile.gettempdir(), "manim-render-timings.jsonl")
+)
+# Renders the coefficients are fitted to, and how many it takes before they are
+ESTIMATOR_MAX_SAMPLES = int(os.getenv("ESTIMATOR_MAX_SAMPLES", "500"))
+ESTIMATOR_MIN_SAMPLES = int(os.getenv("ESTIMATOR_MIN_SAMPLES", "20"))
+
+# Seconds per unit of each feature before any render has been timed
+PRIOR_COEFFICIENTS = {
+    'overhead': 2.0,
+    'frames_2d': 0.015,
+    'frames_3d': 0.08,
+    'plays': 0.3,
+    'tex': 1.0,
+    'text': 0.2,
+}
+FEATURES = tuple(PRIOR_COEFFICIENTS)
+
+
+def feature_vector(features: Dict[str, Any], quality: str, parallel: int = 1) -> Dict[str, float]:
+    """
+    Model inputs for code with ``preflight`` ``features`` rendered at ``quality``
+
+    Args:
+        features (dict): ``features`` of a ``preflight.check`` report
+        quality (str): A ``QUALITY_PRESETS`` tier
+        parallel (int): Processes the frames are split between (scenes or segments)
+    """
+    preset = QUALITY_PRESETS[quality]
+    megapixel_frames = preset['frame_rate'] * preset['pixel_width'] * preset['pixel_height'] / 1e6
+    seconds_3d = features['animation_seconds_3d']
+    seconds_2d = features['animation_seconds'] - seconds_3d
+    parallel = max(1, parallel)
+    return {
+        'overhead': 1.0,
+        'frames_2d': seconds_2d * megapixel_frames / parallel,
+        'frames_3d': seconds_3d * megapixel_frames / parallel,
+        'plays': features['plays'] / parallel,
+        'tex': features['tex'],
+        'text': features['text'],
+    }
+
+
+class RenderEstimator:
+    """
+    Thread-safe render time model, calibrated from the renders it is told about
+    """
+
+    def __init__(
+        self,
+        history_file: str = ESTIMATOR_HISTORY_FILE,
+        max_samples: int = ESTIMATOR_MAX_SAMPLES,
+        min_samples: int = ESTIMATOR_MIN_SAMPLES
+    ):
+        self.history_file = history_file
+        self.min_samples = max(1, min_samples)
+        self.coefficients = dict(PRIOR_COEFFICIENTS)
+        self.calibrated = False
+        self._samples = deque(maxlen=max(1, max_samples))
+        # Relative error of the predictions made for recorded renders
+        self._errors = deque(maxlen=max(1, max_samples))
+        self._lock = threading.Lock()
+        self._load()
+
+    def estimate(self, features: Dict[str, Any], quality: str, parallel: int = 1) -> Dict[str, Any]:
+        """
+        Predict the render time of code with ``preflight`` ``features``
+
+        Returns:
+            dict: ``seconds`` predicted, whether the model is ``calibrated``
+            yet, and the ``vector`` of inputs to pass back to ``record``
+        """
+        vector = feature_vector(features, quality, parallel)
+        with self._lock:
+            seconds = sum(self.coefficients[name] * vector[name] for name in FEATURES)
+            calibrated = self.calibrated
+        return {'seconds': round(seconds, 3), 'calibrated': calibrated, 'vector': vector}
+
+    def record(self, vector: Dict[str, float], seconds: float, predicted: float = None) -> None:
+        """
+        Add the time a render took and refit the coefficients
+
+        Args:
+            vector (dict): ``vector`` of the render's estimate
+            seconds (float): Time the render actually took
+            predicted (float): Seconds that were predicted, to track the error
+        """
+        if seconds <= 0:
+            return
+        sample = {'vector': {name: vector[name] for name in FEATURES}, 'seconds': seconds}
+        with self._lock:
+            self._samples.append(sample)
+            if predicted is not None:
+                self._errors.append(abs(predicted - seconds) / seconds)
+            self._fit()
+        if self.history_file:
+            try:
+                with open(self.history_file, "a") as f:
+                    f.write(json.dumps(sample) + "\n")
+            except OSError as e:
+                print(f"⚠️  Could not record render timing: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'samples': len(self._samples),
+                'calibrated': self.calibrated,
+                'coefficients': {name: round(value, 5) for name, value in self.coefficients.items()},
+                'mean_error': round(statistics.fmean(self._errors), 3) if self._errors else None
+            }
+
+    def _fit(self) -> None:
+        if len(self._samples) < self.min_samples:
+            return
+        rows = [[sample['vector'][name] for name in FEATURES] for sample in self._samples]
+        actual = [sample['seconds'] for sample in self._samples]
+        try:
+            from scipy.optimize import nnls
+        except ImportError:
+            nnls = None
+
+        if nnls is not None:
+            # Rows are divided by the actual time, so every render counts for
+            # its relative error rather than long ones drowning out short ones
+            weighted = [[value / seconds for value in row] for row, seconds in zip(rows, actual)]
+            try:
+                solution, _ = nnls(weighted, [1.0] * len(rows))
+            except (ValueError, RuntimeError) as e:
+                print(f"⚠️  Could not fit the render time model: {e}")
+                return
+            # Coefficients without data to fit them to keep their prior value
+            seen = [any(row[i] for row in rows) for i in range(len(FEATURES))]
+            self.coefficients = {
+                name: float(solution[i]) if seen[i] else PRIOR_COEFFICIENTS[name]
+                for i, name in enumerate(FEATURES)
+            }
+        else:
+            # Without SciPy the prior model is only scaled to match
+            prior = [sum(PRIOR_COEFFICIENTS[name] * value for name, value in zip(FEATURES, row)) for row in rows]
+            scale = statistics.median(seconds / predicted for seconds, predicted in zip(actual, prior))
+            self.coefficients = {name: value * scale for name, value in PRIOR_COEFFICIENTS.items()}
+        self.calibrated = True
+
+    def _load(self) -> None:
+        if not self.history_file or not os.path.exists(self.history_file):
+            return
+        lines = []
+        try:
+            with open(self.history_file) as f:
+                lines = f.readlines()
+        except OSError as e:
+            print(f"⚠️  Could not read render timings: {e}")
+            return
+        for line in lines[-self._samples.maxlen:]:
+            try:
+                sample = json.loads(line)
+                if all(name in sample['vector'] for name in FEATURES):
+                    self._samples.append(sample)
+            except (ValueError, KeyError, TypeError):
+                # Truncated by a crash mid-write, or from an older model
+                continue
+        if len(lines) > 2 * self._samples.maxlen:
+            try:
+                self._compact()
+            except OSError as e:
+                print(f"⚠️  Could not compact render timings: {e}")
+        self._fit()
+
+    def _compact(self) -> None:
+        # Keep the file from growing without bound; only the newest samples are ever read
+        temp_path = self.history_file + ".tmp"
+        with open(temp_path, "w") as f:
+            for sample in self._samples:
+                f.write(json.dumps(sample) + "\n")
+        os.replace(temp_path, self.history_file)
+
+
+render_estimator = RenderEstimator()
@@ -0,0 +1,209 @@
+"""
+Shared, size-bounded caches of files Manim renders, named by content hash.
+
+Jobs run in fresh directories, so without help Manim regenerates everything on
+every request. Job processes seed their own scratch directories from a shared
+cache directory and publish what they had to render themselves (see
+``job_hooks.install_glyph_cache`` and ``job_hooks.install_partial_movie_cache``).
+
+Entries are published with an atomic rename and read by hard link or copy, so
+any number of concurrent workers can share a directory. The server keeps each
+cache under a size limit by evicting the least recently used files.
+"""
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict
+
+# Shared glyph directory and its size limit; an empty directory or a limit of 0 disables the cache
+GLYPH_CACHE_DIR = os.getenv("GLYPH_CACHE_DIR", os.path.join(tempfile.gettempdir(), "manim-glyph-cache"))
+GLYPH_CACHE_MAX_MB = int(os.getenv("GLYPH_CACHE_MAX_MB", "512"))
+
+# Shared partial movie directory (one animation per file) and its size limit
+PARTIAL_MOVIE_CACHE_DIR = os.getenv(
+    "PARTIAL_MOVIE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "manim-partial-movies")
+)
+PARTIAL_MOVIE_CACHE_MAX_MB = int(os.getenv("PARTIAL_MOVIE_CACHE_MAX_MB", "2048"))
+
+# "conversation" keeps partial movies per conversation (global for requests
+# without one); "global" shares them between everyone rendering the same animation
+PARTIAL_MOVIE_CACHE_SCOPE = os.getenv("PARTIAL_MOVIE_CACHE_SCOPE", "conversation")
+
+INCOMING_PREFIX = ".incoming-"
+
+
+def fetch(cache_dir: str, name: str, dest_path: str) -> bool:
+    """
+    Hard link (or copy) a cached file to ``dest_path``
+
+    Returns:
+        bool: True on a hit; False if the file is not cached (or was evicted meanwhile)
+    """
+    path = os.path.join(cache_dir, name)
+    try:
+        try:
+            os.link(path, dest_path)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # Another filesystem, or links not supported
+            shutil.copyfile(path, dest_path)
+        # The modification time is the recency used for LRU eviction
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def store(cache_dir: str, name: str, source_path: str) -> None:
+    """Publish a freshly rendered file; concurrent writers of the same file are harmless"""
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, prefix=INCOMING_PREFIX)
+    try:
+        with os.fdopen(fd, "wb") as dest, open(source_path, "rb") as source:
+            shutil.copyfileobj(source, dest)
+        # mkstemp creates the file private to this user
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, os.path.join(cache_dir, name))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class SharedFileCache:
+    """
+    Server-side view of a shared cache directory
+
+    Jobs read and write the directory themselves; the server adds up the hits
+    and misses they report and evicts the least recently used files once the
+    directory grows past ``max_mb``. The number and size of the files are
+    counted while sweeping, so ``stats`` never walks the directory; a first
+    sweep in the background counts what earlier runs left.
+    """
+
+    def __init__(self, cache_dir: str, max_mb: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Files in the directory and their total size, as of the last sweep
+        self.entries = 0
+        self.size = 0
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+            threading.Thread(target=self.sweep, name="file-cache-sweep", daemon=True).start()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.cache_dir) and self.max_bytes > 0
+
+    def record(self, hits: int, misses: int) -> None:
+        """Count the lookups a finished job reported, and make room for what it added"""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        if misses:
+            self.sweep()
+
+    def sweep(self) -> int:
+        """
+        Delete the least recently used files until the directory fits in ``max_mb``
+
+        Only one process sweeps at a time; others skip rather than wait. The
+        files that are left are counted for ``stats``.
+
+        Returns:
+            int: Number of files deleted
+        """
+        if not self.enabled:
+            return 0
+        with open(os.path.join(self.cache_dir, ".sweep.lock"), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+            entries = []
+            total = 0
+            stale_before = time.time() - 3600
+            for path, name in self._files():
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                # Leftovers of writers that died between create and rename
+                if name.startswith(INCOMING_PREFIX):
+                    if stat.st_mtime < stale_before:
+                        self._remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            removed = 0
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if self._remove(path):
+                    removed += 1
+                total -= size
+
+        with self._lock:
+            self.evictions += removed
+            self.entries = len(entries) - removed
+            self.size = total
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Lookup totals, and the files in the cache as of the last sweep"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'directory': self.cache_dir,
+                'entries': self.entries,
+                'size_mb': round(self.size / (1024 * 1024), 2),
+                'max_mb': self.max_bytes // (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def _files(self):
+        for root, dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if name != ".sweep.lock":
+                    yield os.path.join(root, name), name
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+def partial_movie_scope_dir(conversation_id: str, quality: str, encoder_profile: str) -> str:
+    """
+    Directory the partial movies of a conversation (or of everyone) are
+    shared in, for one quality tier and encoder profile
+    """
+    if PARTIAL_MOVIE_CACHE_SCOPE == "conversation" and conversation_id:
+        # Conversation ids come from clients; never use them as a path verbatim
+        scope = "conversation-" + hashlib.sha256(conversation_id.encode()).hexdigest()[:32]
+    else:
+        scope = "global"
+    return os.path.join(PARTIAL_MOVIE_CACHE_DIR, scope, quality, encoder_profile)
+
+
+glyph_cache = SharedFileCache(GLYPH_CACHE_DIR, GLYPH_CACHE_MAX_MB)
+partial_movie_cache = SharedFileCache(PARTIAL_MOVIE_CACHE_DIR, PARTIAL_MOVIE_CACHE_MAX_MB)
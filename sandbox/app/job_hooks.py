@@ -0,0 +1,409 @@
+"""
+Hooks that run inside a job process.
+
+The render code injected by ``CodeExecutor.execute_manim_code`` imports this
+module and installs the hooks before rendering. Hooks report progress by
+appending JSON lines to ``job_events.jsonl`` in the job directory (``JOB_DIR``,
+set by the runner), which the server reads back with ``read_events``.
+"""
+import json
+import os
+import time
+from queue import Queue
+from threading import Thread
+from typing import Any, Dict, List
+
+EVENTS_FILE = "job_events.jsonl"
+
+_first_frame_seen = False
+
+
+def record_event(name: str, **data) -> None:
+    """Append an event with a wall-clock timestamp to the job's event log"""
+    event = {'event': name, 'time': time.time()}
+    event.update(data)
+    # Pool workers import this module before any job exists, so the path is
+    # looked up per call rather than at import time
+    path = os.path.join(os.environ.get("JOB_DIR", os.getcwd()), EVENTS_FILE)
+    with open(path, "a") as f:
+        f.write(json.dumps(event) + "\n")
+
+
+def install_manim_hooks() -> None:
+    """
+    Patch Manim so the job reports its first frame, each finished partial
+    movie (one per animation, in play order) and when encoding starts
+    """
+    from manim.scene.scene_file_writer import SceneFileWriter
+
+    original_write_frame = SceneFileWriter.write_frame
+    original_end_animation = SceneFileWriter.end_animation
+    original_combine_to_movie = SceneFileWriter.combine_to_movie
+
+    def write_frame(self, *args, **kwargs):
+        global _first_frame_seen
+        if not _first_frame_seen:
+            _first_frame_seen = True
+            record_event("first_frame")
+        return original_write_frame(self, *args, **kwargs)
+
+    def end_animation(self, allow_write=False):
+        result = original_end_animation(self, allow_write)
+        # None for animations skipped by from_animation_number; reused ones exist already
+        path = self.partial_movie_files[-1] if getattr(self, 'partial_movie_files', None) else None
+        if path and os.path.exists(path):
+            record_event("partial_movie_ready", path=str(path))
+        return result
+
+    def combine_to_movie(self, *args, **kwargs):
+        record_event("encoding")
+        return original_combine_to_movie(self, *args, **kwargs)
+
+    SceneFileWriter.write_frame = write_frame
+    SceneFileWriter.end_animation = end_animation
+    SceneFileWriter.combine_to_movie = combine_to_movie
+
+
+def install_glyph_cache(cache_dir: str) -> None:
+    """
+    Serve Tex and Text SVGs from the shared glyph cache
+
+    Before Manim renders a glyph into the job's own Tex/text directory, a
+    cached copy is put where Manim looks for it, so Manim finds it already
+    rendered. Glyphs Manim had to render itself are published to the cache.
+    Each lookup is recorded as a ``glyph_cache`` event.
+    """
+    import file_cache
+    from manim import config
+    from manim.mobject.text import tex_mobject, text_mobject
+    from manim.utils import tex_file_writing
+
+    tex_cache = os.path.join(cache_dir, 'tex')
+    text_cache = os.path.join(cache_dir, 'text')
+    original_tex_to_svg_file = tex_file_writing.tex_to_svg_file
+
+    def tex_to_svg_file(expression, environment=None, tex_template=None):
+        # The .tex file is named after a hash of the full document
+        tex_file = tex_file_writing.generate_tex_file(expression, environment, tex_template)
+        svg_file = tex_file.with_suffix(".svg")
+        if not svg_file.exists():
+            hit = file_cache.fetch(tex_cache, svg_file.name, str(svg_file))
+            record_event("glyph_cache", kind='tex', hit=hit)
+            if not hit:
+                svg_file = original_tex_to_svg_file(expression, environment, tex_template)
+                file_cache.store(tex_cache, svg_file.name, str(svg_file))
+                return svg_file
+        return original_tex_to_svg_file(expression, environment, tex_template)
+
+    def cached_text2svg(original_text2svg):
+        def _text2svg(self, color):
+            text_dir = config.get_dir("text_dir")
+            text_dir.mkdir(parents=True, exist_ok=True)
+            name = self._text2hash(color) + ".svg"
+            local_path = text_dir / name
+            if not local_path.exists():
+                hit = file_cache.fetch(text_cache, name, str(local_path))
+                record_event("glyph_cache", kind='text', hit=hit)
+                if not hit:
+                    svg_file = original_text2svg(self, color)
+                    file_cache.store(text_cache, name, svg_file)
+                    return svg_file
+            return original_text2svg(self, color)
+        return _text2svg
+
+    tex_file_writing.tex_to_svg_file = tex_to_svg_file
+    tex_mobject.tex_to_svg_file = tex_to_svg_file
+    text_mobject.Text._text2svg = cached_text2svg(text_mobject.Text._text2svg)
+    text_mobject.MarkupText._text2svg = cached_text2svg(text_mobject.MarkupText._text2svg)
+
+
+def install_partial_movie_cache(cache_dir: str) -> None:
+    """
+    Reuse partial movies (one per animation) from the shared cache
+
+    With caching enabled Manim names each animation's partial movie after a
+    hash of the animation and the scene state, and skips rendering it when the
+    file already exists. Before Manim checks, a cached copy is put in the
+    job's partial movie directory; animations Manim had to render are
+    published to the cache once their file is complete. Each check is recorded
+    as a ``partial_movie`` event.
+    """
+    import file_cache
+    from manim import config
+    from manim.scene.scene_file_writer import SceneFileWriter
+
+    original_is_already_cached = SceneFileWriter.is_already_cached
+    original_end_animation = SceneFileWriter.end_animation
+
+    def is_already_cached(self, hash_invocation):
+        directory = getattr(self, 'partial_movie_directory', None)
+        if directory is None or not config.write_to_movie:
+            return original_is_already_cached(self, hash_invocation)
+        name = f"{hash_invocation}{config['movie_file_extension']}"
+        local_path = os.path.join(directory, name)
+        if not os.path.exists(local_path):
+            file_cache.fetch(cache_dir, name, local_path)
+        cached = original_is_already_cached(self, hash_invocation)
+        record_event("partial_movie", reused=cached)
+        return cached
+
+    def end_animation(self, allow_write=False):
+        result = original_end_animation(self, allow_write)
+        path = getattr(self, 'partial_movie_file_path', None)
+        # Manim writes the file in place; it is complete once the stream is closed
+        if allow_write and config.write_to_movie and path and not os.path.basename(path).startswith("uncached_"):
+            file_cache.store(cache_dir, os.path.basename(path), path)
+        return result
+
+    SceneFileWriter.is_already_cached = is_already_cached
+    SceneFileWriter.end_animation = end_animation
+
+
+def install_encoder_profile(profile: Dict[str, Any]) -> None:
+    """
+    Encode partial movies with the codec, preset, CRF and thread count of
+    ``profile`` instead of Manim's fixed libx264 at CRF 23
+
+    Time spent in the encoder is recorded as an ``encoded`` event per
+    partial movie. Transparent and WebM output keep Manim's own settings.
+    """
+    import av
+    from manim import config
+    from manim.scene.scene_file_writer import SceneFileWriter, to_av_frame_rate
+
+    original_open = SceneFileWriter.open_partial_movie_stream
+    original_close = SceneFileWriter.close_partial_movie_stream
+
+    def open_partial_movie_stream(self, file_path=None):
+        if config.transparent or config.movie_file_extension != ".mp4":
+            return original_open(self, file_path)
+        # Same as Manim's own, apart from the encoder settings
+        if file_path is None:
+            file_path = self.partial_movie_files[self.renderer.num_plays]
+        self.partial_movie_file_path = file_path
+
+        video_container = av.open(file_path, mode="w")
+        options = {
+            "an": "1",
+            "preset": profile['preset'],
+            "crf": str(profile['crf']),
+            "threads": str(profile['threads'])
+        }
+        if profile['codec'] == "libx265":
+            # x265 logs every encode to stderr, which would end up in the job's errors
+            options["x265-params"] = "log-level=error"
+        stream = video_container.add_stream(profile['codec'], rate=to_av_frame_rate(config.frame_rate), options=options)
+        if profile['codec'] == "libx265":
+            # Players on Apple devices only accept HEVC in MP4 under this tag
+            stream.codec_tag = "hvc1"
+        stream.pix_fmt = "yuv420p"
+        stream.width = config.pixel_width
+        stream.height = config.pixel_height
+
+        self.video_container = video_container
+        self.video_stream = _TimedStream(stream)
+        self.queue = Queue()
+        self.writer_thread = Thread(target=self.listen_and_write, args=())
+        self.writer_thread.start()
+
+    def close_partial_movie_stream(self):
+        result = original_close(self)
+        if isinstance(self.video_stream, _TimedStream):
+            record_event("encoded", seconds=self.video_stream.seconds, frames=self.video_stream.frames)
+        return result
+
+    SceneFileWriter.open_partial_movie_stream = open_partial_movie_stream
+    SceneFileWriter.close_partial_movie_stream = close_partial_movie_stream
+
+
+class _TimedStream:
+    """Adds up the time a PyAV video stream spends encoding"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.seconds = 0.0
+        self.frames = 0
+
+    def encode(self, frame=None):
+        start = time.perf_counter()
+        packets = self._stream.encode(frame)
+        self.seconds += time.perf_counter() - start
+        if frame is not None:
+            self.frames += 1
+        return packets
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def track_plays(scene) -> None:
+    """
+    Record how long each ``play`` (and ``wait``) of ``scene`` runs
+
+    Once the scene has rendered, a ``plays`` event lists the durations in play
+    order, and the wall-clock ``seconds`` spent in them. Segment rendering uses
+    the durations to split a scene into parts of similar length.
+    """
+    durations = []
+    wall_seconds = []
+    original_play = scene.play
+    original_render = scene.render
+
+    def play(*args, **kwargs):
+        start = scene.renderer.time
+        started = time.perf_counter()
+        result = original_play(*args, **kwargs)
+        wall_seconds.append(time.perf_counter() - started)
+        durations.append(scene.renderer.time - start)
+        return result
+
+    def render(*args, **kwargs):
+        result = original_render(*args, **kwargs)
+        record_event("plays", durations=durations, seconds=sum(wall_seconds))
+        return result
+
+    scene.play = play
+    scene.render = render
+
+
+def capture_poster(scene, width: int, file_name: str = "poster.jpg") -> None:
+    """
+    Save the last frame of ``scene`` as a JPEG poster once it has rendered
+
+    The frame is drawn from the scene's final state into the camera's own
+    buffer, so nothing has to be decoded from the finished video. The poster
+    is scaled down to ``width`` and written to the job directory, and its
+    path is recorded as a ``poster`` event.
+    """
+    original_render = scene.render
+
+    def render(*args, **kwargs):
+        result = original_render(*args, **kwargs)
+        try:
+            renderer = scene.renderer
+            camera = getattr(renderer, 'camera', None)
+            if camera is not None and hasattr(camera, 'get_image'):
+                # Reused animations are never drawn, so the buffer may be behind
+                renderer.static_image = None
+                renderer.update_frame(scene, ignore_skipping=True)
+                image = camera.get_image()
+            else:
+                # OpenGL renderer
+                image = renderer.get_image()
+            image = image.convert("RGB")
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)))
+            path = os.path.join(os.environ.get("JOB_DIR", os.getcwd()), file_name)
+            image.save(path, format="JPEG", quality=80)
+            record_event("poster", path=path)
+        except Exception as e:
+            # A missing poster must not fail a render that succeeded
+            print(f"Could not capture a poster frame: {e}")
+        return result
+
+    scene.render = render
+
+
+def profile_scene(scene, interval: float, top_allocations: int = 15) -> None:
+    """
+    Profile the job from now until ``scene`` has rendered
+
+    Stacks are sampled every ``interval`` seconds into a collapsed-stack file
+    in the job directory (see ``profiler.StackSampler``) and allocations are
+    traced with ``tracemalloc``. Once the scene has rendered, or failed to, a
+    ``profile`` event reports the samples taken, the peak memory of the
+    process and the ``top_allocations`` source lines holding the most memory.
+    """
+    import resource
+    import tracemalloc
+    import profiler
+
+    path = os.path.join(os.environ.get("JOB_DIR", os.getcwd()), profiler.PROFILE_FILE)
+    sampler = profiler.StackSampler(path, interval)
+    tracemalloc.start()
+    sampler.start()
+    original_render = scene.render
+
+    def render(*args, **kwargs):
+        try:
+            return original_render(*args, **kwargs)
+        finally:
+            samples = sampler.stop()
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, profiler.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ))
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            record_event(
+                "profile",
+                path=path,
+                samples=samples,
+                interval=interval,
+                # Kilobytes on Linux
+                peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                traced_peak_mb=round(traced_peak / 1024 / 1024, 1),
+                top_allocations=[
+                    {
+                        'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                        'size_kb': round(stat.size / 1024, 1),
+                        'count': stat.count
+                    }
+                    for stat in snapshot.statistics('lineno')[:top_allocations]
+                ]
+            )
+
+    scene.render = render
+
+
+def read_events(job_dir: str) -> List[Dict[str, Any]]:
+    """Read the events a job recorded, in the order they were written"""
+    path = os.path.join(job_dir, EVENTS_FILE)
+    if not os.path.exists(path):
+        return []
+
+    events = []
+    with open(path) as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # A job killed mid-write can leave a truncated last line
+                continue
+    return events
+
+
+class EventTail:
+    """Incrementally reads new events from a running job's event log"""
+
+    def __init__(self, job_dir: str):
+        self.path = os.path.join(job_dir, EVENTS_FILE)
+        self._offset = 0
+
+    def poll(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+
+        events = []
+        with open(self.path) as f:
+            f.seek(self._offset)
+            while True:
+                line = f.readline()
+                # Leave a partially written line for the next poll
+                if not line.endswith("\n"):
+                    break
+                self._offset = f.tell()
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+        return events
+
+
+def first_event_time(events: List[Dict[str, Any]], name: str):
+    """Return the timestamp of the first event called ``name``, or None"""
+    for event in events:
+        if event.get('event') == name:
+            return event['time']
+    return None
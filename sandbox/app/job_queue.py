@@ -0,0 +1,936 @@
+"""
+Durable job queue shared by API servers and render workers on any number of nodes.
+
+With ``JOB_QUEUE_URL`` set, the API server does not render Manim jobs itself.
+/jobs and /run-manim put them on the queue (``RemoteJobManager``) and read
+their status and results back from it. ``queue_worker.py`` processes on this
+or other machines take jobs off the queue under a lease, which they renew
+with a heartbeat while the job runs. A worker that dies stops renewing; once
+its lease has expired the job goes back on the queue for another worker, up
+to ``JOB_QUEUE_MAX_ATTEMPTS`` leases in all.
+
+Backends, chosen by the URL:
+
+- ``redis://host:6379/0``: Redis, for workers on several machines (needs the
+  ``redis`` package)
+- ``sqlite:///queue.db``: a SQLite file, for workers on one machine; the path
+  is relative unless it starts with a fourth slash (``sqlite:////var/queue.db``)
+- ``sqlite://``: SQLite in memory, for tests and a single process
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from jobs import JOB_RETENTION_SECONDS, TERMINAL_STATES
+from scheduler import SchedulerFullError
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Empty runs jobs in the API server's own process
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "")
+# A worker that has not renewed its lease for this long is taken for dead
+JOB_QUEUE_LEASE_SECONDS = float(os.getenv("JOB_QUEUE_LEASE_SECONDS", "30"))
+# Leases a job may have before it is failed rather than requeued again
+JOB_QUEUE_MAX_ATTEMPTS = int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "3"))
+# How often idle workers and waiting API requests check the queue
+JOB_QUEUE_POLL_INTERVAL = float(os.getenv("JOB_QUEUE_POLL_INTERVAL", "0.5"))
+# Prefix of every Redis key, so several deployments can share a server
+JOB_QUEUE_REDIS_PREFIX = os.getenv("JOB_QUEUE_REDIS_PREFIX", "manim:")
+
+
+def open_job_queue(url: str) -> "JobQueue":
+    """Connect to the job queue at ``url`` (see the module docstring)"""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobQueue(url)
+    if url.startswith("sqlite://"):
+        return SQLiteJobQueue(url[len("sqlite:///"):] or ":memory:")
+    raise ValueError(f"Unsupported JOB_QUEUE_URL '{url}', expected redis://... or sqlite://...")
+
+
+def final_status(result: Dict[str, Any]) -> str:
+    """Terminal status of a job that returned ``result``"""
+    if result.get('cancelled'):
+        return 'cancelled'
+    return 'done' if result.get('success') else 'failed'
+
+
+def cancelled_result(job_id: str, error: str) -> Dict[str, Any]:
+    return {'job_id': job_id, 'success': False, 'cancelled': True, 'error': error}
+
+
+class JobQueue(ABC):
+    """
+    Jobs shared between API servers and workers
+
+    Every method is atomic, so any number of processes may use the same
+    queue. A job is ``queued`` until a worker leases it; only the worker
+    holding the lease may change its status or complete it. A follow-up job
+    (``parent_id``) is only handed out once its parent is done, and is
+    cancelled if the parent fails or is no longer on the queue.
+    """
+
+    max_attempts = JOB_QUEUE_MAX_ATTEMPTS
+    retention_seconds = JOB_RETENTION_SECONDS
+
+    @abstractmethod
+    def enqueue(
+        self,
+        payload: Dict[str, Any],
+        tenant: str = None,
+        dedup_key: str = None,
+        parent_id: str = None,
+        estimated_seconds: float = None,
+        deadline: float = None,
+        max_queued: int = 0
+    ) -> str:
+        """
+        Add a job
+
+        Args:
+            max_queued (int): Reject the job if this many are already waiting
+                for a worker (0 for no limit); joining an unfinished job with
+                the same ``dedup_key`` is always allowed
+
+        Returns:
+            str: The new job's id, or that of an unfinished job with the same ``dedup_key``
+
+        Raises:
+            SchedulerFullError: If ``max_queued`` jobs are already waiting
+        """
+
+    @abstractmethod
+    def add_finished(self, payload: Dict[str, Any], result: Dict[str, Any]) -> str:
+        """Add a job whose result is already known, e.g. served from the render cache"""
+
+    @abstractmethod
+    def lease(self, worker_id: str, lease_seconds: float = JOB_QUEUE_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        """
+        Take the oldest job that is ready to run
+
+        Returns:
+            dict: The job as ``get`` returns it plus its ``payload``, or None if nothing is queued
+        """
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = JOB_QUEUE_LEASE_SECONDS) -> bool:
+        """
+        Renew the lease on a running job
+
+        Returns:
+            bool: False if the job should stop: its lease was lost or it was cancelled
+        """
+
+    @abstractmethod
+    def set_status(self, job_id: str, worker_id: str, status: str) -> None:
+        """Report the stage a leased job is in; ignored unless ``worker_id`` holds the lease"""
+
+    @abstractmethod
+    def set_playlist_url(self, job_id: str, worker_id: str, url: str) -> None:
+        """Publish the HLS playlist of a leased job; ignored unless ``worker_id`` holds the lease"""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """
+        Store the result of a leased job and release the lease
+
+        Returns:
+            bool: False if ``worker_id`` no longer held the lease and the result was dropped
+        """
+
+    @abstractmethod
+    def set_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        """Replace a finished job's result, e.g. a preview's once its final render is done"""
+
+    @abstractmethod
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a job; a queued one never starts, a running one is stopped by its worker"""
+
+    @abstractmethod
+    def requeue_expired(self) -> int:
+        """
+        Put jobs whose worker stopped renewing its lease back on the queue
+
+        Jobs that were cancelled meanwhile, or that used up their attempts,
+        are finished instead.
+
+        Returns:
+            int: Number of expired leases found
+        """
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job in the shape of ``jobs.Job.to_dict``, or None if unknown or expired"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Jobs waiting and running, and the workers running them"""
+
+    def _check_room(self, queued: int, max_queued: int) -> None:
+        if max_queued and queued >= max_queued:
+            raise SchedulerFullError(f"{queued} job(s) are already waiting for a render worker")
+
+    def _expired_outcome(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Result to finish a job with whose lease expired, or None to requeue it"""
+        if row['cancel_requested']:
+            return cancelled_result(row['id'], 'Job was cancelled')
+        if row['attempts'] >= self.max_attempts:
+            return {
+                'job_id': row['id'],
+                'success': False,
+                'error': f"Job was abandoned by {row['attempts']} worker(s) that stopped responding"
+            }
+        return None
+
+    def _to_dict(self, row: Dict[str, Any], with_payload: bool = False) -> Dict[str, Any]:
+        payload = row['payload']
+        record = {
+            'job_id': row['id'],
+            'status': row['status'],
+            'conversation_id': payload.get('conversationId'),
+            'tenant': row['tenant'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'history': row['history'],
+            'waiters': row['waiters'],
+            'parent_job_id': row['parent_id'],
+            'followup_job_id': row['followup_id'],
+            'playlist_url': row['playlist_url'],
+            'estimated_seconds': row['estimated_seconds'],
+            'deadline': row['deadline'],
+            'attempts': row['attempts'],
+            'worker': row['worker'],
+            'result': row['result']
+        }
+        if with_payload:
+            record['payload'] = payload
+        return record
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Job queue in a SQLite database
+
+    Every change runs in an immediate transaction, so processes sharing the
+    file on one machine see a consistent queue.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            ready INTEGER NOT NULL,
+            tenant TEXT,
+            dedup_key TEXT,
+            parent_id TEXT,
+            followup_id TEXT,
+            waiters INTEGER NOT NULL DEFAULT 1,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            history TEXT NOT NULL,
+            result TEXT,
+            playlist_url TEXT,
+            estimated_seconds REAL,
+            deadline REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            lease_until REAL,
+            cancel_requested INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, ready, created_at);
+        CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key);
+        CREATE INDEX IF NOT EXISTS jobs_lease ON jobs (lease_until);
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            # Readers do not block the worker holding the write lock
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(self.SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def enqueue(self, payload, tenant=None, dedup_key=None, parent_id=None, estimated_seconds=None, deadline=None,
+                max_queued=0):
+        now = time.time()
+        with self._transaction() as db:
+            self._prune(db, now)
+            if dedup_key is not None:
+                existing = db.execute(
+                    f"SELECT id FROM jobs WHERE dedup_key = ? AND cancel_requested = 0 "
+                    f"AND status NOT IN ({', '.join('?' * len(TERMINAL_STATES))})",
+                    (dedup_key, *TERMINAL_STATES)
+                ).fetchone()
+                if existing is not None:
+                    db.execute("UPDATE jobs SET waiters = waiters + 1 WHERE id = ?", (existing['id'],))
+                    return existing['id']
+            self._check_room(self._count_queued(db), max_queued)
+
+            job_id = uuid.uuid4().hex
+            parent = None
+            if parent_id is not None:
+                parent = db.execute("SELECT status FROM jobs WHERE id = ?", (parent_id,)).fetchone()
+                db.execute("UPDATE jobs SET followup_id = ? WHERE id = ?", (job_id, parent_id))
+            db.execute(
+                "INSERT INTO jobs (id, payload, status, ready, tenant, dedup_key, parent_id, created_at, updated_at, "
+                "history, estimated_seconds, deadline) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id, json.dumps(payload), 0 if parent_id else 1, tenant, dedup_key, parent_id, now, now,
+                    json.dumps([{'status': 'queued', 'time': now}]), estimated_seconds, deadline
+                )
+            )
+            if parent is not None and parent['status'] in TERMINAL_STATES:
+                self._settle_followup(db, {'id': parent_id, 'followup_id': job_id}, parent['status'], now)
+            elif parent_id is not None and parent is None:
+                # Nothing would ever release it
+                result = cancelled_result(job_id, f"Job {parent_id} it follows is no longer on the queue")
+                self._transition(db, self._row(db, job_id), 'cancelled', now, result=json.dumps(result))
+        return job_id
+
+    def add_finished(self, payload, result):
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        result['job_id'] = job_id
+        status = final_status(result)
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO jobs (id, payload, status, ready, created_at, updated_at, history, result) "
+                "VALUES (?, ?, ?, 0, ?, ?, ?, ?)",
+                (
+                    job_id, json.dumps(payload), status, now, now,
+                    json.dumps([{'status': 'queued', 'time': now}, {'status': status, 'time': now}]), json.dumps(result)
+                )
+            )
+        return job_id
+
+    def lease(self, worker_id, lease_seconds=JOB_QUEUE_LEASE_SECONDS):
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND ready = 1 AND worker IS NULL "
+                "ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row['id'])
+            )
+            return self._to_dict(self._row(db, row['id']), with_payload=True)
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=JOB_QUEUE_LEASE_SECONDS):
+        with self._transaction() as db:
+            updated = db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ?",
+                (time.time() + lease_seconds, job_id, worker_id)
+            ).rowcount
+            if not updated:
+                return False
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return not row['cancel_requested']
+
+    def set_status(self, job_id, worker_id, status):
+        with self._transaction() as db:
+            row = self._row(db, job_id)
+            if row is None or row['worker'] != worker_id or row['status'] in TERMINAL_STATES or row['status'] == status:
+                return
+            self._transition(db, row, status, time.time())
+
+    def set_playlist_url(self, job_id, worker_id, url):
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET playlist_url = ?, updated_at = ? WHERE id = ? AND worker = ?",
+                (url, time.time(), job_id, worker_id)
+            )
+
+    def complete(self, job_id, worker_id, result):
+        now = time.time()
+        status = final_status(result)
+        with self._transaction() as db:
+            row = self._row(db, job_id)
+            if row is None or row['worker'] != worker_id:
+                return False
+            result['waiters'] = row['waiters']
+            if row['followup_id'] is not None:
+                result['followup_job_id'] = row['followup_id']
+            self._transition(db, row, status, now, result=json.dumps(result), worker=None, lease_until=None)
+            self._settle_followup(db, row, status, now)
+        return True
+
+    def set_result(self, job_id, result):
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET result = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+
+    def cancel(self, job_id):
+        now = time.time()
+        with self._transaction() as db:
+            row = self._row(db, job_id)
+            if row is None:
+                return None
+            if row['status'] not in TERMINAL_STATES:
+                db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+                if row['status'] == 'queued' and row['worker'] is None:
+                    result = cancelled_result(job_id, 'Job was cancelled before it started')
+                    self._transition(db, row, 'cancelled', now, result=json.dumps(result))
+                    self._settle_followup(db, row, 'cancelled', now)
+            return self._to_dict(self._row(db, job_id))
+
+    def requeue_expired(self):
+        now = time.time()
+        with self._transaction() as db:
+            ids = [row['id'] for row in db.execute(
+                f"SELECT id FROM jobs WHERE worker IS NOT NULL AND lease_until < ? "
+                f"AND status NOT IN ({', '.join('?' * len(TERMINAL_STATES))})",
+                (now, *TERMINAL_STATES)
+            )]
+            for job_id in ids:
+                row = self._row(db, job_id)
+                result = self._expired_outcome(row)
+                if result is None:
+                    print(f"♻️  Requeueing job {job_id}: worker {row['worker']} stopped renewing its lease")
+                    self._transition(db, row, 'queued', now, worker=None, lease_until=None)
+                    continue
+                status = final_status(result)
+                self._transition(db, row, status, now, result=json.dumps(result), worker=None, lease_until=None)
+                self._settle_followup(db, row, status, now)
+        return len(ids)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._row(self._db, job_id)
+        return self._to_dict(row) if row is not None else None
+
+    def stats(self):
+        with self._lock:
+            by_status = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            workers = dict(self._db.execute(
+                "SELECT worker, COUNT(*) FROM jobs WHERE worker IS NOT NULL GROUP BY worker"
+            ).fetchall())
+            queued = self._count_queued(self._db)
+        return {
+            'backend': 'sqlite',
+            'queued': queued,
+            'running': sum(workers.values()),
+            'workers': workers,
+            'by_status': by_status
+        }
+
+    def _count_queued(self, db) -> int:
+        """Jobs waiting for a worker"""
+        return db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND ready = 1 AND worker IS NULL"
+        ).fetchone()[0]
+
+    def _row(self, db, job_id: str) -> Optional[Dict[str, Any]]:
+        row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        row = dict(row)
+        row['payload'] = json.loads(row['payload'])
+        row['history'] = json.loads(row['history'])
+        row['result'] = json.loads(row['result']) if row['result'] is not None else None
+        return row
+
+    def _transition(self, db, row: Dict[str, Any], status: str, now: float, **fields) -> None:
+        history = row['history'] + [{'status': status, 'time': now}]
+        changes = dict(fields, status=status, updated_at=now, history=json.dumps(history))
+        db.execute(
+            f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in changes)} WHERE id = ?",
+            (*changes.values(), row['id'])
+        )
+
+    def _settle_followup(self, db, row: Dict[str, Any], status: str, now: float) -> None:
+        """Release a finished job's follow-up, or cancel it if the job did not succeed"""
+        if row['followup_id'] is None:
+            return
+        if status == 'done':
+            db.execute("UPDATE jobs SET ready = 1 WHERE id = ? AND status = 'queued'", (row['followup_id'],))
+            return
+        followup = self._row(db, row['followup_id'])
+        if followup is not None and followup['status'] == 'queued':
+            result = cancelled_result(followup['id'], f"Job {row['id']} it follows did not succeed")
+            self._transition(db, followup, 'cancelled', now, result=json.dumps(result))
+
+    def _prune(self, db, now: float) -> None:
+        db.execute(
+            f"DELETE FROM jobs WHERE updated_at < ? AND status IN ({', '.join('?' * len(TERMINAL_STATES))})",
+            (now - self.retention_seconds, *TERMINAL_STATES)
+        )
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Job queue in Redis
+
+    Each job is a hash; ready jobs are listed in order in ``queued`` (and
+    taken off it when cancelled, so its length is what waits for a worker)
+    and leased ones in the ``leases`` sorted set, scored by lease expiry.
+    Changes to a job run in a WATCH transaction (leasing in a script), so
+    they are atomic across any number of API servers and workers. Finished
+    jobs expire after ``JOB_RETENTION_SECONDS``.
+    """
+
+    # Pops queued ids until one is still waiting for a worker, and leases it
+    LEASE_SCRIPT = """
+        local id = redis.call('LPOP', KEYS[1])
+        while id do
+            local key = ARGV[1] .. id
+            if redis.call('HGET', key, 'status') == 'queued' and redis.call('HGET', key, 'worker') == '' then
+                redis.call('HSET', key, 'worker', ARGV[2], 'lease_until', ARGV[3], 'updated_at', ARGV[4])
+                redis.call('HINCRBY', key, 'attempts', 1)
+                redis.call('ZADD', KEYS[2], ARGV[3], id)
+                return id
+            end
+            id = redis.call('LPOP', KEYS[1])
+        end
+        return false
+    """
+
+    FLOATS = ('created_at', 'updated_at', 'estimated_seconds', 'deadline', 'lease_until')
+    INTS = ('ready', 'waiters', 'attempts', 'cancel_requested')
+    JSON = ('payload', 'history', 'result')
+
+    def __init__(self, url: str, prefix: str = JOB_QUEUE_REDIS_PREFIX):
+        if redis is None:
+            raise RuntimeError("The redis package is required for a Redis job queue: pip install redis")
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._queued = prefix + "queued"
+        self._leases = prefix + "leases"
+        self._lease = self._redis.register_script(self.LEASE_SCRIPT)
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}job:{job_id}"
+
+    def _dedup_key(self, dedup_key: str) -> str:
+        return f"{self.prefix}dedup:{dedup_key}"
+
+    def enqueue(self, payload, tenant=None, dedup_key=None, parent_id=None, estimated_seconds=None, deadline=None,
+                max_queued=0):
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        watch = [self._key(job_id)]
+        if dedup_key is not None:
+            watch.append(self._dedup_key(dedup_key))
+        if parent_id is not None:
+            watch.append(self._key(parent_id))
+        if max_queued:
+            watch.append(self._queued)
+
+        def transaction(pipe):
+            if dedup_key is not None:
+                existing_id = pipe.get(self._dedup_key(dedup_key))
+                existing = self._read(pipe, existing_id) if existing_id else None
+                if existing is not None and existing['status'] not in TERMINAL_STATES and not existing['cancel_requested']:
+                    pipe.multi()
+                    pipe.hincrby(self._key(existing_id), 'waiters', 1)
+                    return existing_id
+            if max_queued:
+                self._check_room(pipe.llen(self._queued), max_queued)
+            parent = self._read(pipe, parent_id) if parent_id is not None else None
+
+            pipe.multi()
+            pipe.hset(self._key(job_id), mapping=self._encode({
+                'id': job_id, 'payload': payload, 'status': 'queued', 'ready': 0 if parent_id else 1,
+                'tenant': tenant, 'dedup_key': dedup_key, 'parent_id': parent_id, 'followup_id': None,
+                'waiters': 1, 'created_at': now, 'updated_at': now,
+                'history': [{'status': 'queued', 'time': now}], 'result': None, 'playlist_url': None,
+                'estimated_seconds': estimated_seconds, 'deadline': deadline, 'attempts': 0, 'worker': None,
+                'lease_until': None, 'cancel_requested': 0
+            }))
+            if dedup_key is not None:
+                pipe.set(self._dedup_key(dedup_key), job_id, ex=self.retention_seconds)
+            if parent_id is None:
+                pipe.rpush(self._queued, job_id)
+            elif parent is not None:
+                pipe.hset(self._key(parent_id), 'followup_id', job_id)
+                if parent['status'] in TERMINAL_STATES:
+                    row = self._new_row(job_id, now)
+                    self._settle_followup(pipe, dict(parent, followup_id=job_id), row, parent['status'], now)
+            else:
+                # Nothing would ever release it
+                result = cancelled_result(job_id, f"Job {parent_id} it follows is no longer on the queue")
+                self._finish(pipe, self._new_row(job_id, now), 'cancelled', result, now)
+            return job_id
+
+        return self._redis.transaction(transaction, *watch, value_from_callable=True)
+
+    def add_finished(self, payload, result):
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        result['job_id'] = job_id
+        status = final_status(result)
+        key = self._key(job_id)
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping=self._encode({
+            'id': job_id, 'payload': payload, 'status': status, 'ready': 0, 'tenant': None, 'dedup_key': None,
+            'parent_id': None, 'followup_id': None, 'waiters': 1, 'created_at': now, 'updated_at': now,
+            'history': [{'status': 'queued', 'time': now}, {'status': status, 'time': now}], 'result': result,
+            'playlist_url': None, 'estimated_seconds': None, 'deadline': None, 'attempts': 0, 'worker': None,
+            'lease_until': None, 'cancel_requested': 0
+        }))
+        pipe.expire(key, self.retention_seconds)
+        pipe.execute()
+        return job_id
+
+    def lease(self, worker_id, lease_seconds=JOB_QUEUE_LEASE_SECONDS):
+        now = time.time()
+        job_id = self._lease(keys=[self._queued, self._leases], args=[
+            f"{self.prefix}job:", worker_id, repr(now + lease_seconds), repr(now)
+        ])
+        if not job_id:
+            return None
+        row = self._read(self._redis, job_id)
+        return self._to_dict(row, with_payload=True) if row is not None else None
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=JOB_QUEUE_LEASE_SECONDS):
+        def transaction(pipe):
+            row = self._read(pipe, job_id)
+            if row is None or row['worker'] != worker_id:
+                return False
+            lease_until = time.time() + lease_seconds
+            pipe.multi()
+            pipe.hset(self._key(job_id), 'lease_until', repr(lease_until))
+            pipe.zadd(self._leases, {job_id: lease_until})
+            return not row['cancel_requested']
+
+        return self._redis.transaction(transaction, self._key(job_id), value_from_callable=True)
+
+    def set_status(self, job_id, worker_id, status):
+        def transaction(pipe):
+            row = self._read(pipe, job_id)
+            if row is None or row['worker'] != worker_id or row['status'] in TERMINAL_STATES or row['status'] == status:
+                return
+            pipe.multi()
+            self._transition(pipe, row, status, time.time())
+
+        self._redis.transaction(transaction, self._key(job_id))
+
+    def set_playlist_url(self, job_id, worker_id, url):
+        def transaction(pipe):
+            row = self._read(pipe, job_id)
+            if row is None or row['worker'] != worker_id:
+                return
+            pipe.multi()
+            pipe.hset(self._key(job_id), mapping={'playlist_url': url, 'updated_at': repr(time.time())})
+
+        self._redis.transaction(transaction, self._key(job_id))
+
+    def complete(self, job_id, worker_id, result):
+        status = final_status(result)
+
+        def transaction(pipe):
+            now = time.time()
+            row = self._read(pipe, job_id)
+            if row is None or row['worker'] != worker_id:
+                return False
+            followup = self._watch_followup(pipe, row)
+            result['waiters'] = row['waiters']
+            if row['followup_id'] is not None:
+                result['followup_job_id'] = row['followup_id']
+            pipe.multi()
+            self._finish(pipe, row, status, result, now)
+            self._settle_followup(pipe, row, followup, status, now)
+            return True
+
+        return self._redis.transaction(transaction, self._key(job_id), value_from_callable=True)
+
+    def set_result(self, job_id, result):
+        def transaction(pipe):
+            if not pipe.exists(self._key(job_id)):
+                return
+            pipe.multi()
+            pipe.hset(self._key(job_id), mapping={'result': json.dumps(result), 'updated_at': repr(time.time())})
+
+        self._redis.transaction(transaction, self._key(job_id))
+
+    def cancel(self, job_id):
+        def transaction(pipe):
+            now = time.time()
+            row = self._read(pipe, job_id)
+            if row is None or row['status'] in TERMINAL_STATES:
+                return
+            followup = self._watch_followup(pipe, row)
+            pipe.multi()
+            pipe.hset(self._key(job_id), 'cancel_requested', 1)
+            if row['status'] == 'queued' and row['worker'] is None:
+                pipe.lrem(self._queued, 0, job_id)
+                self._finish(pipe, row, 'cancelled', cancelled_result(job_id, 'Job was cancelled before it started'), now)
+                self._settle_followup(pipe, row, followup, 'cancelled', now)
+
+        self._redis.transaction(transaction, self._key(job_id))
+        return self.get(job_id)
+
+    def requeue_expired(self):
+        expired = self._redis.zrangebyscore(self._leases, "-inf", time.time())
+
+        def transaction(pipe, job_id):
+            now = time.time()
+            row = self._read(pipe, job_id)
+            if row is None or row['worker'] is None or row['status'] in TERMINAL_STATES:
+                # Finished, or its hash expired; only the lease entry is left
+                pipe.multi()
+                pipe.zrem(self._leases, job_id)
+                return 0
+            if row['lease_until'] is not None and row['lease_until'] >= now:
+                return 0  # Renewed meanwhile
+            followup = self._watch_followup(pipe, row)
+            result = self._expired_outcome(row)
+            pipe.multi()
+            if result is None:
+                print(f"♻️  Requeueing job {job_id}: worker {row['worker']} stopped renewing its lease")
+                self._transition(pipe, row, 'queued', now, worker=None, lease_until=None)
+                pipe.zrem(self._leases, job_id)
+                # Back to the front: it has waited longest
+                pipe.lpush(self._queued, job_id)
+            else:
+                status = final_status(result)
+                self._finish(pipe, row, status, result, now)
+                self._settle_followup(pipe, row, followup, status, now)
+            return 1
+
+        return sum(
+            self._redis.transaction(lambda pipe, job_id=job_id: transaction(pipe, job_id), self._key(job_id),
+                                    value_from_callable=True)
+            for job_id in expired
+        )
+
+    def get(self, job_id):
+        row = self._read(self._redis, job_id)
+        return self._to_dict(row) if row is not None else None
+
+    def stats(self):
+        leased = self._redis.zrange(self._leases, 0, -1)
+        workers = {}
+        for job_id in leased:
+            worker = self._redis.hget(self._key(job_id), 'worker')
+            if worker:
+                workers[worker] = workers.get(worker, 0) + 1
+        return {
+            'backend': 'redis',
+            'queued': self._redis.llen(self._queued),
+            'running': sum(workers.values()),
+            'workers': workers
+        }
+
+    def _read(self, client, job_id: str) -> Optional[Dict[str, Any]]:
+        fields = client.hgetall(self._key(job_id))
+        if not fields:
+            return None
+        row = {}
+        for name, value in fields.items():
+            if value == '':
+                row[name] = None
+            elif name in self.FLOATS:
+                row[name] = float(value)
+            elif name in self.INTS:
+                row[name] = int(value)
+            elif name in self.JSON:
+                row[name] = json.loads(value)
+            else:
+                row[name] = value
+        return row
+
+    def _encode(self, row: Dict[str, Any]) -> Dict[str, str]:
+        encoded = {}
+        for name, value in row.items():
+            if value is None:
+                encoded[name] = ''
+            elif name in self.JSON:
+                encoded[name] = json.dumps(value)
+            elif name in self.FLOATS:
+                encoded[name] = repr(float(value))
+            else:
+                encoded[name] = str(value)
+        return encoded
+
+    def _new_row(self, job_id: str, now: float) -> Dict[str, Any]:
+        return {'id': job_id, 'status': 'queued', 'history': [{'status': 'queued', 'time': now}]}
+
+    def _watch_followup(self, pipe, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if row['followup_id'] is None:
+            return None
+        pipe.watch(self._key(row['followup_id']))
+        return self._read(pipe, row['followup_id'])
+
+    def _transition(self, pipe, row: Dict[str, Any], status: str, now: float, **fields) -> None:
+        changes = dict(fields, status=status, updated_at=now, history=row['history'] + [{'status': status, 'time': now}])
+        pipe.hset(self._key(row['id']), mapping=self._encode(changes))
+
+    def _finish(self, pipe, row: Dict[str, Any], status: str, result: Dict[str, Any], now: float) -> None:
+        self._transition(pipe, row, status, now, result=result, worker=None, lease_until=None)
+        pipe.zrem(self._leases, row['id'])
+        pipe.expire(self._key(row['id']), self.retention_seconds)
+
+    def _settle_followup(self, pipe, row, followup, status: str, now: float) -> None:
+        """Release a finished job's follow-up, or cancel it if the job did not succeed"""
+        if followup is None or followup['status'] != 'queued':
+            return
+        if status == 'done':
+            pipe.hset(self._key(followup['id']), 'ready', 1)
+            pipe.rpush(self._queued, followup['id'])
+        else:
+            result = cancelled_result(followup['id'], f"Job {row['id']} it follows did not succeed")
+            self._transition(pipe, followup, 'cancelled', now, result=result)
+            pipe.expire(self._key(followup['id']), self.retention_seconds)
+
+
+class RemoteJob:
+    """
+    A job on the shared queue, as an API server sees it
+
+    Offers what the endpoints use of ``jobs.Job``; every read goes to the
+    queue, so it reflects what the worker running the job has reported.
+    """
+
+    def __init__(self, queue: JobQueue, job_id: str, record: Dict[str, Any] = None):
+        self.id = job_id
+        self.future = None
+        self._queue = queue
+        self._record = record
+
+    def refresh(self) -> Dict[str, Any]:
+        record = self._queue.get(self.id)
+        if record is not None:
+            self._record = record
+        return self._record or {'job_id': self.id, 'status': 'queued', 'playlist_url': None, 'result': None}
+
+    @property
+    def status(self) -> str:
+        return self.refresh()['status']
+
+    @property
+    def playlist_url(self) -> Optional[str]:
+        return self.refresh()['playlist_url']
+
+    @property
+    def tenant(self) -> Optional[str]:
+        return self.refresh().get('tenant')
+
+    @property
+    def result(self) -> Optional[Dict[str, Any]]:
+        return self.refresh()['result']
+
+    def is_finished(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.refresh())
+
+
+class RemoteJobManager:
+    """
+    Drop-in for ``jobs.JobManager`` that puts jobs on a shared ``JobQueue``
+
+    Jobs are rendered by ``queue_worker.py`` processes, which run
+    ``pipeline.run_manim_job``; the ``runner`` arguments are accepted for
+    compatibility only. Futures of jobs submitted here resolve once a
+    worker has finished them. Fair sharing and the scheduling policy apply
+    to jobs rendered in-process only; the queue hands jobs out oldest first.
+    """
+
+    def __init__(self, queue: JobQueue, max_queued: int = 0, poll_interval: float = JOB_QUEUE_POLL_INTERVAL):
+        self.queue = queue
+        self.max_queued = max_queued
+        self.poll_interval = poll_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._poller = None
+
+    def submit(self, payload, runner=None, dedup_key=None, estimated_seconds=None, deadline=None,
+               reject_late=False, tenant=None) -> RemoteJob:
+        """
+        Queue a new job
+
+        Raises:
+            SchedulerFullError: If ``max_queued`` jobs are already waiting for a worker
+        """
+        job_id = self.queue.enqueue(payload, tenant, dedup_key, None, estimated_seconds, deadline, self.max_queued)
+        return self._track(job_id)
+
+    def submit_followup(self, parent, payload, runner=None, merge=None, estimated_seconds=None,
+                        deadline=None) -> RemoteJob:
+        """Queue a job that workers start once ``parent`` is done; workers merge its result into the parent's"""
+        # A parent no longer on the queue has no tenant; the queue then cancels the follow-up
+        job_id = self.queue.enqueue(payload, parent.tenant, None, parent.id, estimated_seconds, deadline)
+        return self._track(job_id)
+
+    def add_finished(self, payload, result) -> RemoteJob:
+        job = RemoteJob(self.queue, self.queue.add_finished(payload, result))
+        job.future = Future()
+        job.future.set_result(result)
+        return job
+
+    def get(self, job_id: str) -> Optional[RemoteJob]:
+        record = self.queue.get(job_id)
+        return RemoteJob(self.queue, job_id, record) if record is not None else None
+
+    def list(self) -> List[RemoteJob]:
+        with self._lock:
+            return list(self._pending.values())
+
+    def cancel(self, job_id: str) -> Optional[RemoteJob]:
+        record = self.queue.cancel(job_id)
+        return RemoteJob(self.queue, job_id, record) if record is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            awaited = len(self._pending)
+        return {'queue': self.queue.stats(), 'awaited': awaited}
+
+    def _track(self, job_id: str) -> RemoteJob:
+        with self._lock:
+            job = self._pending.get(job_id)
+            if job is None:
+                job = self._pending[job_id] = RemoteJob(self.queue, job_id)
+                job.future = Future()
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, name="job-queue-poller", daemon=True)
+                self._poller.start()
+        return job
+
+    def _poll_loop(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                # Every API server helps find jobs whose worker died
+                self.queue.requeue_expired()
+                with self._lock:
+                    pending = list(self._pending.values())
+                for job in pending:
+                    record = self.queue.get(job.id)
+                    if record is None or record['status'] in TERMINAL_STATES:
+                        with self._lock:
+                            self._pending.pop(job.id, None)
+                        if record is None:
+                            job.future.set_exception(RuntimeError(f"Job {job.id} is no longer on the queue"))
+                        else:
+                            job.future.set_result(record['result'])
+            except Exception as e:
+                print(f"⚠️  Could not poll the job queue: {e}")
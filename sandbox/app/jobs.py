@@ -0,0 +1,343 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+from scheduler import RenderScheduler
+
+# Job lifecycle. A job moves forward through the first five states and ends
+# in one of the terminal ones.
+JOB_STATES = ('queued', 'rendering', 'encoding', 'uploading', 'done', 'failed', 'cancelled')
+TERMINAL_STATES = ('done', 'failed', 'cancelled')
+
+# Finished jobs are forgotten after this many seconds
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+
+class Job:
+    """A render request tracked from submission until its result is collected"""
+
+    def __init__(
+        self,
+        payload: Dict[str, Any],
+        dedup_key: str = None,
+        estimated_seconds: float = None,
+        deadline: float = None,
+        tenant: str = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.dedup_key = dedup_key
+        # Predicted run time and the epoch time it should be done by, for the scheduler
+        self.estimated_seconds = estimated_seconds
+        self.deadline = deadline
+        # Who the job is for; render slots are shared fairly between tenants
+        self.tenant = tenant
+        self.waiters = 1
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.history = [{'status': 'queued', 'time': self.created_at}]
+        self.result = None
+        self.future = None
+        # The scheduler's future for the job, once it is submitted there
+        self.scheduled = None
+        self.cancel_event = threading.Event()
+        # Set when this job waits for, or is followed by, another job
+        self.parent_id = None
+        self.followup_id = None
+        # HLS playlist of the video, published while the job is still rendering
+        self.playlist_url = None
+        self._lock = threading.Lock()
+
+    def set_status(self, status: str) -> None:
+        """Move the job to ``status``; terminal states are never left again"""
+        if status not in JOB_STATES:
+            raise ValueError(f"Unknown job status: {status}")
+        with self._lock:
+            if self.status in TERMINAL_STATES or status == self.status:
+                return
+            self.status = status
+            self.updated_at = time.time()
+            self.history.append({'status': status, 'time': self.updated_at})
+
+    def set_playlist_url(self, url: str) -> None:
+        with self._lock:
+            self.playlist_url = url
+            self.updated_at = time.time()
+
+    def is_finished(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'conversation_id': self.payload.get('conversationId'),
+                'tenant': self.tenant,
+                'created_at': self.created_at,
+                'updated_at': self.updated_at,
+                'history': list(self.history),
+                'waiters': self.waiters,
+                'parent_job_id': self.parent_id,
+                'followup_job_id': self.followup_id,
+                'playlist_url': self.playlist_url,
+                'estimated_seconds': self.estimated_seconds,
+                'deadline': self.deadline,
+                'result': self.result
+            }
+
+
+class JobManager:
+    """
+    Registry of render jobs running on a ``RenderScheduler``
+
+    ``submit`` returns immediately with a queued job; the runner is executed
+    on a scheduler thread and its return value becomes ``job.result``.
+    Submissions that share a ``dedup_key`` with a job still in flight are
+    coalesced onto that job instead of rendering the same thing twice.
+    """
+
+    def __init__(self, scheduler: RenderScheduler, retention_seconds: int = JOB_RETENTION_SECONDS):
+        self.scheduler = scheduler
+        self.retention_seconds = retention_seconds
+        self._jobs = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def submit(
+        self,
+        payload: Dict[str, Any],
+        runner: Callable[[Job], Dict[str, Any]],
+        dedup_key: str = None,
+        estimated_seconds: float = None,
+        deadline: float = None,
+        reject_late: bool = False,
+        tenant: str = None
+    ) -> Job:
+        """
+        Queue a new job
+
+        Args:
+            payload (dict): Request body the runner reads (code, timeout, ...)
+            runner (Callable): Runs the job and returns its result dict
+            dedup_key (str): Identical submissions share this key
+            estimated_seconds (float): Predicted run time, for the scheduler
+            deadline (float): Epoch time the job should be finished by
+            reject_late (bool): Reject the job if it is predicted to miss ``deadline``
+            tenant (str): User or conversation the job is for
+
+        Returns:
+            Job: The queued job, or the in-flight job with the same
+            ``dedup_key``; ``job.future`` resolves with its result
+
+        Raises:
+            SchedulerFullError: If the scheduler has no room for another job
+            TenantLimitError: If ``tenant`` already has its share of the queue
+            DeadlineError: With ``reject_late``, if the job would finish too late
+        """
+        self._prune()
+        with self._lock:
+            if dedup_key is not None:
+                existing = self._inflight.get(dedup_key)
+                if existing is not None and not existing.is_finished() and not existing.cancel_event.is_set():
+                    existing.waiters += 1
+                    self.coalesced += 1
+                    return existing
+
+            job = Job(payload, dedup_key, estimated_seconds, deadline, tenant)
+            job.future = job.scheduled = self.scheduler.submit(
+                self._run, job, runner,
+                estimated_seconds=estimated_seconds, deadline=deadline, reject_late=reject_late, tenant=tenant
+            )
+            self._jobs[job.id] = job
+            if dedup_key is not None:
+                self._inflight[dedup_key] = job
+        return job
+
+    def add_finished(self, payload: Dict[str, Any], result: Dict[str, Any]) -> Job:
+        """Register a job whose result is already known, e.g. served from the render cache"""
+        self._prune()
+        job = Job(payload)
+        result['job_id'] = job.id
+        job.result = result
+        job.set_status('done' if result.get('success') else 'failed')
+        job.future = Future()
+        job.future.set_result(result)
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def submit_followup(
+        self,
+        parent: Job,
+        payload: Dict[str, Any],
+        runner: Callable[[Job], Dict[str, Any]],
+        merge: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]] = None,
+        estimated_seconds: float = None,
+        deadline: float = None
+    ) -> Job:
+        """
+        Queue a job that starts once ``parent`` has finished successfully
+
+        The follow-up is tracked as queued right away so its id can be handed
+        out with the parent's result. It is never rejected for lack of room,
+        since the request behind it was already accepted, and it is cancelled
+        if the parent fails or is cancelled.
+
+        Args:
+            parent (Job): The job to wait for
+            payload (dict): Request body for the follow-up
+            runner (Callable): Runs the follow-up and returns its result dict
+            merge (Callable): Given the parent's and the follow-up's results,
+                returns the parent's new result once the follow-up succeeds
+            estimated_seconds (float): Predicted run time, for the scheduler
+            deadline (float): Epoch time the follow-up should be finished by
+
+        Returns:
+            Job: The follow-up; a parent shared by coalesced requests keeps
+            the one it already has
+        """
+        with self._lock:
+            if parent.followup_id is not None and parent.followup_id in self._jobs:
+                return self._jobs[parent.followup_id]
+            job = Job(payload, estimated_seconds=estimated_seconds, deadline=deadline, tenant=parent.tenant)
+            job.parent_id = parent.id
+            job.future = Future()
+            parent.followup_id = job.id
+            self._jobs[job.id] = job
+        if parent.result is not None:
+            parent.result['followup_job_id'] = job.id
+
+        parent.future.add_done_callback(lambda _: self._start_followup(parent, job, runner, merge))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job; a running render is killed, a queued one never starts"""
+        job = self.get(job_id)
+        if job is None or job.is_finished():
+            return job
+        job.cancel_event.set()
+        if job.status == 'queued':
+            # Off the scheduler's queue, so it stops holding a place there
+            if job.scheduled is not None and self.scheduler.cancel(job.scheduled):
+                job.scheduled.set_result(self._cancelled(job))
+            else:
+                job.set_status('cancelled')
+                self._release(job)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            inflight = list(self._inflight.values())
+            return {
+                'tracked': len(self._jobs),
+                'in_flight': len(inflight),
+                'waiters': sum(job.waiters for job in inflight),
+                'coalesced': self.coalesced
+            }
+
+    def _release(self, job: Job) -> None:
+        with self._lock:
+            if job.dedup_key is not None and self._inflight.get(job.dedup_key) is job:
+                del self._inflight[job.dedup_key]
+
+    def _cancelled(self, job: Job) -> Dict[str, Any]:
+        job.result = {
+            'job_id': job.id,
+            'success': False,
+            'cancelled': True,
+            'error': 'Job was cancelled before it started'
+        }
+        job.set_status('cancelled')
+        self._release(job)
+        return job.result
+
+    def _run(self, job: Job, runner: Callable[[Job], Dict[str, Any]]) -> Dict[str, Any]:
+        if job.cancel_event.is_set():
+            return self._cancelled(job)
+
+        job.set_status('rendering')
+        try:
+            result = runner(job)
+        except Exception as e:
+            job.result = {'job_id': job.id, 'success': False, 'error': f"Internal server error: {str(e)}"}
+            job.set_status('failed')
+            raise
+        finally:
+            # Later identical submissions start a new job (or hit the render cache)
+            self._release(job)
+
+        result['waiters'] = job.waiters
+        if job.followup_id is not None:
+            result['followup_job_id'] = job.followup_id
+        job.result = result
+        if job.result.get('cancelled'):
+            job.set_status('cancelled')
+        elif job.result.get('success'):
+            job.set_status('done')
+        else:
+            job.set_status('failed')
+        return job.result
+
+    def _start_followup(
+        self,
+        parent: Job,
+        job: Job,
+        runner: Callable[[Job], Dict[str, Any]],
+        merge: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]
+    ) -> None:
+        if parent.status != 'done' or job.cancel_event.is_set():
+            if parent.status != 'done':
+                error = f"Job {parent.id} it follows did not succeed"
+            else:
+                error = 'Job was cancelled before it started'
+            job.result = {'job_id': job.id, 'success': False, 'cancelled': True, 'error': error}
+            job.set_status('cancelled')
+            job.future.set_result(job.result)
+            return
+
+        def finished(future: Future) -> None:
+            if future.cancelled():
+                job.future.cancel()
+                return
+            if future.exception() is not None:
+                job.future.set_exception(future.exception())
+                return
+            result = future.result()
+            if merge is not None and result.get('success') and parent.result is not None:
+                parent.result = merge(parent.result, result)
+            job.future.set_result(result)
+
+        try:
+            job.scheduled = self.scheduler.submit_followup(
+                self._run, job, runner,
+                estimated_seconds=job.estimated_seconds, deadline=job.deadline, tenant=job.tenant
+            )
+            job.scheduled.add_done_callback(finished)
+        except RuntimeError as e:
+            # The scheduler is shutting down
+            job.result = {'job_id': job.id, 'success': False, 'error': f"Internal server error: {str(e)}"}
+            job.set_status('failed')
+            job.future.set_result(job.result)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.is_finished() and job.updated_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -1,14 +1,34 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Dict, Any, Optional, List
 import uvicorn
-from worker import execute_code_with_requirements
+from worker import (
+    CodeExecutor, execute_code_with_requirements, start_worker_pool, stop_worker_pool, get_worker_pool,
+    QUALITY_PRESETS, PREVIEW_QUALITY, ENCODER_PROFILES
+)
+from scheduler import RenderScheduler, SchedulerFullError, DeadlineError, TenantLimitError
+from jobs import JobManager, TERMINAL_STATES
+from job_queue import RemoteJobManager, open_job_queue
+from pipeline import (
+    OUTPUT_DIR, OUTPUT_FORMATS, run_manim_job, manim_cache_key, merge_final_render, prepare_manim_code, estimate_render
+)
+from estimator import render_estimator
+from metrics import job_metrics
+from preflight import PREFLIGHT_ENABLED
+import preflight
+from cache import render_cache
+from file_cache import glyph_cache, partial_movie_cache
+import asyncio
+import json
 import logging
+import math
 import os
-import boto3
+import threading
+import time
 from dotenv import load_dotenv
-from botocore.exceptions import ClientError
 
 load_dotenv()
 
@@ -19,102 +39,91 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION")
-S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
-
-print(S3_BUCKET_NAME)
-# Initialize S3 client
-try:
-    if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
-        )
-    else:
-        s3_client = boto3.client(
-            's3',
-            region_name=AWS_REGION
-        )
+# Render concurrency: at most MAX_CONCURRENT_JOBS renders run at once and
+# MAX_QUEUED_JOBS more may wait for a slot before requests are rejected with 503
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", str(os.cpu_count() or 1)))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "8"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "10"))
 
-    logger.info("Successfully initialized S3 client")
-    logger.info(f"S3 client: {s3_client}")
-except Exception as e:
-    logger.error(f"Failed to initialize S3 client: {str(e)}")
-    s3_client = None
+# Which queued render gets the next free slot: fifo, sjf (shortest estimated
+# first) or edf (earliest deadline first). Under sjf every second waited takes
+# SCHEDULER_AGING seconds off a job's estimate, so long renders still get a turn
+SCHEDULER_POLICY = os.getenv("SCHEDULER_POLICY", "fifo")
+SCHEDULER_AGING = float(os.getenv("SCHEDULER_AGING", "1.0"))
 
-def upload_file_to_s3(file_path: str, object_name: str = None) -> Dict[str, Any]:
-    """
-    Upload a file to an S3 bucket
-    
-    Args:
-        file_path (str): Path to the file to upload
-        object_name (str): S3 object name. If not specified, file_path is used
-    
-    Returns:
-        dict: Response containing upload status and file URL
-        {
-            'success': bool,
-            'url': str,
-            'error': str
-        }
-    """
-    # If S3 client initialization failed, return error
-    if s3_client is None:
-        return {
-            'success': False,
-            'url': None,
-            'error': 'S3 client not initialized'
-        }
+# Reject renders predicted to finish after their deadline (submission time
+# plus the request's timeout), once the estimator has been calibrated
+REJECT_LATE_JOBS = os.getenv("REJECT_LATE_JOBS", "true").lower() in ("1", "true", "yes")
 
-    # If object_name not specified, use file_path
-    if object_name is None:
-        object_name = os.path.basename(file_path)
+# Render slots are shared fairly between tenants: the request's user_id, or
+# its conversationId without one. TENANT_WEIGHTS gives some tenants a bigger
+# share ("user-1=2,user-2=0.5"); the caps limit the renders one tenant may
+# have running and waiting (0: no limit)
+TENANT_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, _, weight in (item.partition("=") for item in os.getenv("TENANT_WEIGHTS", "").split(","))
+    if name.strip() and weight.strip()
+}
+TENANT_MAX_RUNNING = int(os.getenv("TENANT_MAX_RUNNING", "0"))
+TENANT_MAX_QUEUED = int(os.getenv("TENANT_MAX_QUEUED", str(max(1, MAX_QUEUED_JOBS // 2))))
+# Tenant of /execute jobs, so they do not use up the share of renders sent
+# without a user or conversation (which a user id cannot be, with the slash)
+EXECUTE_TENANT = "/execute"
 
-    try:
-        # Upload the file
-        s3_client.upload_file(file_path, S3_BUCKET_NAME, object_name)
-        
-        # Generate the URL for the uploaded file
-        url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
-        
-        logger.info(f"Successfully uploaded file to S3: {url}")
-        return {
-            'success': True,
-            'url': url,
-            'error': None
-        }
-        
-    except ClientError as e:
-        logger.error(f"Failed to upload file to S3: {str(e)}")
-        return {
-            'success': False,
-            'url': None,
-            'error': str(e)
-        }
+# Deadline for /run-manim when the client does not send a timeout; renders
+# routinely take longer than the 30s default that suits /execute
+MANIM_DEFAULT_TIMEOUT = int(os.getenv("MANIM_DEFAULT_TIMEOUT", "300"))
 
-def upload_files_to_s3(file_paths: List[str]) -> List[Dict[str, Any]]:
-    """
-    Upload multiple files to S3 bucket
-    
-    Args:
-        file_paths (List[str]): List of file paths to upload
-    
-    Returns:
-        List[Dict[str, Any]]: List of upload results for each file
+# Shared queue (redis://... or sqlite:///...) that queue_worker.py processes on
+# any number of nodes take renders from; empty renders them in this process
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "")
+
+# Pre-warmed workers with Manim already imported; 0 runs every job in a fresh
+# interpreter. With a job queue renders run in queue_worker.py processes instead
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "0" if JOB_QUEUE_URL else str(MAX_CONCURRENT_JOBS)))
+
+# Append every /run-manim and /jobs request body, with the time it arrived, to
+# this JSONL file for benchmarks/replay.py; empty captures nothing. The bodies
+# include users' code, so keep the file where their videos are kept
+REQUEST_CAPTURE_FILE = os.getenv("REQUEST_CAPTURE_FILE", "")
+capture_lock = threading.Lock()
+
+# Characters of submitted code written to the server log; the rest is left out
+LOG_CODE_CHARS = int(os.getenv("LOG_CODE_CHARS", "2000"))
+
+scheduler = RenderScheduler(
+    MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS, SCHEDULER_POLICY, SCHEDULER_AGING,
+    TENANT_WEIGHTS, TENANT_MAX_RUNNING, TENANT_MAX_QUEUED
+)
+# /execute always runs on the local scheduler
+if JOB_QUEUE_URL:
+    job_manager = RemoteJobManager(open_job_queue(JOB_QUEUE_URL), MAX_QUEUED_JOBS)
+else:
+    job_manager = JobManager(scheduler)
+
+def clip_for_log(code: str) -> str:
+    """The first LOG_CODE_CHARS characters of ``code``, saying how many more there are"""
+    if len(code) <= LOG_CODE_CHARS:
+        return code
+    return f"{code[:LOG_CODE_CHARS]}\n[... {len(code) - LOG_CODE_CHARS} more characters]"
+
+async def run_on_scheduler(fn, *args, tenant: str = None):
     """
-    results = []
-    for file_path in file_paths:
-        result = upload_file_to_s3(file_path)
-        results.append(result)
-    return results
+    Run a blocking job on the render scheduler without blocking the event loop
 
-# Create output directory for generated files
-OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+    Raises:
+        HTTPException: 503 with a Retry-After header if no slot is available
+    """
+    try:
+        future = scheduler.submit(fn, *args, tenant=tenant)
+    except SchedulerFullError as e:
+        logger.warning(f"Rejecting job: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy: {str(e)}",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+    return await asyncio.wrap_future(future)
 
 app = FastAPI(
     title="Code Execution API",
@@ -125,9 +134,40 @@ app = FastAPI(
 # Mount static files to serve generated videos
 app.mount("/output", StaticFiles(directory=OUTPUT_DIR), name="output")
 
+@app.on_event("startup")
+async def startup_worker_pool():
+    """
+    Learn the names Manim exports for pre-flight checks, and start the
+    pre-warmed worker pool so the first render skips the Manim import
+    """
+    if PREFLIGHT_ENABLED:
+        # Importing Manim takes seconds; requests are checked without the names until then
+        threading.Thread(target=preflight.learn_manim_names, name="manim-names", daemon=True).start()
+    if WORKER_POOL_SIZE > 0:
+        logger.info(f"Starting worker pool with {WORKER_POOL_SIZE} pre-warmed workers")
+        await run_in_threadpool(start_worker_pool, WORKER_POOL_SIZE)
+
+@app.on_event("shutdown")
+async def shutdown_scheduler():
+    """Cancel queued renders and stop pool workers when the server stops"""
+    scheduler.shutdown()
+    await run_in_threadpool(stop_worker_pool)
+
 class CodeExecutionRequest(BaseModel):
     code: str
     timeout: Optional[int] = 30
+    conversationId: Optional[str] = None
+    user_id: Optional[str] = None
+    use_cache: Optional[bool] = True
+    concat_scenes: Optional[bool] = True
+    parallel_segments: Optional[int] = 0
+    quality: Optional[str] = 'medium'
+    preview: Optional[bool] = False
+    stream_upload: Optional[bool] = False
+    output_format: Optional[str] = 'mp4'
+    animated_preview: Optional[bool] = False
+    encoder_profile: Optional[str] = None
+    profile: Optional[bool] = False
 
 class CodeExecutionResponse(BaseModel):
     success: bool
@@ -136,6 +176,7 @@ class CodeExecutionResponse(BaseModel):
     execution_time: float
     installed_packages: list
     failed_packages: list
+    timed_out: bool = False
 
 @app.get("/")
 async def root():
@@ -160,7 +201,7 @@ async def execute_code(request: CodeExecutionRequest) -> CodeExecutionResponse:
         logger.info(f"Timeout: {request.timeout}s")
         logger.info("Code received:")
         logger.info("-" * 40)
-        logger.info(request.code)
+        logger.info(clip_for_log(request.code))
         logger.info("-" * 40)
         
         # Pretty print the code for better readability
@@ -169,12 +210,14 @@ async def execute_code(request: CodeExecutionRequest) -> CodeExecutionResponse:
         print(f"⏱️  Timeout: {request.timeout}s")
         print("\n📋 CODE TO EXECUTE:")
         print("=" * 60)
-        print(request.code)
+        print(clip_for_log(request.code))
         print("=" * 60)
         
         # Execute the code
         logger.info("Starting code execution...")
-        result = execute_code_with_requirements(request.code, request.timeout)
+        result = await run_on_scheduler(
+            execute_code_with_requirements, request.code, request.timeout, tenant=EXECUTE_TENANT
+        )
         
         logger.info("Code execution completed")
         logger.info(f"✅ Success: {result['success']}")
@@ -191,17 +234,191 @@ async def execute_code(request: CodeExecutionRequest) -> CodeExecutionResponse:
         
         return CodeExecutionResponse(**result)
         
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Internal server error: {str(e)}"
         logger.error(f"❌ EXECUTION ERROR: {error_msg}")
         print(f"\n💥 FATAL ERROR: {error_msg}")
         raise HTTPException(status_code=500, detail=error_msg)
 
+def cached_render(payload: Dict[str, Any], cache_key: str = None):
+    """
+    Return a finished job for ``payload`` if identical code and settings were
+    rendered before; ``cache_key`` is its ``manim_cache_key``, if known
+    """
+    if not payload.get('use_cache', True) or not render_cache.enabled:
+        return None
+    cached = render_cache.get(cache_key or manim_cache_key(payload))
+    job_metrics.record_cache('render', hits=int(cached is not None), misses=int(cached is None))
+    if cached is None:
+        return None
+    cached['cache_hit'] = True
+    job = job_manager.add_finished(payload, cached)
+    logger.info(f"Render cache hit, job {job.id} served from cache")
+    return job
+
+def tenant_of(payload: Dict[str, Any]) -> Optional[str]:
+    """Who a render is for, when sharing render slots fairly"""
+    return payload.get('user_id') or payload.get('conversationId')
+
+def submit_render(payload: Dict[str, Any], deadline: float = None):
+    """
+    Queue a render for ``payload``, answer it from the render cache, or attach
+    it to an identical render that is already in flight
+
+    The render is scheduled by its estimated run time and ``deadline``.
+
+    Raises:
+        HTTPException: 422 if the render cannot finish by ``deadline`` even on
+        an idle server, 429 if its tenant already has its share of the queue,
+        503 with a Retry-After header if no slot is available in time
+    """
+    cache_key = manim_cache_key(payload)
+    job = cached_render(payload, cache_key)
+    if job is not None:
+        return job
+    estimate = payload['estimate'] = estimate_render(payload)
+
+    # An identical render already in flight picks up this request as another
+    # waiter, unless the request wants a profile of its own render. The timeout
+    # is part of the key: a request must not inherit a shorter kill deadline.
+    # So is preview: a draft only shares a job that has a final render to follow
+    dedup_key = f"{cache_key}:{payload['timeout']}:{'preview' if payload.get('preview') else 'final'}"
+    try:
+        return job_manager.submit(
+            payload, run_manim_job,
+            dedup_key=None if payload.get('profile') else dedup_key,
+            estimated_seconds=estimate['seconds'] if estimate else None,
+            deadline=deadline,
+            # An uncalibrated estimate is not trusted to turn work away
+            reject_late=REJECT_LATE_JOBS and bool(estimate and estimate['calibrated']),
+            tenant=tenant_of(payload)
+        )
+    except TenantLimitError as e:
+        logger.warning(f"Rejecting job: {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many renders queued: {str(e)}",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+    except DeadlineError as e:
+        logger.warning(f"Rejecting job: {str(e)}")
+        if e.wait_seconds <= 0:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Render is estimated to take {e.estimated_seconds:.0f}s, longer than its timeout"
+            )
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy: {str(e)}",
+            headers={"Retry-After": str(math.ceil(e.wait_seconds))}
+        )
+    except SchedulerFullError as e:
+        logger.warning(f"Rejecting job: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy: {str(e)}",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+def submit_manim_job(request: CodeExecutionRequest):
+    """
+    Queue a Manim render job for the request
+
+    In preview mode a draft render is queued and returned, and the render at
+    the requested quality follows as a second job once the draft is done;
+    its result then replaces the draft's on the returned job.
+
+    Raises:
+        HTTPException: 400 for an unknown quality, 422 with the diagnostics if
+        pre-flight checks find the code cannot render or if it cannot render
+        within ``timeout``, 429 if the user or conversation already has too
+        many renders queued, 503 with a Retry-After header if no slot is
+        available in time
+    """
+    capture_request(request)
+    if "timeout" not in request.model_fields_set:
+        request.timeout = MANIM_DEFAULT_TIMEOUT
+    if request.quality not in QUALITY_PRESETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown quality '{request.quality}', expected one of: {', '.join(QUALITY_PRESETS)}"
+        )
+    if request.output_format not in OUTPUT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown output_format '{request.output_format}', expected one of: {', '.join(OUTPUT_FORMATS)}"
+        )
+    if request.encoder_profile is not None and request.encoder_profile not in ENCODER_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown encoder_profile '{request.encoder_profile}', expected one of: {', '.join(ENCODER_PROFILES)}"
+        )
+    payload = request.model_dump()
+    deadline = time.time() + request.timeout
+    if request.profile:
+        # A cached result has no profile
+        payload['use_cache'] = False
+
+    if PREFLIGHT_ENABLED:
+        # Before any slot is taken: doomed code is rejected in milliseconds
+        pool = get_worker_pool()
+        # Learned at startup; a warm pool worker knows them too if that failed
+        manim_names = preflight.manim_names() or (pool.manim_names if pool else None)
+        report = preflight.check(prepare_manim_code(request.code), manim_names)
+        if not report['ok']:
+            errors = [d for d in report['diagnostics'] if d['severity'] == 'error']
+            logger.info(f"Pre-flight rejected code: {errors[0]['message']}")
+            raise HTTPException(status_code=422, detail={
+                'message': f"Code cannot be rendered: {errors[0]['message']}",
+                'diagnostics': report['diagnostics']
+            })
+        payload['preflight'] = report
+
+    if not request.preview or request.quality == PREVIEW_QUALITY:
+        # A draft-quality request has no final render to follow
+        return submit_render(dict(payload, preview=False), deadline)
+
+    # Nothing to preview if the final render is already cached
+    job = cached_render(payload)
+    if job is not None:
+        return job
+
+    preview_job = submit_render(dict(payload, quality=PREVIEW_QUALITY), deadline)
+    final_payload = dict(payload, preview=False)
+    final_payload['estimate'] = estimate_render(final_payload)
+    final_job = job_manager.submit_followup(
+        preview_job, final_payload, run_manim_job, merge=merge_final_render,
+        estimated_seconds=(final_payload['estimate'] or {}).get('seconds'), deadline=deadline
+    )
+    logger.info(f"Preview job {preview_job.id} will be followed by {request.quality} render {final_job.id}")
+    return preview_job
+
+def capture_request(request: CodeExecutionRequest):
+    """Append ``request`` to REQUEST_CAPTURE_FILE as the client sent it, without defaults filled in"""
+    if not REQUEST_CAPTURE_FILE:
+        return
+    line = json.dumps({'time': time.time(), 'body': request.model_dump(exclude_unset=True)})
+    try:
+        with capture_lock, open(REQUEST_CAPTURE_FILE, "a") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        logger.warning(f"Could not capture request: {str(e)}")
+
+def get_job_or_404(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
 @app.post("/run-manim")
 async def run_manim(request: CodeExecutionRequest):
     """
     Specialized endpoint for running Manim animations
     This endpoint is specifically designed for animation generation and uploads results to S3
+
+    Thin wrapper over the job API: submits a job and waits for its result.
     """
     try:
         logger.info("=" * 80)
@@ -209,7 +426,7 @@ async def run_manim(request: CodeExecutionRequest):
         logger.info(f"Timeout: {request.timeout}s")
         logger.info("Manim code received:")
         logger.info("-" * 40)
-        logger.info(request.code)
+        logger.info(clip_for_log(request.code))
         logger.info("-" * 40)
         
         print("\n🎬 MANIM ANIMATION REQUEST:")
@@ -217,84 +434,84 @@ async def run_manim(request: CodeExecutionRequest):
         print(f"⏱️  Timeout: {request.timeout}s")
         print("\n📋 MANIM CODE TO EXECUTE:")
         print("=" * 60)
-        print(request.code)
+        print(clip_for_log(request.code))
         print("=" * 60)
         
-        # Add manim-specific imports and setup if not present
-        manim_code = request.code
-        if "from manim import *" not in manim_code and "import manim" not in manim_code:
-            manim_code = "from manim import *\n" + manim_code
-            logger.info("Added 'from manim import *' to code")
-            print("📦 Added 'from manim import *' to code")
-        
-        # Execute the code with Manim-specific handling
-        logger.info("Starting Manim code execution...")
-        result = execute_code_with_requirements(manim_code, request.timeout, is_manim=True)
-        
-        # Upload generated files to S3
-        s3_upload_results = []
-        main_video_url = None
-        
-        if result['success'] and result.get('generated_files'):
-            # Get full paths of generated files (should be only one now)
-            file_paths = [os.path.join(OUTPUT_DIR, filename) for filename in result['generated_files']]
-            
-            # Upload files to S3
-            logger.info(f"Uploading {len(file_paths)} file(s) to S3...")
-            s3_upload_results = upload_files_to_s3(file_paths)
-            
-            # Get the main video URL (should be only one)
-            successful_uploads = [upload for upload in s3_upload_results if upload['success']]
-            if successful_uploads:
-                main_video_url = successful_uploads[0]['url']
-                logger.info(f"Main video URL: {main_video_url}")
-            
-            # Clean up local files after successful upload
-            for file_path in file_paths:
-                try:
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up local file: {file_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to clean up local file {file_path}: {str(e)}")
-        
-        # Prepare response with single video URL
-        response = {
-            "success": result['success'],
-            "output": result['output'],
-            "error": result['error'],
-            "execution_time": result['execution_time'],
-            "installed_packages": result['installed_packages'],
-            "failed_packages": result['failed_packages'],
-            "generated_files": result.get('generated_files', []),
-            "s3_uploads": s3_upload_results,
-            "video_url": main_video_url,  # Single video URL
-            "video_urls": [main_video_url] if main_video_url else [],  # Array with one URL for backward compatibility
-            "thumbnailUrl": main_video_url  # Use the same URL as thumbnail
-        }
-        
-        logger.info("Manim execution and S3 upload completed")
-        logger.info(f"✅ Success: {result['success']}")
-        logger.info(f"⏱️  Execution time: {result['execution_time']:.2f}s")
-        logger.info(f"🎥 Generated files: {result.get('generated_files', [])}")
-        logger.info(f"☁️  S3 Upload results: {s3_upload_results}")
-        
-        print(f"\n🎯 MANIM EXECUTION RESULT:")
-        print(f"✅ Success: {result['success']}")
-        print(f"⏱️  Time: {result['execution_time']:.2f}s")
-        print(f"🎥 Generated files: {result.get('generated_files', [])}")
-        print(f"☁️  S3 Upload results: {s3_upload_results}")
-        print(f"📤 Output: {result['output'][:200]}..." if len(result['output']) > 200 else f"📤 Output: {result['output']}")
-        if result['error']:
-            print(f"❌ Error: {result['error'][:200]}..." if len(result['error']) > 200 else f"❌ Error: {result['error']}")
-        
-        return response
+        # Render and upload off the event loop on the bounded scheduler; with a
+        # job queue even submitting is a round trip to Redis or SQLite
+        job = await run_in_threadpool(submit_manim_job, request)
+        return await asyncio.wrap_future(job.future)
         
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Internal server error: {str(e)}"
         logger.error(f"❌ MANIM EXECUTION ERROR: {error_msg}")
         print(f"\n💥 MANIM FATAL ERROR: {error_msg}")
         raise HTTPException(status_code=500, detail=error_msg)
 
+@app.post("/jobs", status_code=202)
+async def create_job(request: CodeExecutionRequest):
+    """
+    Submit a Manim render job and return immediately
+
+    Poll GET /jobs/{job_id} or stream GET /jobs/{job_id}/events for progress.
+    The finished job's ``result`` has the same shape as a /run-manim response.
+    """
+    job = await run_in_threadpool(submit_manim_job, request)
+    record = await run_in_threadpool(job.to_dict)
+    logger.info(f"Queued job {job.id} ({len(request.code)} characters of code)")
+    return {
+        "job_id": job.id,
+        "status": record['status'],
+        "status_url": f"/jobs/{job.id}"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report a job's status: queued, rendering, encoding, uploading, done, failed or cancelled"""
+    job = await run_in_threadpool(get_job_or_404, job_id)
+    return await run_in_threadpool(job.to_dict)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Stream a job's status changes as server-sent events until it finishes"""
+    job = await run_in_threadpool(get_job_or_404, job_id)
+
+    async def event_stream():
+        last_state = None
+        while True:
+            # One snapshot per poll: with a job queue every read is a round trip
+            record = await run_in_threadpool(job.to_dict)
+            finished = record['status'] in TERMINAL_STATES
+            # A playlist URL appears while the job is still rendering
+            state = (record['status'], record['playlist_url'])
+            if state != last_state or finished:
+                last_state = state
+                yield f"data: {json.dumps(record)}\n\n"
+            if finished:
+                break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a job; a running render is killed, a queued one never starts"""
+    await run_in_threadpool(get_job_or_404, job_id)
+    job = await run_in_threadpool(job_manager.cancel, job_id)
+    record = await run_in_threadpool(job.to_dict)
+    logger.info(f"Cancel requested for job {job_id}, status now {record['status']}")
+    return record
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage timings, job outcomes, cache lookups and uploaded bytes"""
+    if not job_metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled or prometheus_client is not installed")
+    body, content_type = job_metrics.exposition()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/health")
 async def health_check():
     """Detailed health check endpoint"""
@@ -302,12 +519,23 @@ async def health_check():
         logger.info("Health check endpoint called")
         print("\n🏥 HEALTH CHECK CALLED")
         
-        # Test basic functionality
-        test_result = execute_code_with_requirements("print('Health check')", 5)
+        # Test basic functionality on the shared threadpool in a fresh
+        # interpreter, not a render slot or pool worker, so health checks still
+        # answer while every slot and worker is busy
+        test_result = await run_in_threadpool(CodeExecutor().execute_code, "print('Health check')", 5)
+        # A job queue's counts come from Redis or SQLite
+        job_stats = await run_in_threadpool(job_manager.stats)
         
         health_status = {
             "status": "healthy",
             "test_execution": test_result['success'],
+            "scheduler": scheduler.stats(),
+            "worker_pool": get_worker_pool().stats() if get_worker_pool() else None,
+            "render_cache": render_cache.stats(),
+            "glyph_cache": glyph_cache.stats(),
+            "partial_movie_cache": partial_movie_cache.stats(),
+            "jobs": job_stats,
+            "estimator": render_estimator.stats(),
             "message": "Code execution service is operational"
         }
         
@@ -0,0 +1,332 @@
+import math
+import os
+import shutil
+import subprocess
+from fractions import Fraction
+from typing import Callable, List
+
+try:
+    # Manim encodes through PyAV, so it is there whenever Manim is
+    import av
+except ImportError:
+    av = None
+
+# ffmpeg binary used for post-processing rendered videos
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+
+class MediaError(RuntimeError):
+    """Raised when an ffmpeg step fails"""
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG_BINARY) is not None
+
+
+def can_concat() -> bool:
+    """Whether ``concat_videos`` has ffmpeg or PyAV to work with"""
+    return ffmpeg_available() or av is not None
+
+
+def run_ffmpeg(args: List[str], timeout: int = 300) -> None:
+    """Run ffmpeg with ``args``, raising MediaError with its stderr on failure"""
+    command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y"] + args
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except FileNotFoundError:
+        raise MediaError(f"ffmpeg not found: {FFMPEG_BINARY}")
+    except subprocess.TimeoutExpired:
+        raise MediaError(f"ffmpeg timed out after {timeout}s")
+    if completed.returncode != 0:
+        raise MediaError(f"ffmpeg failed (exit code {completed.returncode}): {completed.stderr.strip()}")
+
+
+def concat_videos(input_paths: List[str], output_path: str) -> str:
+    """
+    Join videos end to end without re-encoding
+
+    Uses the ffmpeg concat demuxer with stream copy, so the inputs must share
+    codec, resolution and frame rate (true for scenes rendered with the same
+    settings). Without an ffmpeg binary the same remux is done through PyAV,
+    the way Manim combines its partial movie files.
+
+    Returns:
+        str: ``output_path``
+    """
+    if not input_paths:
+        raise MediaError("No videos to concatenate")
+
+    list_path = output_path + ".txt"
+    with open(list_path, "w") as f:
+        for path in input_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        if ffmpeg_available():
+            run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path])
+        elif av is not None:
+            _concat_with_av(list_path, output_path)
+        else:
+            raise MediaError(f"Neither ffmpeg ({FFMPEG_BINARY}) nor PyAV is available")
+    finally:
+        os.remove(list_path)
+    return output_path
+
+
+def _concat_with_av(list_path: str, output_path: str) -> None:
+    try:
+        source = av.open(list_path, format="concat", options={"safe": "0", "an": "1"})
+        source_stream = source.streams.video[0]
+        output = av.open(output_path, mode="w")
+        output_stream = output.add_stream(template=source_stream)
+        for packet in source.demux(source_stream):
+            # Skip the flushing packets demux yields at the end of each input
+            if packet.dts is None:
+                continue
+            # Timestamps restart in every input; let libav recompute them
+            packet.dts = None
+            packet.stream = output_stream
+            output.mux(packet)
+        source.close()
+        output.close()
+    except av.error.FFmpegError as e:
+        raise MediaError(f"PyAV concat failed: {e}")
+
+
+def remux_faststart(input_path: str, output_path: str) -> str:
+    """
+    Copy an MP4 with its index (the moov atom) moved to the front
+
+    Players, browsers in particular, can then start before the whole file
+    has downloaded. Streams are copied, not re-encoded. PyAV is tried first,
+    since it can tell HEVC apart and tag it the way Apple players need.
+
+    Returns:
+        str: ``output_path``
+    """
+    if av is not None:
+        try:
+            with av.open(input_path) as source:
+                source_stream = source.streams.video[0]
+                with av.open(output_path, mode="w", options={"movflags": "faststart"}) as output:
+                    output_stream = output.add_stream(template=source_stream)
+                    if source_stream.codec_context.name == "hevc":
+                        # Apple players only take HEVC in MP4 under this tag
+                        output_stream.codec_tag = "hvc1"
+                    for packet in source.demux(source_stream):
+                        if packet.dts is None:
+                            continue
+                        packet.stream = output_stream
+                        output.mux(packet)
+        except av.error.FFmpegError as e:
+            raise MediaError(f"PyAV faststart remux failed: {e}")
+    elif ffmpeg_available():
+        run_ffmpeg(["-i", input_path, "-map", "0", "-c", "copy", "-movflags", "+faststart", output_path])
+    else:
+        raise MediaError(f"Neither ffmpeg ({FFMPEG_BINARY}) nor PyAV is available")
+    return output_path
+
+
+class FragmentedMp4Writer:
+    """
+    Remux finished MP4 files, one after another, into a single fragmented MP4
+
+    Each appended file continues the timeline where the previous one ended,
+    like the concat demuxer, but the output is written as fragments to
+    ``sink`` as soon as they are complete, so it can be uploaded while later
+    files are still being encoded. Audio is not carried over.
+    """
+
+    def __init__(self, sink: Callable[[bytes], None]):
+        if av is None:
+            raise MediaError("PyAV is required to write fragmented MP4")
+        self._sink = _SinkFile(sink)
+        self._output = None
+        self._stream = None
+        self._end = Fraction(0)
+        self.files = 0
+
+    def append(self, path: str) -> None:
+        try:
+            with av.open(path) as source:
+                source_stream = source.streams.video[0]
+                time_base = source_stream.time_base
+                offset = int(self._end / time_base)
+                if self._output is None:
+                    # Fragments need no seeking back, and an empty moov lets
+                    # players start before the last fragment exists
+                    self._output = av.open(self._sink, mode="w", format="mp4", options={
+                        "movflags": "frag_keyframe+empty_moov+default_base_moof"
+                    })
+                    self._stream = self._output.add_stream(template=source_stream)
+                end = offset
+                for packet in source.demux(source_stream):
+                    if packet.dts is None:
+                        continue
+                    packet.pts += offset
+                    packet.dts += offset
+                    end = max(end, packet.pts + packet.duration)
+                    packet.stream = self._stream
+                    self._output.mux(packet)
+                self._end = end * time_base
+                self.files += 1
+        except av.error.FFmpegError as e:
+            raise MediaError(f"Could not append {path} to the fragmented MP4: {e}")
+
+    def close(self) -> None:
+        """Write the last fragment"""
+        if self._output is None:
+            raise MediaError("No videos were appended")
+        try:
+            self._output.close()
+        except av.error.FFmpegError as e:
+            raise MediaError(f"Could not finish the fragmented MP4: {e}")
+
+
+class HlsSegmenter:
+    """
+    Remux finished MP4 files, one after another, into the MPEG-TS segments of
+    one continuous HLS stream
+
+    Every appended file becomes one segment in ``output_dir``, with timestamps
+    continuing where the previous segment ended, so a player can start on the
+    first segments while later ones do not exist yet.
+    """
+
+    # Keeps the B-frame lead-in of the first segment from going negative
+    START_SECONDS = 1
+
+    def __init__(self, output_dir: str, target_duration: int = 10):
+        if av is None:
+            raise MediaError("PyAV is required to write HLS segments")
+        self.output_dir = output_dir
+        self.target_duration = target_duration
+        os.makedirs(output_dir, exist_ok=True)
+        self.segments = []
+        self._end = Fraction(self.START_SECONDS)
+
+    def append(self, path: str) -> str:
+        """
+        Returns:
+            str: File name of the new segment in ``output_dir``
+        """
+        name = f"segment_{len(self.segments):05d}.ts"
+        try:
+            with av.open(path) as source:
+                source_stream = source.streams.video[0]
+                time_base = source_stream.time_base
+                offset = int(self._end / time_base)
+                end = offset
+                # copyts: our timestamps are already continuous across segments
+                with av.open(os.path.join(self.output_dir, name), mode="w", format="mpegts",
+                             options={"mpegts_copyts": "1"}) as output:
+                    output_stream = output.add_stream(template=source_stream)
+                    for packet in source.demux(source_stream):
+                        if packet.dts is None:
+                            continue
+                        packet.pts += offset
+                        packet.dts += offset
+                        end = max(end, packet.pts + packet.duration)
+                        packet.stream = output_stream
+                        output.mux(packet)
+        except av.error.FFmpegError as e:
+            raise MediaError(f"Could not segment {path}: {e}")
+        self.segments.append((name, float((end - offset) * time_base)))
+        self._end = end * time_base
+        return name
+
+    def playlist(self, ended: bool = False) -> str:
+        """
+        The HLS media playlist of the segments so far
+
+        Args:
+            ended (bool): Whether no more segments will follow
+        """
+        # Must not change while the playlist grows, so it is fixed up front and
+        # only raised for an animation longer than any expected
+        target = max([self.target_duration] + [math.ceil(duration) for _, duration in self.segments])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{target}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            # Segments are only ever added, so players can seek back to the start
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+        ]
+        for name, duration in self.segments:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(name)
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+
+def make_animated_preview(
+    video_path: str,
+    output_path: str,
+    width: int = 320,
+    fps: float = 4,
+    max_frames: int = 32
+) -> str:
+    """
+    Write a small looping animated WebP of a video
+
+    Frames are taken at ``fps``, or spread evenly over the whole video when
+    that would give more than ``max_frames``, and scaled down to ``width``
+    while decoding.
+
+    Returns:
+        str: ``output_path``, or the same path ending in .gif if Pillow was
+        built without WebP
+    """
+    if av is None:
+        raise MediaError("PyAV is required to write an animated preview")
+    try:
+        from PIL import features
+    except ImportError:
+        raise MediaError("Pillow is required to write an animated preview")
+
+    frames = []
+    try:
+        with av.open(video_path) as source:
+            stream = source.streams.video[0]
+            stream.thread_type = "AUTO"
+            if stream.duration is not None:
+                duration = float(stream.duration * stream.time_base)
+            else:
+                duration = (source.duration or 0) / av.time_base
+            count = max(1, min(max_frames, math.ceil(duration * fps)))
+            step = duration / count if duration > 0 else 1 / fps
+            height = round(stream.height * width / stream.width / 2) * 2
+            next_time = 0.0
+            for frame in source.decode(stream):
+                if frame.time is None or frame.time < next_time:
+                    continue
+                frames.append(frame.to_image(width=width, height=height))
+                if len(frames) == count:
+                    break
+                next_time = len(frames) * step
+    except av.error.FFmpegError as e:
+        raise MediaError(f"Could not decode {video_path}: {e}")
+    if not frames:
+        raise MediaError(f"No frames decoded from {video_path}")
+
+    # Always played back at ``fps``, so long videos come out sped up
+    options = {'save_all': True, 'append_images': frames[1:], 'duration': round(1000 / fps), 'loop': 0}
+    if features.check_module("webp"):
+        frames[0].save(output_path, format="WEBP", quality=60, method=4, **options)
+    else:
+        output_path = os.path.splitext(output_path)[0] + ".gif"
+        frames[0].save(output_path, format="GIF", optimize=True, **options)
+    return output_path
+
+
+class _SinkFile:
+    """Write-only, unseekable file object that forwards to a callable"""
+
+    def __init__(self, sink: Callable[[bytes], None]):
+        self._sink = sink
+
+    def write(self, data) -> int:
+        self._sink(bytes(data))
+        return len(data)
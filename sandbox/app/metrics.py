@@ -0,0 +1,125 @@
+"""
+Prometheus metrics for render jobs, served on /metrics.
+
+Every finished /run-manim job adds the seconds it spent in each stage (see
+``STAGES``) to the ``manim_stage_seconds`` histogram, and is counted in
+``manim_jobs_total`` by outcome. Cache lookups, uploaded bytes and the
+bytes jobs write to stdout and stderr are counted as well. Metrics are only collected when ``prometheus_client`` is
+installed.
+"""
+import os
+from typing import Any, Dict, Tuple
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Stages of a render job in the order they run, as reported under ``stages``
+STAGES = (
+    'queue_wait',     # waiting for a render slot or queue worker
+    'preflight',      # static checks, before the job was queued
+    'prepare',        # parsing the code and injecting the render code
+    'manim_import',   # starting the job process up to the scene, mostly importing Manim
+    'construct',      # building the scene outside play and wait
+    'render_frames',  # drawing frames
+    'encoding',       # encoding partial movies and combining them
+    'concat',         # joining scenes or segments
+    'remux',          # moving the MP4 index to the front
+    'discover',       # finding the rendered files
+    'thumbnails',     # making the animated preview
+    'copy',           # copying videos to the output directory
+    'upload',         # uploading videos and thumbnails
+    'cleanup',        # removing the job directory
+)
+
+# From a few milliseconds (cache lookups, cleanup) to a ten-minute render
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def job_outcome(result: Dict[str, Any]) -> str:
+    if result.get('cancelled'):
+        return 'cancelled'
+    if result.get('timed_out'):
+        return 'timeout'
+    return 'success' if result.get('success') else 'failure'
+
+
+class JobMetrics:
+    """Prometheus collectors for render jobs; every method is a no-op while disabled"""
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, registry=None):
+        self.enabled = enabled and prometheus_client is not None
+        if not self.enabled:
+            return
+        if registry is None:
+            # Also holds the process and Python collectors
+            registry = prometheus_client.REGISTRY
+        self.registry = registry
+        self.stage_seconds = prometheus_client.Histogram(
+            'manim_stage_seconds', 'Seconds render jobs spent in each stage', ['stage'],
+            buckets=STAGE_BUCKETS, registry=registry
+        )
+        self.job_seconds = prometheus_client.Histogram(
+            'manim_job_seconds', 'Seconds render jobs took from submission to result, by outcome', ['outcome'],
+            buckets=STAGE_BUCKETS, registry=registry
+        )
+        self.jobs = prometheus_client.Counter(
+            'manim_jobs', 'Render jobs finished, by outcome: success, failure, timeout or cancelled', ['outcome'],
+            registry=registry
+        )
+        self.cache_lookups = prometheus_client.Counter(
+            'manim_cache_lookups', 'Cache lookups by cache (render, glyph, partial_movie) and result (hit, miss)',
+            ['cache', 'result'], registry=registry
+        )
+        self.uploaded_bytes = prometheus_client.Counter(
+            'manim_uploaded_bytes', 'Bytes of videos and thumbnails uploaded', registry=registry
+        )
+        self.log_bytes = prometheus_client.Counter(
+            'manim_log_bytes', 'Bytes render jobs wrote to stdout and stderr, by stream', ['stream'],
+            registry=registry
+        )
+
+    def record_job(self, response: Dict[str, Any]) -> None:
+        """Count a finished job from its /run-manim response"""
+        if not self.enabled:
+            return
+        outcome = job_outcome(response)
+        self.jobs.labels(outcome).inc()
+        stages = response.get('stages') or {}
+        for stage, seconds in stages.items():
+            self.stage_seconds.labels(stage).observe(seconds)
+        self.job_seconds.labels(outcome).observe(sum(stages.values()))
+        glyphs = response.get('glyph_cache') or {}
+        self.record_cache('glyph', glyphs.get('hits', 0), glyphs.get('misses', 0))
+        animations = response.get('animations') or {}
+        self.record_cache('partial_movie', animations.get('reused', 0), animations.get('rendered', 0))
+        uploaded = (response.get('upload') or {}).get('bytes')
+        if uploaded:
+            self.uploaded_bytes.inc(uploaded)
+        logs = response.get('logs') or {}
+        for stream in ('stdout', 'stderr'):
+            if logs.get(f'{stream}_bytes'):
+                self.log_bytes.labels(stream).inc(logs[f'{stream}_bytes'])
+
+    def record_cache(self, cache: str, hits: int = 0, misses: int = 0) -> None:
+        if not self.enabled:
+            return
+        if hits:
+            self.cache_lookups.labels(cache, 'hit').inc(hits)
+        if misses:
+            self.cache_lookups.labels(cache, 'miss').inc(misses)
+
+    def exposition(self) -> Tuple[bytes, str]:
+        """The metrics in the Prometheus text format, and its content type"""
+        return prometheus_client.generate_latest(self.registry), prometheus_client.CONTENT_TYPE_LATEST
+
+    def serve(self, port: int) -> None:
+        """Serve the metrics on their own port, for processes without an API (queue workers)"""
+        if self.enabled:
+            prometheus_client.start_http_server(port, registry=self.registry)
+
+
+job_metrics = JobMetrics()
@@ -0,0 +1,251 @@
+import os
+import logging
+import time
+from typing import Dict, Any, List, Optional
+from worker import execute_code_with_requirements, QUALITY_PRESETS, DEFAULT_QUALITY, DEFAULT_ENCODER_PROFILE
+from storage import upload_files_to_s3, summarize_uploads, start_multipart_upload, upload_file, object_url
+from streaming import HlsStream
+from cache import render_cache, render_cache_key
+from estimator import render_estimator
+from metrics import STAGES, job_metrics
+
+logger = logging.getLogger(__name__)
+
+# Directory the executor copies finished videos into when they are not uploaded
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output")
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+# "mp4" returns a video file; "hls" also publishes the video as an HLS
+# playlist while it renders, so clients can start playing early
+OUTPUT_FORMATS = ('mp4', 'hls')
+
+
+def prepare_manim_code(code: str) -> str:
+    """Add the Manim star import if the code does not import Manim itself"""
+    if "from manim import *" not in code and "import manim" not in code:
+        logger.info("Added 'from manim import *' to code")
+        print("📦 Added 'from manim import *' to code")
+        return "from manim import *\n" + code
+    return code
+
+
+def render_settings(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Settings that change the rendered video, and therefore belong in the cache key"""
+    settings = dict(QUALITY_PRESETS[payload.get('quality') or DEFAULT_QUALITY])
+    settings['concat_scenes'] = payload.get('concat_scenes', True)
+    settings['output_format'] = payload.get('output_format') or 'mp4'
+    settings['animated_preview'] = bool(payload.get('animated_preview'))
+    settings['encoder_profile'] = payload.get('encoder_profile') or DEFAULT_ENCODER_PROFILE
+    return settings
+
+
+def manim_cache_key(payload: Dict[str, Any]) -> str:
+    """Render cache key for a /run-manim request body, from the digest pre-flight took if it was checked"""
+    digest = (payload.get('preflight') or {}).get('code_digest')
+    if digest:
+        return render_cache_key(payload['code'], render_settings(payload), digest)
+    return render_cache_key(prepare_manim_code(payload['code']), render_settings(payload))
+
+
+def estimate_render(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Predicted run time of a /run-manim request body, or None if it was not pre-flight checked"""
+    features = (payload.get('preflight') or {}).get('features')
+    if not features:
+        return None
+    # Scenes render side by side; a single scene may be split into segments
+    if features['scenes'] > 1:
+        parallel = features['scenes']
+    else:
+        parallel = payload.get('parallel_segments') or 1
+    return render_estimator.estimate(features, payload.get('quality') or DEFAULT_QUALITY, parallel)
+
+
+def run_manim_job(job) -> Dict[str, Any]:
+    """
+    Render a job's Manim code and upload the resulting video to S3
+
+    Runs on a scheduler worker thread, never on the event loop. Progress is
+    reported through ``job.set_status`` and the render is killed if
+    ``job.cancel_event`` is set.
+
+    Args:
+        job: A ``jobs.Job`` whose payload holds ``code`` and ``timeout``
+
+    Returns:
+        dict: The /run-manim response body
+    """
+    started_at = time.time()
+    manim_code = prepare_manim_code(job.payload['code'])
+    # Every upload of the job (videos, then thumbnails) and the time they took
+    uploads = []
+    upload_seconds = []
+
+    def publish(file_paths: List[str], object_names: List[str]) -> List[Dict[str, Any]]:
+        # Runs while the videos are still in the render directory, so they are
+        # uploaded from where Manim wrote them instead of from a copy
+        job.set_status('uploading')
+        logger.info(f"Uploading {len(file_paths)} file(s) to S3...")
+        start_time = time.time()
+        results = upload_files_to_s3(file_paths, object_names)
+        uploads.extend(results)
+        upload_seconds.append(time.time() - start_time)
+        return results
+
+    def start_hls(job_dir: str) -> HlsStream:
+        # The job reports the playlist as soon as the first segment is up
+        return HlsStream(job_dir, f"hls/{job.id}", upload_file, object_url, job.set_playlist_url)
+
+    logger.info(f"Starting Manim code execution for job {job.id}...")
+    result = execute_code_with_requirements(
+        manim_code,
+        job.payload['timeout'],
+        is_manim=True,
+        on_stage=job.set_status,
+        cancel_event=job.cancel_event,
+        concat_scenes=job.payload.get('concat_scenes', True),
+        parallel_segments=job.payload.get('parallel_segments') or 0,
+        quality=job.payload.get('quality') or DEFAULT_QUALITY,
+        # Animations the conversation already rendered are reused rather than rendered again
+        cache_scope=job.payload.get('conversationId'),
+        publish=publish,
+        # Upload the video while it is rendered rather than after
+        stream_upload=start_multipart_upload if job.payload.get('stream_upload') else None,
+        start_hls=start_hls if job.payload.get('output_format') == 'hls' else None,
+        animated_preview=bool(job.payload.get('animated_preview')),
+        encoder_profile=job.payload.get('encoder_profile') or DEFAULT_ENCODER_PROFILE,
+        # Found by the pre-flight check when the job was submitted
+        scene_names=(job.payload.get('preflight') or {}).get('scenes'),
+        profile=bool(job.payload.get('profile'))
+    )
+
+    # One upload per scene unless the scenes were concatenated
+    s3_upload_results = result.get('published') or []
+    if result.get('streamed'):
+        uploads.extend(s3_upload_results)
+        upload_seconds.append(s3_upload_results[0]['seconds'])
+    upload = summarize_uploads(uploads, sum(upload_seconds)) if uploads else {}
+    main_video_url = None
+
+    # The first video is the main one; the others are the remaining scenes in order
+    video_urls = [item['url'] for item in s3_upload_results if item['success']]
+    if video_urls:
+        main_video_url = video_urls[0]
+        logger.info(f"Main video URL: {main_video_url}")
+        logger.info(f"Uploaded {upload['bytes']} bytes in {upload['seconds']}s ({upload['throughput_mb_s']} MB/s)")
+
+    # Small stand-ins for the video, e.g. for conversation lists
+    thumbnails = {
+        kind: item['url'] for kind, item in (result.get('published_thumbnails') or {}).items() if item['success']
+    }
+
+    # Where the profile of a profiled job can be downloaded
+    profile = result.get('profile')
+    if profile:
+        published = result.get('published_profile') or {}
+        profile = dict(profile, url=published['url'] if published.get('success') else None)
+
+    # How much the job printed; the full logs of a job whose output was cut may be published
+    logs = result.get('logs')
+    if logs and logs.get('file'):
+        published = result.get('published_log') or {}
+        logs = dict(logs, url=published['url'] if published.get('success') else None)
+
+    # What the scheduler was told the job would take, against what it took
+    estimate = job.payload.get('estimate')
+    timing = None
+    if estimate:
+        seconds = time.time() - started_at
+        timing = {
+            'predicted_seconds': estimate['seconds'],
+            'actual_seconds': round(seconds, 3),
+            'queue_seconds': round(started_at - job.created_at, 3),
+            'calibrated': estimate['calibrated'],
+            'deadline_missed': job.deadline is not None and time.time() > job.deadline
+        }
+        # Reused animations make a render cheaper than its code predicts, profiling dearer
+        typical = not (result.get('animations') or {}).get('reused') and not job.payload.get('profile')
+        if result['success'] and typical:
+            render_estimator.record(estimate['vector'], seconds, estimate['seconds'])
+
+    # Where the job's time went, from submission to result
+    stages = {'queue_wait': started_at - job.created_at}
+    preflight_seconds = (job.payload.get('preflight') or {}).get('seconds')
+    if preflight_seconds is not None:
+        stages['preflight'] = preflight_seconds
+    stages.update(result.get('stages') or {})
+
+    # Prepare response with single video URL
+    response = {
+        "job_id": job.id,
+        "quality": job.payload.get('quality') or DEFAULT_QUALITY,
+        "success": result['success'],
+        "output": result['output'],
+        "error": result['error'],
+        "execution_time": result['execution_time'],
+        "timed_out": result.get('timed_out', False),
+        "cancelled": result.get('cancelled', False),
+        "time_to_first_frame": result.get('time_to_first_frame'),
+        "peak_rss_mb": result.get('peak_rss_mb'),
+        "glyph_cache": result.get('glyph_cache'),
+        "animations": result.get('animations'),
+        "encoder": result.get('encoder'),
+        "preflight": job.payload.get('preflight'),
+        "estimate": timing,
+        "stages": {name: round(stages[name], 4) for name in STAGES if name in stages},
+        "profile": profile,
+        "logs": logs,
+        "installed_packages": result['installed_packages'],
+        "failed_packages": result['failed_packages'],
+        "generated_files": result.get('generated_files', []),
+        "scenes": result.get('scenes', []),
+        "segments": result.get('segments', []),
+        "s3_uploads": s3_upload_results,
+        "upload": upload or None,
+        "streamed": result.get('streamed', False),
+        "playlist_url": (result.get('hls') or {}).get('playlist_url'),
+        "hls": result.get('hls'),
+        "last_frame_to_url": result.get('last_frame_to_url'),
+        "video_url": main_video_url,  # Single video URL
+        "video_urls": video_urls,  # Every uploaded video, one per scene when scenes are not concatenated
+        "poster_url": thumbnails.get('poster'),  # JPEG of the last frame
+        "animated_preview_url": thumbnails.get('animated_preview'),  # Short low-res WebP, if asked for
+        "thumbnailUrl": thumbnails.get('poster') or main_video_url,  # The video itself when there is no poster
+        "cache_hit": False
+    }
+
+    job_metrics.record_job(response)
+
+    # Only complete renders are worth serving again
+    if main_video_url and job.payload.get('use_cache', True):
+        render_cache.put(manim_cache_key(job.payload), response)
+
+    logger.info("Manim execution and S3 upload completed")
+    logger.info(f"✅ Success: {result['success']}")
+    logger.info(f"⏱️  Execution time: {result['execution_time']:.2f}s")
+    logger.info(f"🎥 Generated files: {result.get('generated_files', [])}")
+    logger.info(f"☁️  S3 Upload results: {s3_upload_results}")
+
+    print(f"\n🎯 MANIM EXECUTION RESULT:")
+    print(f"✅ Success: {result['success']}")
+    print(f"⏱️  Time: {result['execution_time']:.2f}s")
+    print(f"🎥 Generated files: {result.get('generated_files', [])}")
+    print(f"☁️  S3 Upload results: {s3_upload_results}")
+    print(f"📤 Output: {result['output'][:200]}..." if len(result['output']) > 200 else f"📤 Output: {result['output']}")
+    if result['error']:
+        print(f"❌ Error: {result['error'][:200]}..." if len(result['error']) > 200 else f"❌ Error: {result['error']}")
+
+    return response
+
+
+def merge_final_render(preview: Dict[str, Any], final: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Result of a preview job once its full-quality follow-up has finished
+
+    The final render's video and metadata replace the draft's under the
+    preview job's id, so clients holding that id see the final video.
+    """
+    merged = dict(final)
+    merged['job_id'] = preview['job_id']
+    merged['followup_job_id'] = final['job_id']
+    merged['preview_video_url'] = preview.get('video_url')
+    return merged
@@ -0,0 +1,391 @@
+"""
+Static checks of Manim code before it is rendered.
+
+A render that is bound to fail still takes a render slot and often runs for
+many seconds before it does. ``check`` parses the code once and looks for the
+common causes without running anything, in a few milliseconds:
+
+- no Scene subclass to render
+- names that are neither defined in the code, nor builtins, nor exported by Manim
+- imports of modules render code has no business using
+- scenes whose literal ``run_time`` and ``wait`` durations add up to far too long
+
+Problems are reported as structured diagnostics. Errors reject the request;
+warnings are passed along with the result. The report also carries the
+features ``estimator`` predicts the render time from, and the digest of the
+parsed code the render cache key is built from.
+
+The names Manim exports are learned once, at startup, by ``learn_manim_names``.
+"""
+import ast
+import builtins
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from cache import code_digest
+
+# Manim base classes whose subclasses are renderable scenes
+MANIM_SCENE_CLASSES = {
+    'Scene', 'MovingCameraScene', 'ThreeDScene', 'SpecialThreeDScene',
+    'ZoomedScene', 'VectorScene', 'LinearTransformationScene'
+}
+
+PREFLIGHT_ENABLED = os.getenv("PREFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Longest video, in seconds, the literal durations of all scenes may add up to
+PREFLIGHT_MAX_RUN_TIME = float(os.getenv("PREFLIGHT_MAX_RUN_TIME", "600"))
+
+# Top-level modules render code may not import
+PREFLIGHT_FORBIDDEN_IMPORTS = {
+    name.strip() for name in os.getenv(
+        "PREFLIGHT_FORBIDDEN_IMPORTS",
+        "subprocess,socket,ctypes,multiprocessing,pty,requests,urllib,http,ftplib,smtplib,telnetlib"
+    ).split(",") if name.strip()
+}
+
+# What ``play`` and ``wait`` last when no duration is given
+DEFAULT_RUN_TIME = 1.0
+
+# Scene classes that render in 3D, far slower per frame than the others
+MANIM_3D_SCENE_CLASSES = {'ThreeDScene', 'SpecialThreeDScene'}
+
+# Mobjects typeset with LaTeX, and those laid out with Pango
+TEX_CLASSES = {'Tex', 'MathTex', 'SingleStringMathTex', 'Title', 'BulletedList', 'DecimalNumber', 'Integer', 'Matrix'}
+TEXT_CLASSES = {'Text', 'MarkupText', 'Paragraph', 'Code'}
+
+# Defined in every module without being assigned
+MODULE_NAMES = {'__name__', '__file__', '__doc__', '__builtins__', '__spec__', '__loader__', '__package__'}
+
+# Names every piece of code can use without defining them
+PREDEFINED_NAMES = frozenset(dir(builtins)) | MODULE_NAMES
+
+# How long importing Manim may take when learning the names it exports
+MANIM_NAMES_TIMEOUT = 120
+
+# Names ``from manim import *`` defines, once ``learn_manim_names`` has run
+_manim_names = None
+
+
+def learn_manim_names(timeout: float = MANIM_NAMES_TIMEOUT) -> Optional[frozenset]:
+    """
+    Learn the names ``from manim import *`` defines, for ``manim_names``
+
+    Manim is imported in a child process, so the server itself never loads it.
+
+    Returns:
+        frozenset: The names, or None if Manim could not be imported
+    """
+    global _manim_names
+    script = "import json\nnamespace = {}\nexec('from manim import *', namespace)\nprint(json.dumps(sorted(namespace)))"
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, timeout=timeout, check=True
+        )
+        _manim_names = frozenset(json.loads(completed.stdout.strip().splitlines()[-1]))
+    except (subprocess.SubprocessError, OSError, ValueError, IndexError) as e:
+        print(f"⚠️  Could not learn the names Manim exports, undefined names will not be checked: {e}")
+        return None
+    print(f"✅ Learned {len(_manim_names)} names Manim exports")
+    return _manim_names
+
+
+def manim_names() -> Optional[frozenset]:
+    """Names ``from manim import *`` defines, or None until ``learn_manim_names`` has learned them"""
+    return _manim_names
+
+
+def scene_classes(tree: ast.Module) -> List[str]:
+    """
+    Find the Scene classes to render, in source order
+
+    A top-level class is a scene if one of its bases is a Manim scene class
+    (``Scene``, ``MovingCameraScene``, ``ThreeDScene``, ...) or another scene
+    defined in the same file, so indirect subclasses are found too. Local
+    base scenes that only exist to be subclassed (no ``construct`` of their
+    own) are skipped.
+    """
+    classes = [node for node in tree.body if isinstance(node, ast.ClassDef)]
+    scene_names = _subclasses(classes, MANIM_SCENE_CLASSES)
+
+    used_as_base = {_base_name(b) for node in classes if node.name in scene_names for b in node.bases}
+    scenes = []
+    for node in classes:
+        if node.name not in scene_names:
+            continue
+        if node.name in used_as_base and _construct(node) is None:
+            continue
+        scenes.append(node.name)
+    return scenes
+
+
+def check(code: str, manim_names: Optional[frozenset] = None) -> Dict[str, Any]:
+    """
+    Check Manim code without running it
+
+    Args:
+        code (str): The code as it will be rendered, Manim import included
+        manim_names (frozenset): Names ``from manim import *`` defines (see
+            ``manim_names``); without them undefined names are not looked for
+
+    Returns:
+        dict: ``ok`` (no errors), ``diagnostics`` (each with ``severity``,
+        ``code``, ``message``, ``line`` and ``column``), ``scenes`` to render,
+        ``run_time`` (literal durations of each scene, in seconds),
+        ``features`` of the code that predict its render time, the
+        ``code_digest`` that stands for it in cache keys (see
+        ``cache.render_cache_key``) and ``seconds`` the check took
+    """
+    start = time.perf_counter()
+    report = {
+        'ok': True, 'diagnostics': [], 'scenes': [], 'run_time': {}, 'features': None, 'code_digest': None,
+        'seconds': 0.0
+    }
+
+    def diagnose(severity: str, code: str, message: str, node: ast.AST = None) -> None:
+        report['diagnostics'].append({
+            'severity': severity,
+            'code': code,
+            'message': message,
+            'line': getattr(node, 'lineno', None),
+            'column': getattr(node, 'col_offset', None)
+        })
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        report['diagnostics'].append({
+            'severity': 'error',
+            'code': 'syntax-error',
+            'message': f"Syntax error: {e.msg}",
+            'line': e.lineno,
+            'column': e.offset
+        })
+        return _finish(report, start)
+
+    report['code_digest'] = code_digest(code, tree)
+    _check_imports(tree, diagnose)
+    _check_names(tree, manim_names, diagnose)
+
+    report['scenes'] = scene_classes(tree)
+    if not report['scenes']:
+        diagnose('error', 'no-scene', "No Scene subclass found; define a class that inherits from Scene")
+
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    plays = 0
+    for name in report['scenes']:
+        construct = _construct(classes[name])
+        if construct is None:
+            diagnose('warning', 'no-construct', f"Scene {name} has no construct method and renders nothing", classes[name])
+            continue
+        report['run_time'][name] = round(_tally(construct.body, _call_duration), 3)
+        plays += _tally(construct.body, _call_count)
+
+    total = sum(report['run_time'].values())
+    if total > PREFLIGHT_MAX_RUN_TIME:
+        diagnose(
+            'error', 'run-time-limit',
+            f"Animations add up to at least {total:.0f}s, more than the {PREFLIGHT_MAX_RUN_TIME:.0f}s allowed"
+        )
+
+    calls = [_base_name(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)]
+    three_d = _subclasses(classes.values(), MANIM_3D_SCENE_CLASSES)
+    report['features'] = {
+        'scenes': len(report['scenes']),
+        'plays': int(plays),
+        'animation_seconds': round(total, 3),
+        'animation_seconds_3d': round(sum(report['run_time'].get(name, 0.0) for name in three_d), 3),
+        'tex': sum(1 for name in calls if name in TEX_CLASSES),
+        'text': sum(1 for name in calls if name in TEXT_CLASSES)
+    }
+    return _finish(report, start)
+
+
+def _subclasses(classes: Iterable[ast.ClassDef], bases: set) -> set:
+    """Names of the classes that inherit from one of ``bases``, directly or through each other"""
+    found = set()
+    changed = True
+    while changed:
+        changed = False
+        for node in classes:
+            if node.name in found:
+                continue
+            if any(_base_name(b) in bases or _base_name(b) in found for b in node.bases):
+                found.add(node.name)
+                changed = True
+    return found
+
+
+def _finish(report: Dict[str, Any], start: float) -> Dict[str, Any]:
+    report['ok'] = not any(d['severity'] == 'error' for d in report['diagnostics'])
+    report['seconds'] = round(time.perf_counter() - start, 4)
+    return report
+
+
+def _base_name(base: ast.expr) -> Optional[str]:
+    if isinstance(base, ast.Name):
+        return base.id
+    if isinstance(base, ast.Attribute):  # e.g. manim.Scene
+        return base.attr
+    return None
+
+
+def _construct(node: ast.ClassDef) -> Optional[ast.FunctionDef]:
+    for item in node.body:
+        if isinstance(item, ast.FunctionDef) and item.name == 'construct':
+            return item
+    return None
+
+
+def _check_imports(tree: ast.Module, diagnose) -> None:
+    for node in ast.walk(tree):
+        modules = []
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules = [node.module]
+        elif (
+            isinstance(node, ast.Call) and node.args
+            and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)
+            and (
+                (isinstance(node.func, ast.Name) and node.func.id == '__import__')
+                or (isinstance(node.func, ast.Attribute) and node.func.attr == 'import_module')
+            )
+        ):
+            modules = [node.args[0].value]
+        for module in modules:
+            if module.split('.')[0] in PREFLIGHT_FORBIDDEN_IMPORTS:
+                diagnose('error', 'forbidden-import', f"Importing {module} is not allowed in render code", node)
+
+
+def _check_names(tree: ast.Module, manim_names: Optional[frozenset], diagnose) -> None:
+    # Scoping is not modelled: a name bound anywhere counts as defined everywhere,
+    # so only names that cannot resolve at all are reported
+    defined = set()
+    star_imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            defined.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            defined.add(node.name)
+        elif isinstance(node, ast.arg):
+            defined.add(node.arg)
+        elif isinstance(node, ast.alias):
+            if node.name == '*':
+                continue
+            defined.add(node.asname or node.name.split('.')[0])
+        elif isinstance(node, ast.ImportFrom) and any(alias.name == '*' for alias in node.names):
+            star_imports.append(node.module)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            defined.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            defined.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            defined.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            defined.add(node.rest)
+
+    imported = frozenset()
+    for module in star_imports:
+        if module != 'manim' or manim_names is None:
+            # Whatever this module exports is unknown here
+            return
+        imported = manim_names
+
+    reported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            if node.id in defined or node.id in PREDEFINED_NAMES or node.id in imported:
+                continue
+            if node.id not in reported:
+                reported.add(node.id)
+                diagnose('error', 'undefined-name', f"Name '{node.id}' is not defined", node)
+
+
+def _tally(body: List[ast.stmt], measure) -> float:
+    """Add up ``measure`` of every call statement in ``body``, repeated as often as literal loops run"""
+    total = 0.0
+    for statement in body:
+        if isinstance(statement, ast.For):
+            total += _tally(statement.body, measure) * _iterations(statement.iter)
+            total += _tally(statement.orelse, measure)
+        elif isinstance(statement, ast.If):
+            # Only one branch runs; count the smaller so the total stays a lower bound
+            total += min(_tally(statement.body, measure), _tally(statement.orelse, measure))
+        elif isinstance(statement, (ast.While, ast.With, ast.Try)):
+            total += _tally(statement.body, measure)
+        elif isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call):
+            total += measure(statement.value)
+    return total
+
+
+def _self_method(call: ast.Call) -> Optional[str]:
+    if isinstance(call.func, ast.Attribute) and isinstance(call.func.value, ast.Name) and call.func.value.id == 'self':
+        return call.func.attr
+    return None
+
+
+def _call_count(call: ast.Call) -> float:
+    # Manim writes one partial movie for every play and every wait
+    return 1.0 if _self_method(call) in ('play', 'wait') else 0.0
+
+
+def _call_duration(call: ast.Call) -> float:
+    """Seconds a ``play`` or ``wait`` call lasts, counting literal values only"""
+    method = _self_method(call)
+    keywords = {keyword.arg: keyword.value for keyword in call.keywords if keyword.arg}
+    if method == 'wait':
+        value = call.args[0] if call.args else keywords.get('duration')
+        return _number(value, DEFAULT_RUN_TIME) if value is not None else DEFAULT_RUN_TIME
+    if method == 'play':
+        if 'run_time' in keywords:
+            return _number(keywords['run_time'], DEFAULT_RUN_TIME)
+        # Without its own run_time, play lasts as long as its longest animation
+        run_times = [
+            _number(keyword.value, DEFAULT_RUN_TIME)
+            for arg in call.args if isinstance(arg, ast.Call)
+            for keyword in arg.keywords if keyword.arg == 'run_time'
+        ]
+        return max(run_times, default=DEFAULT_RUN_TIME)
+    return 0.0
+
+
+def _iterations(iterable: ast.expr) -> int:
+    if isinstance(iterable, (ast.List, ast.Tuple, ast.Set)):
+        return len(iterable.elts)
+    if (
+        isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name)
+        and iterable.func.id == 'range' and not iterable.keywords
+    ):
+        bounds = [_number(arg, None) for arg in iterable.args]
+        if bounds and all(isinstance(bound, int) for bound in bounds):
+            try:
+                return len(range(*bounds))
+            except (ValueError, OverflowError):
+                return 1
+    return 1
+
+
+def _number(node: ast.expr, default):
+    """Value of a numeric literal, or of simple arithmetic on literals"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _number(node.operand, None)
+        if value is not None:
+            return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub, ast.Mult, ast.Div)):
+        left, right = _number(node.left, None), _number(node.right, None)
+        if left is not None and right is not None:
+            if isinstance(node.op, ast.Add):
+                return left + right
+            if isinstance(node.op, ast.Sub):
+                return left - right
+            if isinstance(node.op, ast.Mult):
+                return left * right
+            if right:
+                return left / right
+    return default
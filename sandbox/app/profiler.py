@@ -0,0 +1,119 @@
+"""
+Sampling profiler for render jobs that ask for a ``profile``.
+
+``StackSampler`` runs inside the job process (see
+``job_hooks.profile_scene``). A background thread records the render
+thread's stack every few milliseconds and writes the counts as collapsed
+stacks ("folded" format): one line per distinct stack, frames from outermost
+to innermost separated by ``;``, then a space and the number of samples.
+speedscope (https://www.speedscope.app), ``flamegraph.pl`` and most other
+flame graph tools read it directly. The file is rewritten every
+``flush_seconds``, so a job killed for running too long still leaves a
+profile of what it was doing.
+
+Nothing here is imported or run for jobs without a profile.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+PROFILE_FILE = "profile.folded"
+
+
+def frame_label(code) -> str:
+    """Frame name in a collapsed stack; ``;`` separates frames, so it must not appear in one"""
+    label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label.replace(";", ":")
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval
+
+    Samples are taken by wall clock, so time the thread spends waiting
+    (e.g. on the encoder) shows up as well as time spent computing.
+    """
+
+    def __init__(self, path: str, interval: float = 0.005, flush_seconds: float = 1.0, thread_id: int = None):
+        self.path = path
+        self.interval = interval
+        self.flush_seconds = flush_seconds
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> int:
+        """Stop sampling and write the final profile; returns the number of samples"""
+        self._stop.set()
+        self._thread.join()
+        self.write()
+        return self.samples
+
+    def write(self) -> None:
+        with self._lock:
+            lines = [f"{stack} {count}\n" for stack, count in self.counts.most_common()]
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.writelines(lines)
+        # Readers never see a half-written profile
+        os.replace(temp_path, self.path)
+
+    def _run(self) -> None:
+        next_flush = time.monotonic() + self.flush_seconds
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break  # The sampled thread has exited
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            del frame
+            with self._lock:
+                self.counts[";".join(reversed(stack))] += 1
+                self.samples += 1
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + self.flush_seconds
+                self.write()
+
+
+def merge_profiles(profiles: Dict[str, str], path: str) -> Optional[int]:
+    """
+    Combine the collapsed stacks of several job processes into one file
+
+    Args:
+        profiles (dict): Collapsed-stack file of each process, by a label
+            that becomes the root frame of its stacks (scene or segment)
+        path (str): File to write
+
+    Returns:
+        int: Total samples, or None if none of the files exist
+    """
+    lines: List[str] = []
+    samples = 0
+    found = False
+    for label, profile_path in profiles.items():
+        if not os.path.exists(profile_path):
+            continue
+        found = True
+        with open(profile_path) as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if not count.isdigit():
+                    continue
+                samples += int(count)
+                lines.append(f"{label.replace(';', ':')};{stack} {count}\n" if label else line)
+    if not found:
+        return None
+    with open(path, "w") as f:
+        f.writelines(lines)
+    return samples
@@ -0,0 +1,210 @@
+"""
+Render worker that takes Manim jobs off the shared job queue.
+
+Run one or more on each render node, next to API servers started with the
+same ``JOB_QUEUE_URL``:
+
+    JOB_QUEUE_URL=redis://queue:6379/0 python queue_worker.py
+
+Each worker renders ``QUEUE_WORKER_CONCURRENCY`` jobs at a time and renews
+the lease on them while they run. If the process dies its jobs are
+requeued once their leases expire; on SIGTERM it stops taking jobs and
+finishes the ones it has.
+"""
+import os
+import signal
+import socket
+import threading
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+from job_queue import JOB_QUEUE_URL, JOB_QUEUE_LEASE_SECONDS, JOB_QUEUE_POLL_INTERVAL, JobQueue, open_job_queue
+from jobs import Job
+from metrics import job_metrics
+from pipeline import run_manim_job, merge_final_render
+from worker import start_worker_pool, stop_worker_pool
+
+# Jobs one worker process renders at once
+QUEUE_WORKER_CONCURRENCY = int(os.getenv("QUEUE_WORKER_CONCURRENCY", str(os.cpu_count() or 1)))
+# How often running jobs' leases are renewed, which is also how quickly a
+# cancel reaches them; never less often than three times per lease
+QUEUE_WORKER_HEARTBEAT_SECONDS = float(os.getenv("QUEUE_WORKER_HEARTBEAT_SECONDS", "2"))
+# Port the worker serves its Prometheus metrics on; 0 does not serve them
+QUEUE_WORKER_METRICS_PORT = int(os.getenv("QUEUE_WORKER_METRICS_PORT", "0"))
+
+
+class QueuedJob(Job):
+    """A job leased from the queue; progress is reported back to it"""
+
+    def __init__(self, queue: JobQueue, record: Dict[str, Any], worker_id: str):
+        super().__init__(
+            record['payload'],
+            estimated_seconds=record['estimated_seconds'],
+            deadline=record['deadline'],
+            tenant=record['tenant']
+        )
+        self.id = record['job_id']
+        self.created_at = record['created_at']
+        self.history = record['history']
+        self.parent_id = record['parent_job_id']
+        self.followup_id = record['followup_job_id']
+        self.worker_id = worker_id
+        self._queue = queue
+
+    def set_status(self, status: str) -> None:
+        super().set_status(status)
+        self._queue.set_status(self.id, self.worker_id, status)
+
+    def set_playlist_url(self, url: str) -> None:
+        super().set_playlist_url(url)
+        self._queue.set_playlist_url(self.id, self.worker_id, url)
+
+
+class QueueWorker:
+    """
+    Renders jobs from a ``JobQueue`` on a fixed number of threads
+
+    Every thread leases a job, runs it with ``pipeline.run_manim_job`` and
+    completes it, while a heartbeat thread renews the leases of all running
+    jobs. A job whose lease cannot be renewed, because it was cancelled or
+    given to another worker, is stopped.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        concurrency: int = QUEUE_WORKER_CONCURRENCY,
+        lease_seconds: float = JOB_QUEUE_LEASE_SECONDS,
+        poll_interval: float = JOB_QUEUE_POLL_INTERVAL,
+        worker_id: str = None
+    ):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_seconds = min(QUEUE_WORKER_HEARTBEAT_SECONDS, lease_seconds / 3)
+        self.completed = 0
+        self._running = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # Set once the slot threads have finished, to end the heartbeat
+        self._idle = threading.Event()
+        self._threads = []
+        self._heartbeat = None
+
+    def start(self) -> None:
+        self._threads = [
+            threading.Thread(target=self._slot_loop, name=f"queue-worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="queue-heartbeat", daemon=True)
+        for thread in self._threads + [self._heartbeat]:
+            thread.start()
+        print(f"👷 Worker {self.worker_id} taking jobs with {self.concurrency} slot(s)")
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop taking jobs; with ``wait``, return once the running ones are finished"""
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+            self._idle.set()
+            self._heartbeat.join()
+
+    def run(self) -> None:
+        """Take jobs until SIGTERM or SIGINT, then finish the running ones"""
+        def shutdown(signum, frame):
+            print(f"🛑 Worker {self.worker_id} stopping after {len(self._running)} running job(s)")
+            self._stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        self.start()
+        while not self._stop.wait(1):
+            pass
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'worker_id': self.worker_id,
+                'slots': self.concurrency,
+                'running': list(self._running),
+                'completed': self.completed
+            }
+
+    def _slot_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.queue.requeue_expired()
+                record = self.queue.lease(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"⚠️  Could not lease a job: {e}")
+                record = None
+            if record is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._run(record)
+
+    def _run(self, record: Dict[str, Any]) -> None:
+        job = QueuedJob(self.queue, record, self.worker_id)
+        with self._lock:
+            self._running[job.id] = job
+        print(f"🎬 Worker {self.worker_id} leased job {job.id} (attempt {record['attempts']})")
+        try:
+            job.set_status('rendering')
+            result = run_manim_job(job)
+        except Exception as e:
+            result = {'job_id': job.id, 'success': False, 'error': f"Internal server error: {str(e)}"}
+        finally:
+            with self._lock:
+                self._running.pop(job.id, None)
+
+        try:
+            if not self.queue.complete(job.id, self.worker_id, result):
+                print(f"⚠️  Dropping result of job {job.id}: its lease was given to another worker")
+                return
+            if job.parent_id is not None and result.get('success'):
+                # A preview's final render replaces the draft under the preview's id
+                parent = self.queue.get(job.parent_id)
+                if parent is not None and parent['result'] is not None:
+                    self.queue.set_result(job.parent_id, merge_final_render(parent['result'], result))
+        except Exception as e:
+            print(f"⚠️  Could not complete job {job.id}: {e}")
+            return
+        with self._lock:
+            self.completed += 1
+
+    def _heartbeat_loop(self) -> None:
+        while not self._idle.wait(self.heartbeat_seconds):
+            with self._lock:
+                running = list(self._running.values())
+            for job in running:
+                try:
+                    if not self.queue.heartbeat(job.id, self.worker_id, self.lease_seconds):
+                        job.cancel_event.set()
+                except Exception as e:
+                    # The lease runs on; the job is only stopped once another worker may take it
+                    print(f"⚠️  Could not renew the lease on job {job.id}: {e}")
+
+
+def main() -> None:
+    load_dotenv()
+    url = os.getenv("JOB_QUEUE_URL", JOB_QUEUE_URL)
+    if not url:
+        raise SystemExit("JOB_QUEUE_URL must be set to the queue the API servers use")
+    pool_size = int(os.getenv("WORKER_POOL_SIZE", str(QUEUE_WORKER_CONCURRENCY)))
+    if QUEUE_WORKER_METRICS_PORT > 0:
+        job_metrics.serve(QUEUE_WORKER_METRICS_PORT)
+    if pool_size > 0:
+        start_worker_pool(pool_size)
+    try:
+        QueueWorker(open_job_queue(url)).run()
+    finally:
+        stop_worker_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+import heapq
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+# Order in which a tenant's queued jobs get a free slot: first come first
+# served, shortest estimated job first, or earliest deadline first
+SCHEDULING_POLICIES = ('fifo', 'sjf', 'edf')
+
+# Tenant of jobs submitted without one
+DEFAULT_TENANT = 'anonymous'
+# Idle tenants are forgotten after this many seconds
+TENANT_IDLE_SECONDS = 600
+# Waits kept per tenant for its statistics
+TENANT_WAIT_SAMPLES = 100
+
+
+class SchedulerFullError(Exception):
+    """Raised when every render slot is busy and the wait queue is full"""
+
+
+class DeadlineError(SchedulerFullError):
+    """
+    Raised when a job is predicted to finish after its deadline
+
+    ``wait_seconds`` is how long it would wait for a slot; 0 means it would
+    miss the deadline even on an idle server.
+    """
+
+    def __init__(self, message: str, wait_seconds: float, estimated_seconds: float):
+        super().__init__(message)
+        self.wait_seconds = wait_seconds
+        self.estimated_seconds = estimated_seconds
+
+
+class TenantLimitError(SchedulerFullError):
+    """Raised when a tenant already has as many jobs queued as it may"""
+
+
+class _Entry:
+    """A queued job"""
+
+    def __init__(self, future, fn, args, kwargs, estimated_seconds, deadline, tenant):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.time()
+        self.estimated_seconds = estimated_seconds
+        self.deadline = deadline
+        self.tenant = tenant
+
+
+class _Tenant:
+    """Fair-share state of one tenant"""
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        # Service received so far, in estimated seconds divided by weight
+        self.virtual_time = 0.0
+        self.queued = 0
+        self.running = 0
+        self.waits = deque(maxlen=TENANT_WAIT_SAMPLES)
+        self.last_active = time.time()
+
+    def is_idle(self) -> bool:
+        return self.queued == 0 and self.running == 0
+
+
+class RenderScheduler:
+    """
+    Bounded executor for synchronous render jobs.
+
+    Jobs run on a fixed number of worker threads so that the FastAPI event
+    loop stays free for health checks and other requests. At most
+    ``max_workers`` jobs run at once and at most ``max_queue`` more may wait
+    for a slot; anything beyond that is rejected immediately with
+    ``SchedulerFullError`` so the caller can answer with a 503.
+
+    Jobs belong to a tenant and are shared out by weighted fair queuing:
+    a free slot goes to the tenant with queued work that has received the
+    least service so far, counted in estimated seconds (1 for jobs without
+    an estimate) divided by the tenant's weight. A tenant that was idle
+    starts level with the others rather than with credit, so one tenant
+    submitting many jobs delays everyone else by at most one job per turn.
+    ``tenant_max_running`` and ``tenant_max_queued`` (0 for no limit) cap
+    the slots and queue positions one tenant can take.
+
+    Jobs may come with an estimated run time and a deadline. ``policy``
+    picks which of a tenant's queued jobs goes first (see
+    ``SCHEDULING_POLICIES``); under ``sjf`` a job's estimate shrinks by
+    ``aging`` seconds for every second it waits, so long jobs are not
+    starved. Jobs without an estimate count as instant, and jobs without a
+    deadline as having all the time in the world.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queue: int,
+        policy: str = 'fifo',
+        aging: float = 1.0,
+        tenant_weights: Dict[str, float] = None,
+        tenant_max_running: int = 0,
+        tenant_max_queued: int = 0
+    ):
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown scheduling policy '{policy}', expected one of: {', '.join(SCHEDULING_POLICIES)}")
+        # Shares are divided by the weight, so it has to be positive
+        bad_weights = [f"{name}={weight}" for name, weight in (tenant_weights or {}).items() if not weight > 0]
+        if bad_weights:
+            raise ValueError(f"Tenant weights must be greater than 0, got: {', '.join(bad_weights)}")
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.policy = policy
+        self.aging = aging
+        self.tenant_weights = dict(tenant_weights or {})
+        self.tenant_max_running = max(0, tenant_max_running)
+        self.tenant_max_queued = max(0, tenant_max_queued)
+        self._queue = deque()
+        self._tenants = {}
+        self._running = 0
+        # Start time and estimate of every running job that has one
+        self._running_estimates = {}
+        self._shutdown = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._threads = []
+
+        for i in range(self.max_workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"render-worker-{i}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(
+        self,
+        fn: Callable,
+        *args,
+        estimated_seconds: float = None,
+        deadline: float = None,
+        reject_late: bool = False,
+        tenant: str = None,
+        **kwargs
+    ) -> Future:
+        """
+        Queue a job for execution
+
+        Args:
+            fn (Callable): Synchronous function to run on a worker thread
+            *args, **kwargs: Arguments passed to ``fn``
+            estimated_seconds (float): Predicted run time of the job
+            deadline (float): Epoch time the job should be finished by
+            reject_late (bool): Reject the job if, given the jobs ahead of it,
+                it is predicted to finish after ``deadline``
+            tenant (str): Who the job is for, e.g. a user or conversation
+
+        Returns:
+            Future: Resolves with the return value of ``fn``
+
+        Raises:
+            SchedulerFullError: If no slot and no queue position is available
+            TenantLimitError: If the tenant has no queue position left
+            DeadlineError: With ``reject_late``, if the job would finish too late
+        """
+        return self._enqueue(fn, args, kwargs, estimated_seconds, deadline, tenant, bounded=True, reject_late=reject_late)
+
+    def submit_followup(
+        self,
+        fn: Callable,
+        *args,
+        estimated_seconds: float = None,
+        deadline: float = None,
+        tenant: str = None,
+        **kwargs
+    ) -> Future:
+        """
+        Queue follow-up work of a job that was already admitted
+
+        Unlike ``submit`` this never raises ``SchedulerFullError``: the request
+        that caused it was accepted earlier and must not be dropped halfway.
+        """
+        return self._enqueue(fn, args, kwargs, estimated_seconds, deadline, tenant, bounded=False, reject_late=False)
+
+    def _enqueue(
+        self,
+        fn: Callable,
+        args: tuple,
+        kwargs: dict,
+        estimated_seconds: float,
+        deadline: float,
+        tenant: str,
+        bounded: bool,
+        reject_late: bool
+    ) -> Future:
+        future = Future()
+        entry = _Entry(future, fn, args, kwargs, estimated_seconds, deadline, tenant or DEFAULT_TENANT)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down")
+
+            idle_workers = self.max_workers - self._running
+            if bounded and len(self._queue) >= idle_workers + self.max_queue:
+                raise SchedulerFullError(
+                    f"All {self.max_workers} render slots are busy and "
+                    f"{len(self._queue)} job(s) are already queued"
+                )
+
+            state = self._tenant(entry.tenant)
+            if bounded and self.tenant_max_queued and state.queued >= self.tenant_max_queued:
+                raise TenantLimitError(
+                    f"{state.queued} job(s) of {entry.tenant} are already queued, "
+                    f"the most one user or conversation may have waiting"
+                )
+
+            if reject_late and deadline is not None and estimated_seconds is not None:
+                wait = self._predict_wait(entry)
+                finish = entry.enqueued_at + wait + estimated_seconds
+                if finish > deadline:
+                    raise DeadlineError(
+                        f"Job is estimated to take {estimated_seconds:.0f}s after waiting {wait:.0f}s for a slot, "
+                        f"finishing {finish - deadline:.0f}s after its deadline",
+                        wait, estimated_seconds
+                    )
+
+            if state.is_idle():
+                # Time spent idle earns no credit: start level with the least served active tenant
+                active = [other.virtual_time for other in self._tenants.values() if not other.is_idle()]
+                if active:
+                    state.virtual_time = max(state.virtual_time, min(active))
+            state.queued += 1
+            state.last_active = entry.enqueued_at
+            self._queue.append(entry)
+            self._not_empty.notify()
+        return future
+
+    def cancel(self, future: Future) -> bool:
+        """
+        Take a job that has not started off the queue, so it no longer holds a
+        queue position or counts against its tenant's share
+
+        The future is left pending for the caller to resolve.
+
+        Returns:
+            bool: True if the job was still queued; False if it already started
+        """
+        with self._lock:
+            for entry in self._queue:
+                if entry.future is future:
+                    self._queue.remove(entry)
+                    self._tenants[entry.tenant].queued -= 1
+                    return True
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of slot usage and queue depth"""
+        with self._lock:
+            now = time.time()
+            running = sum(max(0.0, start + estimate - now) for start, estimate in self._running_estimates.values())
+            queued = sum(entry.estimated_seconds or 0.0 for entry in self._queue)
+            oldest = {}
+            for entry in self._queue:
+                oldest[entry.tenant] = min(oldest.get(entry.tenant, now), entry.enqueued_at)
+            self._prune_tenants(now)
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'policy': self.policy,
+                'running': self._running,
+                'queued': len(self._queue),
+                # Estimated work left, for the jobs that came with an estimate
+                'backlog_seconds': round(running + queued, 1),
+                'tenants': {
+                    name: {
+                        'weight': state.weight,
+                        'running': state.running,
+                        'queued': state.queued,
+                        'oldest_queued_seconds': round(now - oldest[name], 1) if name in oldest else None,
+                        # Over the tenant's most recent jobs
+                        'mean_wait_seconds': round(sum(state.waits) / len(state.waits), 2) if state.waits else None,
+                        'max_wait_seconds': round(max(state.waits), 2) if state.waits else None
+                    }
+                    for name, state in self._tenants.items()
+                }
+            }
+
+    def shutdown(self) -> None:
+        """Stop accepting jobs and cancel everything still waiting in the queue"""
+        with self._lock:
+            self._shutdown = True
+            while self._queue:
+                self._queue.popleft().future.cancel()
+            self._not_empty.notify_all()
+
+    def _tenant(self, name: str) -> _Tenant:
+        state = self._tenants.get(name)
+        if state is None:
+            self._prune_tenants(time.time())
+            state = self._tenants[name] = _Tenant(self.tenant_weights.get(name, 1.0))
+        return state
+
+    def _prune_tenants(self, now: float) -> None:
+        for name in [name for name, state in self._tenants.items()
+                     if state.is_idle() and now - state.last_active > TENANT_IDLE_SECONDS]:
+            del self._tenants[name]
+
+    def _priority(self, entry: _Entry, now: float) -> tuple:
+        if self.policy == 'sjf':
+            key = (entry.estimated_seconds or 0.0) - self.aging * (now - entry.enqueued_at)
+        elif self.policy == 'edf':
+            key = entry.deadline if entry.deadline is not None else float('inf')
+        else:
+            key = 0.0
+        # Ties go to the job that has waited longest
+        return (key, entry.enqueued_at)
+
+    def _predict_wait(self, entry: _Entry) -> float:
+        """Seconds until ``entry`` would get a slot, from the estimates of the jobs ahead of it"""
+        now = time.time()
+        free_at = [max(0.0, start + estimate - now) for start, estimate in self._running_estimates.values()]
+        # Running jobs without an estimate are taken to finish right away
+        free_at += [0.0] * (self.max_workers - len(free_at))
+        heapq.heapify(free_at)
+        priority = self._priority(entry, now)
+        by_tenant = {}
+        for queued in self._queue:
+            by_tenant.setdefault(queued.tenant, []).append(queued)
+        own = [queued for queued in by_tenant.pop(entry.tenant, []) if self._priority(queued, now) <= priority]
+        # Fair queuing lets every other tenant in about as often as this one, by weight
+        ahead = list(own)
+        weight = self._tenants[entry.tenant].weight
+        for name, jobs in by_tenant.items():
+            turns = math.ceil((len(own) + 1) * self._tenants[name].weight / weight)
+            ahead.extend(sorted(jobs, key=lambda queued: self._priority(queued, now))[:turns])
+        for queued in ahead:
+            heapq.heappush(free_at, heapq.heappop(free_at) + (queued.estimated_seconds or 0.0))
+        return free_at[0]
+
+    def _next(self) -> _Entry:
+        """Take the next job off the queue, or None if no tenant with queued jobs may start one"""
+        now = time.time()
+        candidates = {}
+        for entry in self._queue:
+            state = self._tenants[entry.tenant]
+            if self.tenant_max_running and state.running >= self.tenant_max_running:
+                continue
+            best = candidates.get(entry.tenant)
+            if best is None or self._priority(entry, now) < self._priority(best, now):
+                candidates[entry.tenant] = entry
+        if not candidates:
+            return None
+        # The tenant served least so far goes first; ties go to the longest waiting
+        entry = min(
+            candidates.values(),
+            key=lambda queued: (self._tenants[queued.tenant].virtual_time, queued.enqueued_at)
+        )
+        self._queue.remove(entry)
+        state = self._tenants[entry.tenant]
+        state.queued -= 1
+        state.running += 1
+        state.virtual_time += (entry.estimated_seconds or 1.0) / state.weight
+        state.waits.append(now - entry.enqueued_at)
+        if entry.estimated_seconds is not None:
+            self._running_estimates[id(entry)] = (now, entry.estimated_seconds)
+        return entry
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._lock:
+                entry = None
+                while entry is None:
+                    if self._shutdown:
+                        return
+                    # With no queued job, or every one held back by its tenant's
+                    # running limit, wait for a submission or a finished job
+                    entry = self._next() if self._queue else None
+                    if entry is None:
+                        self._not_empty.wait()
+                self._running += 1
+
+            try:
+                if not entry.future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    entry.future.set_result(entry.fn(*entry.args, **entry.kwargs))
+                except BaseException as e:
+                    entry.future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._running_estimates.pop(id(entry), None)
+                    state = self._tenants[entry.tenant]
+                    state.running -= 1
+                    state.last_active = time.time()
+                    if self.tenant_max_running and self._queue:
+                        # A job of this tenant may have been waiting for the slot
+                        self._not_empty.notify()
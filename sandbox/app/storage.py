@@ -0,0 +1,360 @@
+import os
+import logging
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from dotenv import load_dotenv
+from botocore.exceptions import ClientError
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_REGION = os.getenv("AWS_REGION")
+S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
+# Custom S3 endpoint, e.g. MinIO or a moto server
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+
+# Multipart upload settings: files above the threshold are sent in parallel chunks
+S3_MULTIPART_THRESHOLD_MB = int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8"))
+S3_MULTIPART_CHUNK_MB = int(os.getenv("S3_MULTIPART_CHUNK_MB", "8"))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "10"))
+# Files of one job uploaded at the same time
+UPLOAD_MAX_PARALLEL_FILES = int(os.getenv("UPLOAD_MAX_PARALLEL_FILES", "4"))
+
+# "s3", or "local" to publish into a directory instead (development and tests)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "s3")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", os.path.join(os.path.dirname(__file__), "output"))
+# Public URL of LOCAL_STORAGE_DIR; the default is where the server mounts the output directory
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:8000/output")
+
+# Content types of the files the sandbox publishes; players need the right one for HLS
+CONTENT_TYPES = {
+    '.mp4': 'video/mp4',
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+    '.jpg': 'image/jpeg',
+    '.webp': 'image/webp',
+    '.gif': 'image/gif'
+}
+
+transfer_config = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+    multipart_chunksize=S3_MULTIPART_CHUNK_MB * 1024 * 1024,
+    max_concurrency=S3_MAX_CONCURRENCY,
+    use_threads=True
+)
+
+print(S3_BUCKET_NAME)
+# Initialize S3 client
+try:
+    # Enough connections for every chunk of every file uploading at once
+    client_config = Config(max_pool_connections=max(10, S3_MAX_CONCURRENCY * UPLOAD_MAX_PARALLEL_FILES))
+    if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
+        s3_client = boto3.client(
+            's3',
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            region_name=AWS_REGION,
+            endpoint_url=S3_ENDPOINT_URL,
+            config=client_config
+        )
+    else:
+        s3_client = boto3.client(
+            's3',
+            region_name=AWS_REGION,
+            endpoint_url=S3_ENDPOINT_URL,
+            config=client_config
+        )
+
+    logger.info("Successfully initialized S3 client")
+    logger.info(f"S3 client: {s3_client}")
+except Exception as e:
+    logger.error(f"Failed to initialize S3 client: {str(e)}")
+    s3_client = None
+
+def s3_object_url(object_name: str) -> str:
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{S3_BUCKET_NAME}/{object_name}"
+    return f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
+
+def object_url(object_name: str) -> str:
+    """Public URL an object will have on the configured ``STORAGE_BACKEND``, whether or not it exists yet"""
+    if STORAGE_BACKEND == "local":
+        return f"{LOCAL_STORAGE_URL.rstrip('/')}/{object_name}"
+    return s3_object_url(object_name)
+
+def s3_extra_args(object_name: str) -> Dict[str, str]:
+    extra_args = {}
+    extension = os.path.splitext(object_name)[1].lower()
+    if extension in CONTENT_TYPES:
+        extra_args['ContentType'] = CONTENT_TYPES[extension]
+    if extension == '.m3u8':
+        # Playlists change while a render is in progress
+        extra_args['CacheControl'] = 'no-cache'
+    return extra_args
+
+def upload_file_to_s3(file_path: str, object_name: str = None) -> Dict[str, Any]:
+    """
+    Upload a file to an S3 bucket
+    
+    Files above ``S3_MULTIPART_THRESHOLD_MB`` are uploaded as a multipart
+    upload with up to ``S3_MAX_CONCURRENCY`` chunks in flight.
+    
+    Args:
+        file_path (str): Path to the file to upload
+        object_name (str): S3 object name. If not specified, file_path is used
+    
+    Returns:
+        dict: Response containing upload status and file URL
+        {
+            'success': bool,
+            'url': str,
+            'error': str,
+            'bytes': int,
+            'seconds': float
+        }
+    """
+    # If S3 client initialization failed, return error
+    if s3_client is None:
+        return {
+            'success': False,
+            'url': None,
+            'error': 'S3 client not initialized',
+            'bytes': 0,
+            'seconds': 0.0
+        }
+
+    # If object_name not specified, use file_path
+    if object_name is None:
+        object_name = os.path.basename(file_path)
+
+    start_time = time.time()
+    try:
+        # Upload the file
+        s3_client.upload_file(
+            file_path, S3_BUCKET_NAME, object_name,
+            ExtraArgs=s3_extra_args(object_name), Config=transfer_config
+        )
+        
+        # Generate the URL for the uploaded file
+        url = s3_object_url(object_name)
+        
+        logger.info(f"Successfully uploaded file to S3: {url}")
+        return {
+            'success': True,
+            'url': url,
+            'error': None,
+            'bytes': os.path.getsize(file_path),
+            'seconds': time.time() - start_time
+        }
+        
+    except (ClientError, S3UploadFailedError, OSError) as e:
+        logger.error(f"Failed to upload file to S3: {str(e)}")
+        return {
+            'success': False,
+            'url': None,
+            'error': str(e),
+            'bytes': 0,
+            'seconds': time.time() - start_time
+        }
+
+def upload_file_to_local_store(file_path: str, object_name: str = None) -> Dict[str, Any]:
+    """
+    Publish a file into ``LOCAL_STORAGE_DIR``, a stand-in for S3
+    
+    Takes the same arguments and returns the same response as ``upload_file_to_s3``.
+    """
+    if object_name is None:
+        object_name = os.path.basename(file_path)
+    
+    start_time = time.time()
+    try:
+        dest_path = os.path.join(LOCAL_STORAGE_DIR, object_name)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        # Renamed into place, so a playlist being replaced is never read half written
+        shutil.copyfile(file_path, dest_path + ".incoming")
+        os.replace(dest_path + ".incoming", dest_path)
+        url = object_url(object_name)
+        logger.info(f"Stored file locally: {dest_path}")
+        return {
+            'success': True,
+            'url': url,
+            'error': None,
+            'bytes': os.path.getsize(dest_path),
+            'seconds': time.time() - start_time
+        }
+    except OSError as e:
+        logger.error(f"Failed to store file locally: {str(e)}")
+        return {
+            'success': False,
+            'url': None,
+            'error': str(e),
+            'bytes': 0,
+            'seconds': time.time() - start_time
+        }
+
+def upload_file(file_path: str, object_name: str = None) -> Dict[str, Any]:
+    """Upload a file to the configured ``STORAGE_BACKEND``"""
+    if STORAGE_BACKEND == "local":
+        return upload_file_to_local_store(file_path, object_name)
+    return upload_file_to_s3(file_path, object_name)
+
+def upload_files_to_s3(file_paths: List[str], object_names: List[str] = None) -> List[Dict[str, Any]]:
+    """
+    Upload multiple files to S3 bucket (or the local stand-in store) concurrently
+    
+    Args:
+        file_paths (List[str]): List of file paths to upload
+        object_names (List[str]): Object name for each file; defaults to the file names
+    
+    Returns:
+        List[Dict[str, Any]]: List of upload results for each file, in the order of ``file_paths``
+    """
+    if not file_paths:
+        return []
+    object_names = object_names or [None] * len(file_paths)
+    if len(file_paths) == 1:
+        return [upload_file(file_paths[0], object_names[0])]
+    with ThreadPoolExecutor(max_workers=min(len(file_paths), max(1, UPLOAD_MAX_PARALLEL_FILES))) as executor:
+        return list(executor.map(upload_file, file_paths, object_names))
+
+def summarize_uploads(results: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+    """
+    Total size and throughput of a batch of uploads
+    
+    Args:
+        results (List[Dict[str, Any]]): Results of ``upload_files_to_s3``
+        seconds (float): Wall-clock time the whole batch took
+    """
+    uploaded = sum(result.get('bytes', 0) for result in results if result['success'])
+    return {
+        'files': sum(1 for result in results if result['success']),
+        'bytes': uploaded,
+        'seconds': round(seconds, 3),
+        'throughput_mb_s': round(uploaded / (1024 * 1024) / seconds, 2) if seconds > 0 else None
+    }
+
+
+class S3MultipartUpload:
+    """
+    An S3 object written piece by piece, e.g. while a video is still being encoded
+    
+    Written data is buffered and sent as a part whenever ``S3_MULTIPART_CHUNK_MB``
+    have accumulated (S3 needs at least 5 MB per part, except for the last).
+    The object only appears in the bucket once ``complete`` is called.
+    """
+    
+    def __init__(self, object_name: str):
+        if s3_client is None:
+            raise RuntimeError("S3 client not initialized")
+        self.object_name = object_name
+        self.part_size = max(5, S3_MULTIPART_CHUNK_MB) * 1024 * 1024
+        self.bytes = 0
+        self._buffer = bytearray()
+        self._parts = []
+        self._start_time = time.time()
+        response = s3_client.create_multipart_upload(
+            Bucket=S3_BUCKET_NAME, Key=object_name, **s3_extra_args(object_name)
+        )
+        self._upload_id = response['UploadId']
+    
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        self.bytes += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._send_part()
+    
+    def complete(self) -> Dict[str, Any]:
+        """Send what is left and commit the object; returns an ``upload_file_to_s3`` style result"""
+        try:
+            if self._buffer or not self._parts:
+                self._send_part()
+            s3_client.complete_multipart_upload(
+                Bucket=S3_BUCKET_NAME, Key=self.object_name, UploadId=self._upload_id,
+                MultipartUpload={'Parts': self._parts}
+            )
+        except ClientError as e:
+            logger.error(f"Failed to complete multipart upload of {self.object_name}: {str(e)}")
+            self.abort()
+            return {
+                'success': False,
+                'url': None,
+                'error': str(e),
+                'bytes': 0,
+                'seconds': time.time() - self._start_time
+            }
+        url = s3_object_url(self.object_name)
+        logger.info(f"Successfully uploaded file to S3 in {len(self._parts)} part(s): {url}")
+        return {
+            'success': True,
+            'url': url,
+            'error': None,
+            'bytes': self.bytes,
+            'seconds': time.time() - self._start_time
+        }
+    
+    def abort(self) -> None:
+        """Discard the parts sent so far"""
+        try:
+            s3_client.abort_multipart_upload(
+                Bucket=S3_BUCKET_NAME, Key=self.object_name, UploadId=self._upload_id
+            )
+        except ClientError as e:
+            logger.warning(f"Failed to abort multipart upload of {self.object_name}: {str(e)}")
+    
+    def _send_part(self) -> None:
+        number = len(self._parts) + 1
+        response = s3_client.upload_part(
+            Bucket=S3_BUCKET_NAME, Key=self.object_name, UploadId=self._upload_id,
+            PartNumber=number, Body=bytes(self._buffer)
+        )
+        self._parts.append({'PartNumber': number, 'ETag': response['ETag']})
+        self._buffer = bytearray()
+
+class LocalMultipartUpload:
+    """``S3MultipartUpload`` for the local stand-in store; the file is renamed into place on ``complete``"""
+    
+    def __init__(self, object_name: str):
+        self.object_name = object_name
+        self.bytes = 0
+        self._path = os.path.join(LOCAL_STORAGE_DIR, object_name)
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        self._temp_path = self._path + ".incoming"
+        self._file = open(self._temp_path, "wb")
+        self._start_time = time.time()
+    
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self.bytes += len(data)
+    
+    def complete(self) -> Dict[str, Any]:
+        self._file.close()
+        os.replace(self._temp_path, self._path)
+        url = object_url(self.object_name)
+        logger.info(f"Stored file locally: {self._path}")
+        return {
+            'success': True,
+            'url': url,
+            'error': None,
+            'bytes': self.bytes,
+            'seconds': time.time() - self._start_time
+        }
+    
+    def abort(self) -> None:
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+def start_multipart_upload(object_name: str):
+    """Start an upload that is written incrementally, on the configured ``STORAGE_BACKEND``"""
+    if STORAGE_BACKEND == "local":
+        return LocalMultipartUpload(object_name)
+    return S3MultipartUpload(object_name)
@@ -0,0 +1,207 @@
+"""
+Publish a video while Manim is still rendering it.
+
+Manim encodes every animation into its own partial movie file and only joins
+them once the whole scene is done. The streams here follow the job's event
+log instead and pick up each partial movie as soon as Manim finishes it:
+
+- ``VideoStream`` remuxes them into one fragmented MP4 and sends the fragments
+  to object storage as multipart parts, so only the last fragment is left to
+  upload once the job ends.
+- ``HlsStream`` turns each of them into an HLS segment and republishes the
+  playlist, so clients can start playing the first animations while later
+  ones are still rendering.
+"""
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict
+
+from job_hooks import EventTail
+from media import FragmentedMp4Writer, HlsSegmenter, MediaError
+
+# How often the job's event log is checked for finished partial movies
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "0.2"))
+# Longest HLS segment announced to players; each animation is one segment
+HLS_TARGET_DURATION = int(os.getenv("HLS_TARGET_DURATION", "10"))
+
+
+class PartialMovieFollower(ABC):
+    """
+    Hands every partial movie a running job finishes, in play order, to
+    ``add`` on a background thread
+
+    Errors stop the follower and are kept in ``error``; the job itself keeps
+    rendering regardless.
+    """
+
+    def __init__(self, job_dir: str):
+        self.error = None
+        self.last_frame_time = None
+        self._tail = EventTail(job_dir)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=type(self).__name__, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @abstractmethod
+    def add(self, path: str) -> None:
+        """Take one finished partial movie"""
+
+    def stop(self, drain: bool) -> None:
+        """Stop following; with ``drain``, first take the partial movies written since the last poll"""
+        self._stop.set()
+        self._thread.join()
+        if drain and self.error is None:
+            try:
+                self._drain()
+            except Exception as e:
+                self.error = e
+
+    def _loop(self) -> None:
+        while not self._stop.wait(STREAM_POLL_INTERVAL):
+            try:
+                self._drain()
+            except Exception as e:
+                self.error = e
+                return
+
+    def _drain(self) -> None:
+        for event in self._tail.poll():
+            if event['event'] == 'partial_movie_ready':
+                self.add(event['path'])
+                self.last_frame_time = event['time']
+
+
+class VideoStream(PartialMovieFollower):
+    """
+    Streams the video of one running job to an incremental upload
+
+    Args:
+        job_dir (str): Directory of the job, where its event log is written
+        upload: A ``storage.start_multipart_upload`` upload to write the video to
+    """
+
+    def __init__(self, job_dir: str, upload):
+        super().__init__(job_dir)
+        self.upload = upload
+        self.object_name = upload.object_name
+        self._writer = FragmentedMp4Writer(upload.write)
+
+    def add(self, path: str) -> None:
+        self._writer.append(path)
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Append the last partial movies and commit the object
+
+        Call once the job has exited successfully.
+
+        Returns:
+            dict: The upload result, as ``storage.upload_file_to_s3`` returns it
+
+        Raises:
+            MediaError: If streaming failed; the upload is aborted
+        """
+        self.stop(drain=True)
+        if self.error is None:
+            try:
+                self._writer.close()
+            except MediaError as e:
+                self.error = e
+        if self.error is not None:
+            self.upload.abort()
+            raise MediaError(f"Streaming upload of {self.object_name} failed: {self.error}")
+        return self.upload.complete()
+
+    def abort(self) -> None:
+        """Stop streaming and discard what was uploaded, e.g. because the job failed"""
+        self.stop(drain=False)
+        self.upload.abort()
+
+
+class HlsStream(PartialMovieFollower):
+    """
+    Publishes the video of one running job as HLS, one segment per animation
+
+    Args:
+        job_dir (str): Directory of the job, where its event log is written
+        prefix (str): Object name prefix of the playlist and segments
+        upload (Callable): ``storage.upload_file``; called with a path and an object name
+        url_for (Callable): ``storage.object_url``; the public URL of an object name
+        on_first_segment (Callable): Called with the playlist URL once it has a segment to play
+    """
+
+    PLAYLIST_NAME = "index.m3u8"
+
+    def __init__(
+        self,
+        job_dir: str,
+        prefix: str,
+        upload: Callable[[str, str], Dict[str, Any]],
+        url_for: Callable[[str], str],
+        on_first_segment: Callable[[str], None] = None
+    ):
+        super().__init__(job_dir)
+        self.prefix = prefix.rstrip('/')
+        self.playlist_url = url_for(f"{self.prefix}/{self.PLAYLIST_NAME}")
+        self.first_segment_time = None
+        self._upload = upload
+        self._on_first_segment = on_first_segment
+        self._segmenter = HlsSegmenter(os.path.join(job_dir, "hls"), HLS_TARGET_DURATION)
+
+    def add(self, path: str) -> None:
+        name = self._segmenter.append(path)
+        self._publish(os.path.join(self._segmenter.output_dir, name), name)
+        self._publish_playlist(ended=False)
+        if self.first_segment_time is None:
+            self.first_segment_time = time.time()
+            if self._on_first_segment is not None:
+                self._on_first_segment(self.playlist_url)
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Publish the last segments and mark the playlist as complete
+
+        Returns:
+            dict: ``playlist_url``, ``segments`` and ``first_segment_time``
+
+        Raises:
+            MediaError: If a segment or the playlist could not be published
+        """
+        self.stop(drain=True)
+        if self.error is None:
+            try:
+                self._publish_playlist(ended=True)
+            except MediaError as e:
+                self.error = e
+        if self.error is not None:
+            raise MediaError(f"HLS publishing of {self.playlist_url} failed: {self.error}")
+        return {
+            'playlist_url': self.playlist_url,
+            'segments': len(self._segmenter.segments),
+            'first_segment_time': self.first_segment_time
+        }
+
+    def abort(self) -> None:
+        """Stop publishing; the playlist is ended so players stop waiting for more segments"""
+        self.stop(drain=False)
+        if self._segmenter.segments:
+            try:
+                self._publish_playlist(ended=True)
+            except MediaError:
+                pass
+
+    def _publish_playlist(self, ended: bool) -> None:
+        path = os.path.join(self._segmenter.output_dir, self.PLAYLIST_NAME)
+        with open(path, "w") as f:
+            f.write(self._segmenter.playlist(ended))
+        self._publish(path, self.PLAYLIST_NAME)
+
+    def _publish(self, path: str, name: str) -> None:
+        result = self._upload(path, f"{self.prefix}/{name}")
+        if not result['success']:
+            raise MediaError(f"Could not upload {name}: {result['error']}")
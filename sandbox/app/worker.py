@@ -1,6 +1,11 @@
 import subprocess
 import sys
 import os
+import signal
+import socket
+import threading
+import queue
+import time
 import tempfile
 import re
 import ast
@@ -8,19 +13,213 @@ import importlib
 import traceback
 import shutil
 import glob
-from typing import Dict, List, Tuple, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import json
-from contextlib import redirect_stdout, redirect_stderr
-from io import StringIO
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing.connection import Connection
+from media import MediaError, can_concat, concat_videos, make_animated_preview, remux_faststart
+from job_hooks import EventTail, read_events, first_event_time
+from file_cache import glyph_cache, partial_movie_cache, partial_movie_scope_dir
+from streaming import HlsStream, VideoStream
+from preflight import scene_classes
+from profiler import PROFILE_FILE, merge_profiles
+
+
+# Wall-clock limit applied when a request does not specify a usable timeout
+DEFAULT_TIMEOUT = int(os.getenv("DEFAULT_TIMEOUT", "30"))
+
+# Pre-warmed pool workers are replaced after this many jobs, or once their
+# resident memory grows past this many megabytes
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "100"))
+WORKER_MAX_RSS_MB = int(os.getenv("WORKER_MAX_RSS_MB", "1024"))
+WORKER_READY_TIMEOUT = int(os.getenv("WORKER_READY_TIMEOUT", "120"))
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Render quality tiers. ``quality`` is the Manim preset the resolution and
+# frame rate are taken from; draft is what preview mode renders first.
+QUALITY_PRESETS = {
+    'draft': {'quality': 'low_quality', 'pixel_width': 854, 'pixel_height': 480, 'frame_rate': 15},
+    'low': {'quality': 'low_quality', 'pixel_width': 854, 'pixel_height': 480, 'frame_rate': 30},
+    'medium': {'quality': 'medium_quality', 'pixel_width': 1280, 'pixel_height': 720, 'frame_rate': 30},
+    'high': {'quality': 'high_quality', 'pixel_width': 1920, 'pixel_height': 1080, 'frame_rate': 60},
+}
+DEFAULT_QUALITY = 'medium'
+PREVIEW_QUALITY = 'draft'
+
+# Encoder settings for Manim's partial movies. ``balanced`` is what Manim
+# uses on its own; ``threads`` 0 leaves the thread count to the encoder, and
+# ``faststart`` moves the MP4 index to the front so playback can start early.
+ENCODER_PROFILES = {
+    'fast': {'codec': 'libx264', 'preset': 'veryfast', 'crf': 23, 'threads': 0, 'faststart': True},
+    'balanced': {'codec': 'libx264', 'preset': 'medium', 'crf': 23, 'threads': 0, 'faststart': True},
+    'small': {'codec': 'libx264', 'preset': 'slow', 'crf': 28, 'threads': 0, 'faststart': True},
+    'hevc': {'codec': 'libx265', 'preset': 'medium', 'crf': 28, 'threads': 0, 'faststart': True},
+}
+DEFAULT_ENCODER_PROFILE = os.getenv("ENCODER_PROFILE", "balanced")
+# Encoder threads per render; 0 keeps the profile's setting
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))
+
+# Upper bound on the segments one scene is split into for parallel rendering
+MAX_PARALLEL_SEGMENTS = int(os.getenv("MAX_PARALLEL_SEGMENTS", str(os.cpu_count() or 1)))
+
+# Segment renders skip every animation before their first one; the planning
+# pass skips them all. Every pass seeds the same RNG so segments agree on state.
+SKIP_ALL_ANIMATIONS = 10 ** 9
+SEGMENT_RANDOM_SEED = 0
+
+# Poster (last frame) width; 0 turns posters off. Animated previews are
+# optional per request and sampled from the finished video.
+POSTER_WIDTH = int(os.getenv("POSTER_WIDTH", "480"))
+ANIMATED_PREVIEW_WIDTH = int(os.getenv("ANIMATED_PREVIEW_WIDTH", "320"))
+ANIMATED_PREVIEW_FPS = float(os.getenv("ANIMATED_PREVIEW_FPS", "4"))
+ANIMATED_PREVIEW_MAX_FRAMES = int(os.getenv("ANIMATED_PREVIEW_MAX_FRAMES", "32"))
+
+# Jobs run with ``profile`` sample their stack this often, and report the
+# source lines holding the most memory
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "15"))
+
+# Results (and the server log) only keep the first JOB_LOG_HEAD_KB and last
+# JOB_LOG_TAIL_KB of each job process's stdout and stderr, with a marker where
+# the middle was left out; the full logs stay on disk until the job is cleaned up
+JOB_LOG_HEAD_KB = int(os.getenv("JOB_LOG_HEAD_KB", "16"))
+JOB_LOG_TAIL_KB = int(os.getenv("JOB_LOG_TAIL_KB", "48"))
+# Publish the full logs of jobs whose output was cut, next to their videos
+JOB_LOG_SPILL = os.getenv("JOB_LOG_SPILL", "false").lower() in ("1", "true", "yes")
+
+def encoder_settings(profile: str, parallel_jobs: int = 1) -> Dict[str, Any]:
+    """The settings of encoder ``profile`` for one of ``parallel_jobs`` renders running side by side"""
+    settings = dict(ENCODER_PROFILES[profile])
+    if ENCODER_THREADS > 0:
+        settings['threads'] = ENCODER_THREADS
+    elif settings['threads'] == 0 and parallel_jobs > 1:
+        # Otherwise the encoder of every render starts a thread per core
+        settings['threads'] = max(1, (os.cpu_count() or 1) // parallel_jobs)
+    return settings
+
+
+# How often a running job is checked for its deadline, cancellation and new stages
+WATCH_INTERVAL = 0.2
+
+# Events reported by job_hooks that mark a pipeline stage
+STAGE_EVENTS = ('encoding',)
+
+
+@contextmanager
+def timed(stages: Dict[str, float], name: str):
+    """Add the seconds spent in the block to ``stages[name]``"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+
+@contextmanager
+def job_directory(stages: Dict[str, float]):
+    """A temporary directory for one job; removing it is timed as the ``cleanup`` stage"""
+    directory = tempfile.TemporaryDirectory()
+    try:
+        yield directory.name
+    finally:
+        with timed(stages, 'cleanup'):
+            directory.cleanup()
+
+
+def child_stages(
+    start_time: float,
+    end_time: float,
+    events: List[Dict[str, Any]],
+    encode_seconds: float
+) -> Dict[str, float]:
+    """
+    Seconds a job process spent in each stage, from the events it recorded
+
+    - ``manim_import``: starting the process and running the code's
+      module-level statements, which is mostly importing Manim (next to
+      nothing on a warm pool worker)
+    - ``construct``: building the scene, i.e. ``construct`` outside ``play``
+    - ``render_frames``: drawing frames inside ``play`` and ``wait``
+    - ``encoding``: encoding partial movies and combining them into the video
+    """
+    imported = first_event_time(events, 'imported')
+    if imported is None:
+        return {'manim_import': end_time - start_time}
+    stages = {'manim_import': imported - start_time}
+    plays = next((event for event in events if event.get('event') == 'plays'), None)
+    if plays is None or 'seconds' not in plays:
+        # Failed or killed before the scene finished; the rest is one stage
+        stages['construct'] = max(0.0, end_time - imported)
+        return stages
+    combine_start = first_event_time(events, 'encoding') or plays['time']
+    stages['construct'] = max(0.0, combine_start - imported - plays['seconds'])
+    stages['render_frames'] = max(0.0, plays['seconds'] - encode_seconds)
+    stages['encoding'] = encode_seconds + max(0.0, plays['time'] - combine_start)
+    return stages
+
+
+class JobWatch:
+    """
+    Deadline, cancellation and stage reporting for one running job
+
+    Runners call ``check`` every ``WATCH_INTERVAL`` seconds while the job
+    process is alive and kill the job when it returns True.
+    """
+
+    def __init__(
+        self,
+        temp_dir: str,
+        timeout: float,
+        on_stage: Callable[[str], None] = None,
+        cancel_event: threading.Event = None
+    ):
+        self.timeout = timeout
+        self.deadline = time.time() + timeout
+        self.on_stage = on_stage
+        self.cancel_event = cancel_event
+        self.timed_out = False
+        self.cancelled = False
+        self._tail = EventTail(temp_dir)
+
+    def check(self) -> bool:
+        """Forward new stage events; return True when the job should be killed"""
+        if self.on_stage is not None:
+            for event in self._tail.poll():
+                if event['event'] in STAGE_EVENTS:
+                    self.on_stage(event['event'])
+
+        if self.timed_out or self.cancelled:
+            return False
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self.cancelled = True
+            return True
+        if time.time() >= self.deadline:
+            self.timed_out = True
+            return True
+        return False
+
+    def kill(self, pid: int) -> None:
+        """Kill the job's process group"""
+        reason = "was cancelled" if self.cancelled else f"exceeded {self.timeout}s"
+        print(f"⏰ Job {reason}, killing process group {pid}")
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
 
 
 class CodeExecutor:
-    def __init__(self, output_dir: str = None):
+    def __init__(self, output_dir: str = None, pool: "WorkerPool" = None):
         self.output_dir = output_dir or os.path.join(os.path.dirname(__file__), "output")
+        self.pool = pool
         os.makedirs(self.output_dir, exist_ok=True)
         
-    def setup_manim_working_directory(self, temp_dir: str) -> str:
-        """Setup proper working directory for Manim with config"""
+    def setup_manim_working_directory(self, temp_dir: str, quality: str = DEFAULT_QUALITY) -> str:
+        """Setup proper working directory for Manim with config for a ``QUALITY_PRESETS`` tier"""
+        preset = QUALITY_PRESETS[quality]
         # Create media directory structure that Manim expects
         media_dir = os.path.join(temp_dir, "media")
         videos_dir = os.path.join(media_dir, "videos")
@@ -39,13 +238,13 @@ media_dir = {media_dir}
 video_dir = {videos_dir}
 images_dir = {images_dir}
 temp_dir = {temp_dir_media}
-quality = medium_quality
+quality = {preset['quality']}
 format = mp4
 save_last_frame = false
 write_to_movie = true
-pixel_height = 720
-pixel_width = 1280
-frame_rate = 30
+pixel_height = {preset['pixel_height']}
+pixel_width = {preset['pixel_width']}
+frame_rate = {preset['frame_rate']}
 background_color = BLACK
 preview = false
 disable_caching = true
@@ -59,26 +258,73 @@ write_all = false
         
         return temp_dir
     
-    def execute_manim_code(self, code: str, temp_dir: str) -> tuple:
-        """Execute Manim code and handle video generation"""
-        scene_class_name = None
-        
+    def find_scene_classes(self, code: str) -> List[str]:
+        """Find the Scene classes to render, in source order (see ``preflight.scene_classes``)"""
         try:
-            # Parse the code into an AST
             tree = ast.parse(code)
+        except SyntaxError as e:
+            print(f"Error parsing code: {e}")
+            return []
+        return scene_classes(tree)
+    
+    def execute_manim_code(
+        self,
+        code: str,
+        temp_dir: str,
+        scene_class_name: str = None,
+        config_overrides: Dict[str, Any] = None,
+        random_seed: int = None,
+        quality: str = DEFAULT_QUALITY,
+        partial_cache_dir: str = None,
+        encoder: Dict[str, Any] = None,
+        profile: bool = False
+    ) -> tuple:
+        """
+        Append render code for ``scene_class_name`` (default: the last scene found)
+        at the resolution and frame rate of the ``quality`` tier
+
+        ``config_overrides`` are applied to the Manim config after the forced
+        settings, and ``random_seed`` seeds ``random`` and NumPy before the
+        scene is created. With ``partial_cache_dir`` Manim's animation caching
+        is turned on and partial movies are shared through that directory.
+        ``encoder`` (see ``encoder_settings``) replaces Manim's encoder settings.
+        With ``profile`` the render is profiled (see ``job_hooks.profile_scene``).
+        """
+        if scene_class_name is None:
+            scenes = self.find_scene_classes(code)
+            scene_class_name = scenes[-1] if scenes else None
+        
+        if scene_class_name:
+            preset = QUALITY_PRESETS[quality]
+            overrides = "".join(
+                f"    config.{key} = {value!r}\n" for key, value in (config_overrides or {}).items()
+            )
+            glyph_hooks = ""
+            if glyph_cache.enabled:
+                # Tex/Text SVGs shared with other jobs
+                glyph_hooks = f"        job_hooks.install_glyph_cache(r\"{glyph_cache.cache_dir}\")\n"
+            if partial_cache_dir:
+                # Animations unchanged since an earlier render are not rendered again
+                glyph_hooks += f"        job_hooks.install_partial_movie_cache(r\"{partial_cache_dir}\")\n"
+            if encoder:
+                glyph_hooks += f"        job_hooks.install_encoder_profile({encoder!r})\n"
+            poster = ""
+            if POSTER_WIDTH > 0:
+                poster = f"        job_hooks.capture_poster(scene, {POSTER_WIDTH})\n"
+            if profile:
+                poster += f"        job_hooks.profile_scene(scene, {PROFILE_INTERVAL_MS / 1000!r}, {PROFILE_TOP_ALLOCATIONS})\n"
+            seeding = ""
+            if random_seed is not None:
+                seeding = (
+                    "    import random\n"
+                    "    import numpy\n"
+                    f"    random.seed({random_seed})\n"
+                    f"    numpy.random.seed({random_seed})\n"
+                )
             
-            # Look for Scene subclasses
-            for node in ast.walk(tree):
-                if isinstance(node, ast.ClassDef):
-                    for base in node.bases:
-                        if isinstance(base, ast.Name) and base.id == 'Scene':
-                            scene_class_name = node.name
-                            break
-            
-            if scene_class_name:
-                # Check if the construct method has sufficient content for video
-                # If not, we'll add a minimum wait time
-                render_code = f"""
+            # Check if the construct method has sufficient content for video
+            # If not, we'll add a minimum wait time
+            render_code = f"""
 # Render the scene
 if __name__ == "__main__":
     from manim import config
@@ -87,16 +333,30 @@ if __name__ == "__main__":
     # Force video generation settings
     config.media_dir = r"{os.path.join(temp_dir, 'media')}"
     config.video_dir = r"{os.path.join(temp_dir, 'media', 'videos')}"
-    config.quality = "medium_quality"
+    config.quality = "{preset['quality']}"
+    config.pixel_width = {preset['pixel_width']}
+    config.pixel_height = {preset['pixel_height']}
+    config.frame_rate = {preset['frame_rate']}
     config.format = "mp4"
     config.save_last_frame = False  # Don't save PNG frames
     config.write_to_movie = True    # Force video generation
-    config.disable_caching = True   # Disable caching to ensure fresh render
+    config.disable_caching = {not partial_cache_dir}   # Only reuse animations through the shared cache
     config.preview = False          # Don't open preview
-    
+    config.max_files_cached = {SKIP_ALL_ANIMATIONS}   # The job directory is temporary; keep every partial movie
+{overrides}
+    # Report render progress (first frame) back to the server
+    try:
+        import job_hooks
+        job_hooks.record_event("imported")
+        job_hooks.install_manim_hooks()
+{glyph_hooks}    except ImportError:
+        job_hooks = None
+{seeding}
     # Create the scene
     scene = {scene_class_name}()
-    
+    if job_hooks:
+        job_hooks.track_plays(scene)
+{poster}    
     # Override construct to ensure minimum video duration
     original_construct = scene.construct
     def construct_with_video(self):
@@ -122,13 +382,9 @@ if __name__ == "__main__":
                 if file.endswith(('.mp4', '.mov', '.avi')):
                     print(f"Generated video file: {{os.path.join(root, file)}}")
 """
-                code += render_code
-                
-            return code, scene_class_name
-            
-        except SyntaxError as e:
-            print(f"Error parsing code: {e}")
-            return code, None
+            code += render_code
+        
+        return code, scene_class_name
     
     def find_generated_files(self, temp_dir: str) -> List[str]:
         """Find generated video files in the temporary directory"""
@@ -198,17 +454,20 @@ if __name__ == "__main__":
         print(f"🎯 Selected main video: {sorted_videos[0]} from {len(video_files)} videos")
         return sorted_videos[0]
     
+    def unique_filename(self, file_path: str) -> str:
+        """Name a generated file so it cannot collide with the output of other renders"""
+        # Timestamp plus a random part, which keeps concurrent renders of the
+        # same scene (e.g. draft and final) apart
+        timestamp = str(int(time.time()))
+        name, ext = os.path.splitext(os.path.basename(file_path))
+        return f"{name}_{timestamp}_{uuid.uuid4().hex[:8]}{ext}"
+    
     def copy_generated_files(self, files: List[str], temp_dir: str) -> List[str]:
         """Copy generated files to output directory and return their paths"""
         copied_files = []
         
         for file_path in files:
-            filename = os.path.basename(file_path)
-            # Create unique filename with timestamp
-            import time
-            timestamp = str(int(time.time()))
-            name, ext = os.path.splitext(filename)
-            unique_filename = f"{name}_{timestamp}{ext}"
+            unique_filename = self.unique_filename(file_path)
             
             dest_path = os.path.join(self.output_dir, unique_filename)
             shutil.copy2(file_path, dest_path)
@@ -216,12 +475,428 @@ if __name__ == "__main__":
             
         return copied_files
     
-    def execute_code(self, code: str, timeout: int = 30, is_manim: bool = False) -> Dict[str, Any]:
-        """Execute the code and return results"""
-        # Create string buffers to capture output
-        stdout_buffer = StringIO()
-        stderr_buffer = StringIO()
+    def remux_for_web(self, videos: List[str], temp_dir: str) -> List[str]:
+        """Faststart copies of ``videos``, under the same file names"""
+        web_dir = os.path.join(temp_dir, "web")
+        os.makedirs(web_dir, exist_ok=True)
+        return [remux_faststart(video, os.path.join(web_dir, os.path.basename(video))) for video in videos]
+    
+    def save_thumbnails(
+        self,
+        result: Dict[str, Any],
+        runs: List[Dict[str, Any]],
+        videos: List[str],
+        temp_dir: str,
+        animated_preview: bool,
+        publish: Callable[[List[str], List[str]], Any] = None
+    ) -> None:
+        """
+        Publish (or copy to ``output_dir``) the poster of the main video, and
+        an animated preview of it if asked for, named after the video
+
+        The poster is the last frame the job captured: of the last scene or
+        segment when they were joined into one video, of the first scene otherwise.
+        """
+        files = {}
+        posters = [run['poster'] for run in (runs if len(videos) == 1 else runs[:1]) if run['poster']]
+        if posters:
+            files['poster'] = posters[-1]
+        if animated_preview:
+            try:
+                with timed(result['stages'], 'thumbnails'):
+                    files['animated_preview'] = make_animated_preview(
+                        videos[0], os.path.join(temp_dir, "animated_preview.webp"),
+                        ANIMATED_PREVIEW_WIDTH, ANIMATED_PREVIEW_FPS, ANIMATED_PREVIEW_MAX_FRAMES
+                    )
+            except MediaError as e:
+                print(f"⚠️  Could not make an animated preview: {e}")
+                result['thumbnail_error'] = str(e)
+        if not files:
+            return
+        
+        stem = os.path.splitext(result['generated_files'][0])[0]
+        kinds = list(files)
+        names = [f"{stem}_{kind}{os.path.splitext(files[kind])[1]}" for kind in kinds]
+        if publish:
+            with timed(result['stages'], 'upload'):
+                result['published_thumbnails'] = dict(zip(kinds, publish([files[kind] for kind in kinds], names)))
+        else:
+            with timed(result['stages'], 'copy'):
+                for kind, name in zip(kinds, names):
+                    shutil.copy2(files[kind], os.path.join(self.output_dir, name))
+        result['thumbnails'] = dict(zip(kinds, names))
+        print(f"🖼️  Saved thumbnails: {names}")
+    
+    def save_profile(
+        self,
+        result: Dict[str, Any],
+        jobs: List[Dict[str, Any]],
+        runs: List[Dict[str, Any]],
+        temp_dir: str,
+        publish: Callable[[List[str], List[str]], Any] = None
+    ) -> None:
+        """
+        Publish (or copy to ``output_dir``) the profile of a job's processes as
+        one collapsed-stack file, and report what they measured in ``profile``
+
+        With several scenes or segments, each process's stacks are rooted in a
+        frame named after it.
+        """
+        labels = [job.get('label', job['scene']) for job in jobs] if len(jobs) > 1 else [None]
+        path = os.path.join(temp_dir, f"{jobs[0]['scene'] or 'code'}_profile.folded")
+        samples = merge_profiles(
+            {label: os.path.join(job['dir'], PROFILE_FILE) for label, job in zip(labels, jobs)}, path
+        )
+        if samples is None:
+            print("⚠️  The job was profiled but left no profile")
+            return
+        
+        name = self.unique_filename(path)
+        result['profile'] = {
+            'file': name,
+            'samples': samples,
+            'interval_ms': PROFILE_INTERVAL_MS,
+            # None for processes killed before they finished rendering
+            'processes': [
+                {
+                    'label': label,
+                    'peak_rss_mb': run['profile']['peak_rss_mb'],
+                    'traced_peak_mb': run['profile']['traced_peak_mb'],
+                    'top_allocations': run['profile']['top_allocations']
+                } if run['profile'] else None
+                for label, run in zip(labels, runs)
+            ]
+        }
+        if publish:
+            with timed(result['stages'], 'upload'):
+                result['published_profile'] = publish([path], [name])[0]
+        else:
+            with timed(result['stages'], 'copy'):
+                shutil.copy2(path, os.path.join(self.output_dir, name))
+        print(f"🔬 Saved profile with {samples} samples: {name}")
+    
+    def save_logs(
+        self,
+        result: Dict[str, Any],
+        jobs: List[Dict[str, Any]],
+        temp_dir: str,
+        publish: Callable[[List[str], List[str]], Any] = None
+    ) -> None:
+        """
+        Publish (or copy to ``output_dir``) the full stdout and stderr of a
+        job's processes as one text file, named in ``logs``
+        """
+        path = os.path.join(temp_dir, f"{jobs[0]['scene'] or 'code'}_log.txt")
+        with open(path, "wb") as out:
+            for job in jobs:
+                for stream in ("stdout", "stderr"):
+                    log_path = os.path.join(job['dir'], f"{stream}.log")
+                    if not os.path.exists(log_path):
+                        continue
+                    out.write(f"=== {job.get('label', job['scene']) or 'code'} {stream} ===\n".encode())
+                    with open(log_path, "rb") as f:
+                        shutil.copyfileobj(f, out)
         
+        name = self.unique_filename(path)
+        result['logs']['file'] = name
+        if publish:
+            with timed(result['stages'], 'upload'):
+                result['published_log'] = publish([path], [name])[0]
+        else:
+            with timed(result['stages'], 'copy'):
+                shutil.copy2(path, os.path.join(self.output_dir, name))
+        print(f"📜 Saved full logs: {name}")
+    
+    def run_in_subprocess(self, script_path: str, temp_dir: str, watch: "JobWatch") -> Dict[str, Any]:
+        """
+        Run a script in its own child process and wait for it with a hard deadline
+
+        The child gets ``temp_dir`` as its working directory and writes stdout and
+        stderr to files inside it, so concurrent jobs never share a cwd or output
+        stream. On overrun or cancellation the child's whole process group is
+        killed and whatever output it produced so far is returned.
+
+        Returns:
+            dict: {'returncode': int, 'stdout': str, 'stderr': str, 'stdout_bytes': int,
+            'stderr_bytes': int, 'log_truncated': bool, 'timed_out': bool, 'cancelled': bool}
+        """
+        stdout_path = os.path.join(temp_dir, "stdout.log")
+        stderr_path = os.path.join(temp_dir, "stderr.log")
+        env = dict(os.environ, PYTHONUNBUFFERED="1", JOB_DIR=temp_dir)
+        # Let injected render code import job_hooks from the app directory
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [APP_DIR, env.get("PYTHONPATH")]))
+
+        with open(stdout_path, "w") as stdout_file, open(stderr_path, "w") as stderr_file:
+            process = subprocess.Popen(
+                [sys.executable, script_path],
+                cwd=temp_dir,
+                stdin=subprocess.DEVNULL,
+                stdout=stdout_file,
+                stderr=stderr_file,
+                env=env,
+                start_new_session=True  # own process group, so a kill takes its children too
+            )
+            while True:
+                try:
+                    process.wait(timeout=WATCH_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    if watch.check():
+                        watch.kill(process.pid)
+            watch.check()
+
+        return dict(
+            read_job_output(temp_dir),
+            returncode=process.returncode,
+            timed_out=watch.timed_out,
+            cancelled=watch.cancelled
+        )
+
+    def prepare_scene_jobs(
+        self,
+        code: str,
+        temp_dir: str,
+        is_manim: bool,
+        scene_names: List[str],
+        quality: str = DEFAULT_QUALITY,
+        partial_cache_dir: str = None,
+        encoder: Dict[str, Any] = None,
+        profile: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Write the script(s) for a run into ``temp_dir``
+
+        Plain code, and Manim code with at most one scene, becomes a single job
+        in ``temp_dir`` itself. With several scenes each one gets its own
+        subdirectory, Manim config and render code so they can run in parallel.
+        """
+        if not is_manim or len(scene_names) <= 1:
+            scene_name = scene_names[0] if scene_names else None
+            if is_manim:
+                self.setup_manim_working_directory(temp_dir, quality)
+                code, scene_name = self.execute_manim_code(
+                    code, temp_dir, scene_name, quality=quality, partial_cache_dir=partial_cache_dir,
+                    encoder=encoder, profile=profile
+                )
+                print(f"Manim working directory setup complete: {temp_dir}")
+            script_path = os.path.join(temp_dir, 'main.py')
+            with open(script_path, "w") as f:
+                f.write(code)
+            return [{'scene': scene_name, 'dir': temp_dir, 'script': script_path}]
+        
+        jobs = []
+        for index, scene_name in enumerate(scene_names):
+            scene_dir = os.path.join(temp_dir, f"scene_{index:02d}_{scene_name}")
+            os.makedirs(scene_dir)
+            self.setup_manim_working_directory(scene_dir, quality)
+            scene_code, _ = self.execute_manim_code(
+                code, scene_dir, scene_name, quality=quality, partial_cache_dir=partial_cache_dir,
+                encoder=encoder, profile=profile
+            )
+            script_path = os.path.join(scene_dir, 'main.py')
+            with open(script_path, "w") as f:
+                f.write(scene_code)
+            jobs.append({'scene': scene_name, 'dir': scene_dir, 'script': script_path})
+        print(f"🎬 Prepared {len(jobs)} scenes to render in parallel: {scene_names}")
+        return jobs
+    
+    def prepare_segment_jobs(
+        self,
+        code: str,
+        temp_dir: str,
+        scene_name: str,
+        segments: int,
+        timeout: int,
+        cancel_event: threading.Event = None,
+        quality: str = DEFAULT_QUALITY,
+        partial_cache_dir: str = None,
+        encoder: Dict[str, Any] = None,
+        profile: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Split one scene into up to ``segments`` parts that render in parallel
+
+        A planning pass runs the scene with every animation skipped, which only
+        fast-forwards its state, to learn how long each play is. Each segment
+        then renders its own range of plays and skips everything before it, as
+        ``manim -n`` does.
+
+        Returns:
+            list: The segment jobs, or an empty list to render the scene in one piece
+        """
+        plan_dir = os.path.join(temp_dir, "segment_plan")
+        os.makedirs(plan_dir)
+        self.setup_manim_working_directory(plan_dir, quality)
+        plan_code, _ = self.execute_manim_code(
+            code, plan_dir, scene_name,
+            {'from_animation_number': SKIP_ALL_ANIMATIONS, 'write_to_movie': False},
+            SEGMENT_RANDOM_SEED, quality
+        )
+        plan_job = {'scene': scene_name, 'dir': plan_dir, 'script': os.path.join(plan_dir, 'main.py')}
+        with open(plan_job['script'], "w") as f:
+            f.write(plan_code)
+        
+        plan = self.run_script(plan_job, timeout, None, cancel_event)
+        durations = None
+        for event in read_events(plan_dir):
+            if event.get('event') == 'plays':
+                durations = event['durations']
+        if plan['returncode'] != 0 or plan['timed_out'] or plan['cancelled'] or not durations:
+            print(f"⚠️  Could not plan segments for {scene_name}, rendering it in one piece")
+            return []
+        
+        ranges = plan_segments(durations, segments)
+        if len(ranges) < 2:
+            return []
+        print(f"✂️  Splitting {scene_name} ({len(durations)} plays, {sum(durations):.1f}s) into segments {ranges}")
+        
+        jobs = []
+        for index, (first, last) in enumerate(ranges):
+            segment_dir = os.path.join(temp_dir, f"segment_{index:02d}")
+            os.makedirs(segment_dir)
+            self.setup_manim_working_directory(segment_dir, quality)
+            # The last segment renders to the end, whatever the plan counted
+            upto = last if index < len(ranges) - 1 else -1
+            segment_code, _ = self.execute_manim_code(
+                code, segment_dir, scene_name,
+                {'from_animation_number': first, 'upto_animation_number': upto},
+                SEGMENT_RANDOM_SEED, quality, partial_cache_dir, encoder, profile
+            )
+            script_path = os.path.join(segment_dir, 'main.py')
+            with open(script_path, "w") as f:
+                f.write(segment_code)
+            jobs.append({
+                'scene': scene_name,
+                'label': f"{scene_name} segment {index + 1}/{len(ranges)}",
+                'segment': (first, last),
+                'dir': segment_dir,
+                'script': script_path
+            })
+        return jobs
+    
+    def start_stream(self, job: Dict[str, Any], stream_upload: Callable[[str], Any]) -> Optional[VideoStream]:
+        """Start uploading ``job``'s video while it renders, or return None if that is not possible"""
+        upload = None
+        try:
+            upload = stream_upload(self.unique_filename(f"{job['scene']}.mp4"))
+            return VideoStream(job['dir'], upload).start()
+        except Exception as e:
+            if upload is not None:
+                upload.abort()
+            print(f"⚠️  Could not start streaming upload, the video will be uploaded when it is done: {e}")
+            return None
+    
+    def start_hls_stream(self, job: Dict[str, Any], start_hls: Callable[[str], HlsStream]) -> Optional[HlsStream]:
+        """Start publishing ``job``'s video as HLS while it renders, or return None if that is not possible"""
+        try:
+            return start_hls(job['dir']).start()
+        except Exception as e:
+            print(f"⚠️  Could not start HLS output: {e}")
+            return None
+    
+    def fan_out_width(self, scripts: int) -> int:
+        """
+        How many of a job's ``scripts`` to run at once
+
+        The scheduler hands each job one slot, so a job with several scenes
+        only spreads out over pool workers that are idle; the other scripts
+        wait their turn, in order. Without a pool every script runs at once.
+        """
+        if self.pool is None:
+            return scripts
+        return max(1, min(scripts, self.pool.idle_workers()))
+
+    def run_script(
+        self,
+        job: Dict[str, Any],
+        timeout: int,
+        on_stage: Callable[[str], None] = None,
+        cancel_event: threading.Event = None
+    ) -> Dict[str, Any]:
+        """Run one prepared script on the worker pool, or in a fresh interpreter without one"""
+        start_time = time.time()
+        print(f"🎬 Executing code in child process, directory: {job['dir']}")
+        watch = JobWatch(job['dir'], timeout, on_stage, cancel_event)
+        if self.pool is not None:
+            run = self.pool.run(job['script'], job['dir'], watch)
+        else:
+            run = self.run_in_subprocess(job['script'], job['dir'], watch)
+        end_time = time.time()
+        run['execution_time'] = end_time - start_time
+        events = read_events(job['dir'])
+        run['first_frame_time'] = first_event_time(events, 'first_frame')
+        glyph_lookups = [event['hit'] for event in events if event.get('event') == 'glyph_cache']
+        run['glyph_hits'] = sum(glyph_lookups)
+        run['glyph_misses'] = len(glyph_lookups) - run['glyph_hits']
+        reuses = [event['reused'] for event in events if event.get('event') == 'partial_movie']
+        run['animations_reused'] = sum(reuses)
+        run['animations_rendered'] = len(reuses) - run['animations_reused']
+        partial_movies = [event['time'] for event in events if event.get('event') == 'partial_movie_ready']
+        run['last_frame_time'] = partial_movies[-1] if partial_movies else None
+        run['encode_seconds'] = sum(event['seconds'] for event in events if event.get('event') == 'encoded')
+        run['stages'] = child_stages(start_time, end_time, events, run['encode_seconds'])
+        posters = [event['path'] for event in events if event.get('event') == 'poster']
+        run['poster'] = posters[-1] if posters and os.path.exists(posters[-1]) else None
+        profiles = [event for event in events if event.get('event') == 'profile']
+        run['profile'] = profiles[-1] if profiles else None
+        return run
+    
+    def execute_code(
+        self,
+        code: str,
+        timeout: int = 30,
+        is_manim: bool = False,
+        on_stage: Callable[[str], None] = None,
+        cancel_event: threading.Event = None,
+        concat_scenes: bool = True,
+        parallel_segments: int = 0,
+        quality: str = DEFAULT_QUALITY,
+        cache_scope: str = None,
+        publish: Callable[[List[str], List[str]], Any] = None,
+        stream_upload: Callable[[str], Any] = None,
+        start_hls: Callable[[str], HlsStream] = None,
+        animated_preview: bool = False,
+        encoder_profile: str = DEFAULT_ENCODER_PROFILE,
+        scene_names: List[str] = None,
+        profile: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Execute the code in an isolated child process and return results
+
+        For Manim code every Scene subclass is rendered, each in its own
+        process and all at the same time. ``scene_names`` are the scenes as
+        ``preflight.check`` found them; the code is parsed for them otherwise. With ``concat_scenes`` the scene
+        videos are joined in source order into a single file. Code with a
+        single scene can instead be split into ``parallel_segments`` time
+        segments that render side by side and are joined afterwards.
+        ``quality`` picks the resolution and frame rate from ``QUALITY_PRESETS``,
+        and ``encoder_profile`` the encoder settings from ``ENCODER_PROFILES``;
+        with ``faststart`` the finished videos are remuxed for the web.
+        Animations already rendered in the same ``cache_scope`` (a conversation
+        id) are reused from the partial movie cache instead of rendered again.
+
+        ``on_stage`` is called with each stage the job reports (e.g. "encoding")
+        while it runs. Setting ``cancel_event`` kills the job.
+
+        Rendered videos are copied to ``output_dir``, unless ``publish`` is
+        given: it is then called with the video paths, still in the render
+        directory, and a unique name for each, and whatever it returns is
+        stored as ``published``. With ``stream_upload``, a function that
+        starts an incremental upload (``storage.start_multipart_upload``), a
+        single-scene video is instead uploaded while it renders, and only
+        published the regular way if streaming fails. ``start_hls`` is called
+        with the job directory of a single-scene render and returns an
+        ``HlsStream`` that publishes the video as HLS while it renders.
+        
+        A poster of the main video, and with ``animated_preview`` a short
+        animated WebP of it, are published or copied the same way and listed
+        in ``thumbnails``.
+
+        With ``profile`` each Manim job process is profiled while it renders,
+        and the profile is published or copied the same way, even if the job
+        failed or timed out (see ``save_profile``). Profiled renders never
+        reuse animations, which would leave them out of the profile.
+        """
         result = {
             'success': False,
             'output': '',
@@ -229,123 +904,785 @@ if __name__ == "__main__":
             'execution_time': 0,
             'installed_packages': [],  # Empty since we skip installation
             'failed_packages': [],     # Empty since we skip installation
-            'generated_files': []
+            'generated_files': [],
+            'scenes': [],
+            'segments': [],
+            'timed_out': False,
+            'cancelled': False,
+            'time_to_first_frame': None,
+            'peak_rss_mb': None,
+            'glyph_cache': {'hits': 0, 'misses': 0},
+            'animations': {'reused': 0, 'rendered': 0},
+            'streamed': False,
+            'last_frame_to_url': None,
+            'hls': None,
+            'thumbnails': {},
+            'encoder': None,
+            # Size of the job's stdout and stderr, and whether the result has all of it
+            'logs': None,
+            # Seconds spent in each stage of the job (see ``child_stages`` for the render itself)
+            'stages': {}
         }
+        if not timeout or timeout <= 0:
+            timeout = DEFAULT_TIMEOUT
         
         # Create temporary directory for execution
-        with tempfile.TemporaryDirectory() as temp_dir:
+        stages = result['stages']
+        with job_directory(stages) as temp_dir:
+            start_time = time.time()
+            stream = None
+            hls_stream = None
             try:
-                import time
-                start_time = time.time()
-                
                 # Skip package installation - assume libraries are pre-installed
                 print("Skipping package installation - using pre-installed libraries")
                 
-                # Setup working directory for Manim if needed
-                if is_manim:
-                    self.setup_manim_working_directory(temp_dir)
-                    code, scene_class = self.execute_manim_code(code, temp_dir)
-                    print(f"Manim working directory setup complete: {temp_dir}")
+                if not is_manim:
+                    scene_names = []
+                elif scene_names is None:
+                    scene_names = self.find_scene_classes(code)
+                jobs = []
+                segments = min(parallel_segments or 0, MAX_PARALLEL_SEGMENTS)
+                partial_cache_dir = None
+                if is_manim and partial_movie_cache.enabled and not profile:
+                    partial_cache_dir = partial_movie_scope_dir(cache_scope, quality, encoder_profile)
+                if is_manim and len(scene_names) == 1:
+                    # Segments that would wait for a worker only add planning and joining work
+                    segments = self.fan_out_width(segments)
+                split = is_manim and segments > 1 and len(scene_names) == 1
+                width = self.fan_out_width(segments if split else max(1, len(scene_names)))
+                encoder = encoder_settings(encoder_profile, width)
+                if split:
+                    if can_concat():
+                        jobs = self.prepare_segment_jobs(
+                            code, temp_dir, scene_names[0], segments, timeout, cancel_event, quality, partial_cache_dir,
+                            encoder, profile
+                        )
+                    else:
+                        print("⚠️  Neither ffmpeg nor PyAV is available to join segments, rendering in one piece")
+                if not jobs:
+                    jobs = self.prepare_scene_jobs(
+                        code, temp_dir, is_manim, scene_names, quality, partial_cache_dir, encoder, profile
+                    )
+                segmented = any('segment' in job for job in jobs)
                 
-                # Save current working directory and change to temp_dir
-                original_cwd = os.getcwd()
-                os.chdir(temp_dir)
+                if is_manim and len(jobs) == 1 and jobs[0]['scene'] and not segmented:
+                    if stream_upload:
+                        stream = self.start_stream(jobs[0], stream_upload)
+                    if start_hls:
+                        hls_stream = self.start_hls_stream(jobs[0], start_hls)
                 
-                try:
-                    # Create a safe execution environment
-                    exec_globals = {
-                        '__builtins__': __builtins__,
-                        '__name__': '__main__',
-                        '__file__': os.path.join(temp_dir, 'main.py'),
-                        '__doc__': None,
-                        '__package__': None
-                    }
-                    
-                    # Execute the code with captured output
-                    with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-                        print(f"🎬 Executing Manim code in directory: {temp_dir}")
-                        print(f"📂 Working directory files before execution: {os.listdir(temp_dir)}")
-                        exec(code, exec_globals)
-                        print(f"📂 Working directory files after execution: {os.listdir(temp_dir)}")
-                        if os.path.exists(os.path.join(temp_dir, 'media')):
-                            print(f"📂 Media directory contents: {os.listdir(os.path.join(temp_dir, 'media'))}")
-                            videos_path = os.path.join(temp_dir, 'media', 'videos')
-                            if os.path.exists(videos_path):
-                                print(f"📂 Videos directory contents: {os.listdir(videos_path)}")
-                                for item in os.listdir(videos_path):
-                                    subdir_path = os.path.join(videos_path, item)
-                                    if os.path.isdir(subdir_path):
-                                        print(f"📂 {item} subdirectory contents: {os.listdir(subdir_path)}")
-                    
-                    # Get the output
-                    stdout_content = stdout_buffer.getvalue()
-                    stderr_content = stderr_buffer.getvalue()
-                    
-                    print(f"📤 Stdout: {stdout_content}")
-                    if stderr_content:
-                        print(f"⚠️  Stderr: {stderr_content}")
-                    
-                    # Find and copy generated files
-                    if is_manim:
-                        # Debug: List all files in temp directory
-                        print(f"🔍 Searching for files in: {temp_dir}")
-                        for root, dirs, files in os.walk(temp_dir):
+                # Segment planning already used part of the time budget
+                stages['prepare'] = time.time() - start_time
+                # Scripts that wait for a turn share one deadline with the rest
+                deadline = time.time() + max(1, timeout - stages['prepare'])
+                def run_job(job):
+                    return self.run_script(job, max(1, deadline - time.time()), on_stage, cancel_event)
+                if len(jobs) == 1:
+                    runs = [run_job(jobs[0])]
+                else:
+                    with ThreadPoolExecutor(max_workers=min(width, len(jobs))) as scene_executor:
+                        runs = list(scene_executor.map(run_job, jobs))
+                
+                if any(run['returncode'] != 0 or run['timed_out'] or run['cancelled'] for run in runs):
+                    if stream is not None:
+                        stream.abort()
+                        stream = None
+                    if hls_stream is not None:
+                        hls_stream.abort()
+                        hls_stream = None
+                
+                multi_scene = len(jobs) > 1
+                def label(job, text):
+                    return f"=== {job.get('label', job['scene'])} ===\n{text}" if multi_scene else text
+                
+                stdout_content = "\n".join(label(job, run['stdout']) for job, run in zip(jobs, runs))
+                stderr_content = "\n".join(
+                    label(job, run['stderr']) for job, run in zip(jobs, runs) if run['stderr']
+                )
+                
+                # Scripts run side by side, so each stage took as long as its slowest run
+                for run in runs:
+                    for name, seconds in run['stages'].items():
+                        stages[name] = max(stages.get(name, 0.0), seconds)
+                if profile and is_manim:
+                    # Before any early return: a failed or killed job's profile shows where it was stuck
+                    self.save_profile(result, jobs, runs, temp_dir, publish)
+                result['logs'] = {
+                    'stdout_bytes': sum(run['stdout_bytes'] for run in runs),
+                    'stderr_bytes': sum(run['stderr_bytes'] for run in runs),
+                    'truncated': any(run['log_truncated'] for run in runs)
+                }
+                if JOB_LOG_SPILL and result['logs']['truncated']:
+                    self.save_logs(result, jobs, temp_dir, publish)
+                
+                peak_rss = [run['peak_rss_mb'] for run in runs if run.get('peak_rss_mb') is not None]
+                result['peak_rss_mb'] = max(peak_rss) if peak_rss else None
+                result['glyph_cache'] = {
+                    'hits': sum(run['glyph_hits'] for run in runs),
+                    'misses': sum(run['glyph_misses'] for run in runs)
+                }
+                glyph_cache.record(result['glyph_cache']['hits'], result['glyph_cache']['misses'])
+                result['animations'] = {
+                    'reused': sum(run['animations_reused'] for run in runs),
+                    'rendered': sum(run['animations_rendered'] for run in runs)
+                }
+                partial_movie_cache.record(result['animations']['reused'], result['animations']['rendered'])
+                first_frames = [run['first_frame_time'] for run in runs if run['first_frame_time'] is not None]
+                if first_frames:
+                    result['time_to_first_frame'] = min(first_frames) - start_time
+                scenes = {}
+                for job, run in zip(jobs, runs):
+                    succeeded = run['returncode'] == 0 and not run['timed_out'] and not run['cancelled']
+                    if 'segment' in job:
+                        result['segments'].append({
+                            'first_play': job['segment'][0],
+                            'last_play': job['segment'][1],
+                            'success': succeeded,
+                            'execution_time': run['execution_time']
+                        })
+                    if job['scene']:
+                        scene = scenes.setdefault(job['scene'], {'name': job['scene'], 'success': True, 'execution_time': 0})
+                        scene['success'] = scene['success'] and succeeded
+                        scene['execution_time'] = max(scene['execution_time'], run['execution_time'])
+                result['scenes'] = list(scenes.values())
+                
+                print(f"📤 Stdout: {stdout_content}")
+                if stderr_content:
+                    print(f"⚠️  Stderr: {stderr_content}")
+                
+                result['output'] = stdout_content
+                result['execution_time'] = time.time() - start_time
+                
+                if any(run['cancelled'] for run in runs):
+                    result['cancelled'] = True
+                    result['error'] = f"Job was cancelled.\n{stderr_content}"
+                    return result
+                
+                if any(run['timed_out'] for run in runs):
+                    result['timed_out'] = True
+                    result['error'] = (
+                        f"Execution timed out after {timeout}s and was terminated.\n"
+                        f"{stderr_content}"
+                    )
+                    return result
+                
+                failed = [(job, run) for job, run in zip(jobs, runs) if run['returncode'] != 0]
+                if failed:
+                    if 'cairo' in stderr_content.lower() and 'symbol not found' in stderr_content:
+                        result['error'] = (
+                            "Manim/Cairo Installation Error: The Cairo graphics library is not properly linked.\n"
+                            "This is a common issue on macOS. To fix this:\n"
+                            "1. Install system dependencies: brew install cairo pkg-config\n"
+                            "2. Reinstall pycairo: pip uninstall pycairo && pip install pycairo --no-binary pycairo\n"
+                            "3. Or use a virtual environment with conda: conda install -c conda-forge manim\n\n"
+                            f"Original error:\n{stderr_content}"
+                        )
+                    elif multi_scene:
+                        result['error'] = "\n".join(
+                            f"{job.get('label', 'Scene ' + job['scene'])} failed (exit code {run['returncode']}):\n{run['stderr']}"
+                            for job, run in failed
+                        )
+                    else:
+                        result['error'] = f"Execution error (exit code {runs[0]['returncode']}):\n{stderr_content}"
+                    return result
+                
+                if hls_stream is not None:
+                    try:
+                        with timed(stages, 'upload'):
+                            hls = hls_stream.finish()
+                        result['hls'] = {
+                            'playlist_url': hls['playlist_url'],
+                            'segments': hls['segments'],
+                            'time_to_first_segment': (
+                                hls['first_segment_time'] - start_time if hls['first_segment_time'] else None
+                            )
+                        }
+                        print(f"📺 Published {hls['segments']} HLS segment(s): {hls['playlist_url']}")
+                    except MediaError as e:
+                        print(f"⚠️  {e}")
+                        result['hls_error'] = str(e)
+                    hls_stream = None
+                
+                # Find and copy generated files
+                if is_manim:
+                    videos = []
+                    discover_start = time.perf_counter()
+                    for job in jobs:
+                        # Debug: List all files in the job directory
+                        print(f"🔍 Searching for files in: {job['dir']}")
+                        for root, dirs, files in os.walk(job['dir']):
                             if files:
                                 print(f"📁 {root}: {files}")
                         
-                        generated_files = self.find_generated_files(temp_dir)
+                        generated_files = self.find_generated_files(job['dir'])
                         print(f"🎥 Found generated files: {generated_files}")
                         
-                        if generated_files:
-                            # Select only the main video file
-                            main_video = self.select_main_video_file(generated_files)
-                            if main_video:
-                                copied_files = self.copy_generated_files([main_video], temp_dir)
-                                result['generated_files'] = copied_files
-                                print(f"✅ Found and copied main video file: {copied_files}")
-                            else:
-                                print("❌ No suitable video file found")
-                                result['generated_files'] = []
+                        # Select only the main video file of each scene
+                        main_video = self.select_main_video_file(generated_files)
+                        if main_video:
+                            videos.append(main_video)
                         else:
-                            print("❌ No generated files found")
-                            result['generated_files'] = []
+                            print(f"❌ No suitable video file found for {job['scene'] or 'code'}")
+                    stages['discover'] = time.perf_counter() - discover_start
                     
-                    result['success'] = True
-                    result['output'] = stdout_content
-                    result['error'] = stderr_content if stderr_content else ''
-                    result['execution_time'] = time.time() - start_time
+                    if segmented:
+                        combined_path = os.path.join(temp_dir, f"{jobs[0]['scene']}.mp4")
+                        try:
+                            with timed(stages, 'concat'):
+                                videos = [concat_videos(videos, combined_path)]
+                            print(f"🎞️  Joined {len(jobs)} segments into {combined_path}")
+                        except MediaError as e:
+                            result['error'] = f"Could not join the rendered segments: {e}"
+                            return result
+                    elif concat_scenes and len(videos) > 1:
+                        combined_path = os.path.join(temp_dir, f"{jobs[0]['scene']}_and_{len(videos) - 1}_more.mp4")
+                        try:
+                            with timed(stages, 'concat'):
+                                videos = [concat_videos(videos, combined_path)]
+                            print(f"🎞️  Concatenated {len(jobs)} scenes into {combined_path}")
+                        except MediaError as e:
+                            print(f"⚠️  Could not concatenate scenes, returning them separately: {e}")
+                            result['concat_error'] = str(e)
                     
-                finally:
-                    # Restore original working directory
-                    os.chdir(original_cwd)
+                    if videos and stream is not None:
+                        result['execution_time'] = time.time() - start_time
+                        object_name = stream.object_name
+                        try:
+                            with timed(stages, 'upload'):
+                                upload = stream.finish()
+                        except MediaError as e:
+                            upload = {'success': False, 'error': str(e)}
+                        stream = None
+                        if upload['success']:
+                            result['published'] = [upload]
+                            result['generated_files'] = [object_name]
+                            result['streamed'] = True
+                            print(f"✅ Streamed video file: {upload['url']}")
+                        else:
+                            print(f"⚠️  Streaming upload failed, publishing the finished video instead: {upload['error']}")
                     
-            except Exception as e:
-                error_str = str(e)
-                result['success'] = False
-                result['output'] = stdout_buffer.getvalue()
-                result['execution_time'] = time.time() - start_time if 'start_time' in locals() else 0
+                    result['encoder'] = {
+                        'profile': encoder_profile,
+                        'codec': encoder['codec'],
+                        'preset': encoder['preset'],
+                        'crf': encoder['crf'],
+                        'threads': encoder['threads'],
+                        'faststart': encoder['faststart'] and not result['streamed'],
+                        'encode_seconds': round(sum(run['encode_seconds'] for run in runs), 3),
+                        'remux_seconds': None,
+                        'bytes': None
+                    }
+                    if videos and result['encoder']['faststart']:
+                        # A fragmented (streamed) MP4 plays progressively as it is
+                        remux_start = time.time()
+                        try:
+                            videos = self.remux_for_web(videos, temp_dir)
+                        except MediaError as e:
+                            print(f"⚠️  Could not move the MP4 index to the front, keeping the video as rendered: {e}")
+                            result['remux_error'] = str(e)
+                            result['encoder']['faststart'] = False
+                        stages['remux'] = time.time() - remux_start
+                        result['encoder']['remux_seconds'] = round(stages['remux'], 3)
+                    if videos:
+                        result['encoder']['bytes'] = sum(os.path.getsize(video) for video in videos)
+                    
+                    if not videos:
+                        print("❌ No generated files found")
+                        result['generated_files'] = []
+                    elif result['streamed']:
+                        pass
+                    elif publish:
+                        # Straight from the render directory, before it is removed
+                        names = [self.unique_filename(video) for video in videos]
+                        result['execution_time'] = time.time() - start_time
+                        with timed(stages, 'upload'):
+                            result['published'] = publish(videos, names)
+                        result['generated_files'] = names
+                        print(f"✅ Published video files: {names}")
+                    else:
+                        with timed(stages, 'copy'):
+                            copied_files = self.copy_generated_files(videos, temp_dir)
+                        result['generated_files'] = copied_files
+                        print(f"✅ Found and copied video files: {copied_files}")
                 
-                # Special handling for common Manim/Cairo errors
-                if 'cairo' in error_str.lower() and 'symbol not found' in error_str:
-                    result['error'] = (
-                        "Manim/Cairo Installation Error: The Cairo graphics library is not properly linked.\n"
-                        "This is a common issue on macOS. To fix this:\n"
-                        "1. Install system dependencies: brew install cairo pkg-config\n"
-                        "2. Reinstall pycairo: pip uninstall pycairo && pip install pycairo --no-binary pycairo\n"
-                        "3. Or use a virtual environment with conda: conda install -c conda-forge manim\n\n"
-                        f"Original error: {error_str}\n{traceback.format_exc()}"
-                    )
+                if stream is not None:
+                    # Nothing was rendered that could be streamed
+                    stream.abort()
+                    stream = None
+                result['success'] = True
+                result['error'] = stderr_content if stderr_content else ''
+                if 'published' not in result:
+                    result['execution_time'] = time.time() - start_time
                 else:
-                    result['error'] = f"Execution error: {error_str}\n{traceback.format_exc()}"
-            
-            finally:
-                stdout_buffer.close()
-                stderr_buffer.close()
+                    last_frames = [run['last_frame_time'] for run in runs if run['last_frame_time'] is not None]
+                    if last_frames:
+                        result['last_frame_to_url'] = time.time() - max(last_frames)
+                if is_manim and result['generated_files']:
+                    self.save_thumbnails(result, runs, videos, temp_dir, animated_preview, publish)
+                    
+            except Exception as e:
+                if stream is not None:
+                    stream.abort()
+                if hls_stream is not None:
+                    hls_stream.abort()
+                result['success'] = False
+                result['execution_time'] = time.time() - start_time
+                result['error'] = f"Execution error: {str(e)}\n{traceback.format_exc()}"
         
         return result
 
 
-def execute_code_with_requirements(code: str, timeout: int = 30, is_manim: bool = False) -> Dict[str, Any]:
+def plan_segments(durations: List[float], segments: int) -> List[Tuple[int, int]]:
+    """
+    Split plays into at most ``segments`` contiguous runs of similar duration
+
+    Args:
+        durations (list): Duration of each play, in play order
+        segments (int): Number of segments wanted
+
+    Returns:
+        list: ``(first, last)`` play indices of each segment, inclusive
+    """
+    segments = max(1, min(segments, len(durations)))
+    total = sum(durations)
+    ranges = []
+    first = 0
+    elapsed = 0.0
+    for index, duration in enumerate(durations[:-1]):
+        elapsed += duration
+        cuts_left = segments - len(ranges) - 1
+        if cuts_left == 0:
+            break
+        # Cut once this segment has its share, or when every remaining play needs a segment of its own
+        if elapsed >= total * (len(ranges) + 1) / segments or len(durations) - index - 1 == cuts_left:
+            ranges.append((first, index))
+            first = index + 1
+    ranges.append((first, len(durations) - 1))
+    return ranges
+
+
+def read_log(path: str, head_bytes: int, tail_bytes: int) -> Tuple[str, int]:
+    """
+    Read a log file, keeping only its first ``head_bytes`` and last ``tail_bytes``
+
+    Memory use does not depend on the size of the file. Where the middle is
+    left out, the text is cut at line ends and a marker says how much is missing.
+
+    Returns:
+        tuple: The text, and the size of the file in bytes
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return '', 0
+    with open(path, "rb") as f:
+        if size <= head_bytes + tail_bytes:
+            return f.read(head_bytes + tail_bytes).decode(errors="replace"), size
+        head = f.read(head_bytes)
+        f.seek(size - tail_bytes)
+        tail = f.read(tail_bytes)
+    if b"\n" in head:
+        head = head[:head.rindex(b"\n") + 1]
+    if b"\n" in tail:
+        tail = tail[tail.index(b"\n") + 1:]
+    omitted = size - len(head) - len(tail)
+    return (
+        f"{head.decode(errors='replace')}[... {omitted} bytes of output left out ...]\n"
+        f"{tail.decode(errors='replace')}"
+    ), size
+
+
+def read_job_output(temp_dir: str) -> Dict[str, Any]:
+    """
+    Read the stdout and stderr a job process wrote into its directory, cut
+    down by ``read_log``, with the full size of each
+    """
+    head_bytes, tail_bytes = JOB_LOG_HEAD_KB * 1024, JOB_LOG_TAIL_KB * 1024
+    output = {'log_truncated': False}
+    for stream in ("stdout", "stderr"):
+        text, size = read_log(os.path.join(temp_dir, f"{stream}.log"), head_bytes, tail_bytes)
+        output[stream] = text
+        output[f"{stream}_bytes"] = size
+        output['log_truncated'] = output['log_truncated'] or size > head_bytes + tail_bytes
+    return output
+
+
+def _current_rss_mb() -> float:
+    """Resident memory of the calling process in megabytes"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is the peak, not current, but it is the best we have off Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _warm_manim() -> Dict[str, Any]:
+    """Import Manim and its heavy dependencies once so forked jobs inherit them"""
+    start = time.perf_counter()
+    namespace = {}
+    try:
+        exec("from manim import *", namespace)
+        try:
+            # Font discovery is otherwise paid by the first Text() of every job
+            import manimpango
+            manimpango.list_fonts()
+        except Exception:
+            pass
+        return {
+            'manim': True,
+            'import_time': time.perf_counter() - start,
+            'error': None,
+            # What jobs see after ``from manim import *``, for pre-flight checks in the server
+            'names': sorted(namespace)
+        }
+    except Exception as e:
+        return {'manim': False, 'import_time': time.perf_counter() - start, 'error': str(e), 'names': None}
+
+
+def _run_forked_job(job: Dict[str, Any]) -> None:
+    """Body of a forked job child: run the script like ``python main.py`` would, then exit"""
+    exit_code = 1
+    try:
+        os.setsid()  # own process group, so a kill takes its children too
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        os.chdir(job['cwd'])
+        os.environ["JOB_DIR"] = job['cwd']
+        sys.path[0] = job['cwd']
+        sys.argv = [job['script']]
+
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        for fd, name in ((1, "stdout.log"), (2, "stderr.log")):
+            out = os.open(os.path.join(job['cwd'], name), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.dup2(out, fd)
+            os.close(out)
+
+        with open(job['script']) as f:
+            source = f.read()
+        exec_globals = {
+            '__builtins__': __builtins__,
+            '__name__': '__main__',
+            '__file__': job['script'],
+            '__doc__': None,
+            '__package__': None
+        }
+        exec(compile(source, job['script'], 'exec'), exec_globals)
+        exit_code = 0
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as e:
+        # Skip this function's frame so the traceback matches a plain ``python main.py`` run
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def zygote_main(fd: int) -> None:
+    """
+    Entry point of a pre-warmed pool worker
+
+    Imports Manim once, reports readiness, then forks a fresh child for every
+    job it receives. The child starts with Manim already in memory but shares
+    no state with other jobs, and the worker itself never runs user code.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # shutdown is driven by the server
+    conn = Connection(fd)
+    warm = _warm_manim()
+    warm['pid'] = os.getpid()
+    conn.send(('ready', warm))
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+
+        # Anything still buffered here would otherwise be flushed again by the child
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            conn.close()
+            _run_forked_job(job)
+
+        conn.send(('started', pid))
+        _, status, rusage = os.wait4(pid, 0)
+        conn.send(('done', {
+            'returncode': os.waitstatus_to_exitcode(status),
+            'peak_rss_mb': rusage.ru_maxrss / 1024,
+            'worker_rss_mb': _current_rss_mb()
+        }))
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised when a pool worker dies while serving a job"""
+
+
+class WarmWorker:
+    """Server-side handle for one pre-warmed worker process"""
+
+    def __init__(self):
+        parent_sock, child_sock = socket.socketpair()
+        fd = child_sock.fileno()
+        bootstrap = f"import sys; sys.path.insert(0, {APP_DIR!r}); import worker; worker.zygote_main({fd})"
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", bootstrap],
+            cwd=APP_DIR,
+            stdin=subprocess.DEVNULL,
+            env=dict(os.environ, PYTHONUNBUFFERED="1"),
+            pass_fds=(fd,)
+        )
+        child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+        self.jobs_served = 0
+        self.rss_mb = 0.0
+        self.info = None
+        self._ready_lock = threading.Lock()
+
+    def wait_ready(self, timeout: float) -> Dict[str, Any]:
+        """Block until the worker has finished warming up"""
+        # The pool also waits for the first worker to learn Manim's names
+        with self._ready_lock:
+            if self.info is None:
+                if not self.conn.poll(timeout):
+                    raise WorkerCrashedError(f"Worker {self.process.pid} did not warm up within {timeout}s")
+                try:
+                    kind, self.info = self.conn.recv()
+                except (EOFError, OSError):
+                    raise WorkerCrashedError(f"Worker {self.process.pid} exited while warming up")
+                if self.info['manim']:
+                    print(f"🔥 Worker {self.process.pid} warm, Manim imported in {self.info['import_time']:.2f}s")
+                else:
+                    print(f"⚠️  Worker {self.process.pid} started without Manim: {self.info['error']}")
+            return self.info
+
+    def run_job(self, script_path: str, cwd: str, watch: JobWatch) -> Dict[str, Any]:
+        """Run one job on this worker, killing it on overrun or cancellation"""
+        self.conn.send({'script': script_path, 'cwd': cwd})
+        child_pid = None
+
+        try:
+            while True:
+                if not self.conn.poll(WATCH_INTERVAL):
+                    if child_pid and watch.check():
+                        watch.kill(child_pid)
+                    if self.process.poll() is not None:
+                        raise WorkerCrashedError(f"Worker {self.process.pid} exited during a job")
+                    continue
+
+                kind, payload = self.conn.recv()
+                if kind == 'started':
+                    child_pid = payload
+                elif kind == 'done':
+                    watch.check()
+                    self.jobs_served += 1
+                    self.rss_mb = payload['worker_rss_mb']
+                    payload['timed_out'] = watch.timed_out
+                    payload['cancelled'] = watch.cancelled
+                    return payload
+        except (EOFError, OSError):
+            raise WorkerCrashedError(f"Worker {self.process.pid} exited during a job")
+        finally:
+            # Never leave an orphaned job running if the worker went away
+            if child_pid and self.process.poll() is not None:
+                try:
+                    os.killpg(child_pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def should_recycle(self) -> bool:
+        return (
+            self.process.poll() is not None
+            or self.jobs_served >= WORKER_MAX_JOBS
+            or self.rss_mb >= WORKER_MAX_RSS_MB
+        )
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of pre-warmed workers with Manim already imported
+
+    ``run`` has the same contract as ``CodeExecutor.run_in_subprocess`` but
+    skips interpreter start-up and the Manim import. Workers are replaced
+    after ``WORKER_MAX_JOBS`` jobs or once they grow past ``WORKER_MAX_RSS_MB``.
+    Once the first worker is warm, ``manim_names`` holds the names
+    ``from manim import *`` defines, for pre-flight checks.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._closed = False
+        self.recycled = 0
+        self.manim_names = None
+        for _ in range(size):
+            self._idle.put(self._spawn())
+        threading.Thread(target=self._learn_manim_names, name="manim-names", daemon=True).start()
+
+    def _learn_manim_names(self) -> None:
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                info = worker.wait_ready(WORKER_READY_TIMEOUT)
+            except WorkerCrashedError:
+                continue
+            if info.get('names'):
+                self.manim_names = frozenset(info['names'])
+                return
+
+    def _spawn(self) -> WarmWorker:
+        worker = WarmWorker()
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _retire(self, worker: WarmWorker) -> None:
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            self.recycled += 1
+        threading.Thread(target=worker.stop, daemon=True).start()
+
+    def _next_idle(self, watch: JobWatch) -> Optional[WarmWorker]:
+        """
+        Wait for a free worker, or return None once the job's time runs out or
+        it is cancelled; the wait counts against the job's timeout
+        """
+        while True:
+            try:
+                return self._idle.get(timeout=WATCH_INTERVAL)
+            except queue.Empty:
+                if watch.check():
+                    return None
+
+    def run(self, script_path: str, temp_dir: str, watch: JobWatch) -> Dict[str, Any]:
+        """Run a script on the next free worker; blocks until one is available or the job's time runs out"""
+        worker = self._next_idle(watch)
+        if worker is None:
+            reason = "was cancelled" if watch.cancelled else f"exceeded {watch.timeout}s"
+            print(f"⏰ Job {reason} while waiting for a pool worker")
+            return dict(
+                read_job_output(temp_dir),
+                returncode=-signal.SIGKILL,
+                peak_rss_mb=None,
+                timed_out=watch.timed_out,
+                cancelled=watch.cancelled
+            )
+        try:
+            worker.wait_ready(WORKER_READY_TIMEOUT)
+            outcome = worker.run_job(script_path, temp_dir, watch)
+        except WorkerCrashedError:
+            self._retire(worker)
+            worker = self._spawn()
+            raise
+        finally:
+            if not self._closed and worker.should_recycle():
+                print(f"♻️  Recycling worker {worker.process.pid} after {worker.jobs_served} jobs, {worker.rss_mb:.0f}MB RSS")
+                self._retire(worker)
+                worker = self._spawn()
+            self._idle.put(worker)
+
+        outcome.update(read_job_output(temp_dir))
+        return outcome
+
+    def idle_workers(self) -> int:
+        """How many workers are free right now"""
+        return self._idle.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': self.size,
+                'idle': self.idle_workers(),
+                'recycled': self.recycled,
+                'workers': [
+                    {'pid': w.process.pid, 'jobs_served': w.jobs_served, 'rss_mb': round(w.rss_mb, 1)}
+                    for w in self._workers
+                ]
+            }
+
+    def shutdown(self) -> None:
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers = []
+        for worker in workers:
+            worker.stop()
+
+
+_worker_pool = None
+
+
+def start_worker_pool(size: int) -> "WorkerPool":
+    """Start the shared pre-warmed pool used by ``execute_code_with_requirements``"""
+    global _worker_pool
+    if _worker_pool is None and size > 0:
+        _worker_pool = WorkerPool(size)
+    return _worker_pool
+
+
+def stop_worker_pool() -> None:
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.shutdown()
+        _worker_pool = None
+
+
+def get_worker_pool() -> "WorkerPool":
+    return _worker_pool
+
+
+def execute_code_with_requirements(
+    code: str,
+    timeout: int = 30,
+    is_manim: bool = False,
+    on_stage: Callable[[str], None] = None,
+    cancel_event: threading.Event = None,
+    concat_scenes: bool = True,
+    parallel_segments: int = 0,
+    quality: str = DEFAULT_QUALITY,
+    cache_scope: str = None,
+    publish: Callable[[List[str], List[str]], Any] = None,
+    stream_upload: Callable[[str], Any] = None,
+    start_hls: Callable[[str], HlsStream] = None,
+    animated_preview: bool = False,
+    encoder_profile: str = DEFAULT_ENCODER_PROFILE,
+    scene_names: List[str] = None,
+    profile: bool = False
+) -> Dict[str, Any]:
     """
     Main function to execute code (without automatic requirement installation)
     
@@ -353,6 +1690,19 @@ def execute_code_with_requirements(code: str, timeout: int = 30, is_manim: bool
         code (str): The Python code to execute
         timeout (int): Maximum execution time in seconds
         is_manim (bool): Whether this is Manim code that needs special handling
+        on_stage (Callable): Called with each stage the job reports while running
+        cancel_event (threading.Event): Set it to kill the job
+        concat_scenes (bool): Join the videos of multi-scene Manim code into one file
+        parallel_segments (int): Render a single Manim scene as this many segments in parallel
+        quality (str): Manim render tier: draft, low, medium or high
+        cache_scope (str): Conversation whose earlier renders may be reused animation by animation
+        publish (Callable): Called with the rendered video paths and names instead of copying them to the output directory
+        stream_upload (Callable): Starts an incremental upload, so a single-scene video is uploaded while it renders
+        start_hls (Callable): Returns an ``HlsStream`` for a job directory, so a single-scene video is published as HLS while it renders
+        animated_preview (bool): Also make a short animated WebP preview of the main video
+        encoder_profile (str): Encoder settings from ``ENCODER_PROFILES``: fast, balanced, small or hevc
+        scene_names (List[str]): Scenes to render, as ``preflight.check`` found them, so the code is not parsed again
+        profile (bool): Profile the Manim job processes and save the profile like the videos
     
     Returns:
         Dict containing:
@@ -363,9 +1713,47 @@ def execute_code_with_requirements(code: str, timeout: int = 30, is_manim: bool
         - installed_packages (list): Empty since we skip installation
         - failed_packages (list): Empty since we skip installation
         - generated_files (list): List of generated file names (for Manim)
+        - published: What ``publish`` returned, if it was given and there were videos, or the streamed upload
+        - streamed (bool): Whether the video was uploaded while it rendered
+        - last_frame_to_url (float): Seconds from the last encoded animation to the published video
+        - hls (dict): Playlist URL, segment count and time to the first published segment, with ``start_hls``
+        - thumbnails (dict): File names of the ``poster`` and ``animated_preview`` of the main video, when made
+        - published_thumbnails (dict): What ``publish`` returned for each of them
+        - encoder (dict): Encoder settings used, seconds spent encoding and remuxing, and the size of the videos
+        - scenes (list): Each rendered scene with its name, success and execution time
+        - segments (list): Play range, success and execution time of each segment
+        - glyph_cache (dict): Tex/Text glyphs served from the shared cache (hits) or rendered (misses)
+        - animations (dict): Animations reused from the partial movie cache or rendered
+        - timed_out (bool): Whether the job was killed for exceeding ``timeout``
+        - cancelled (bool): Whether the job was killed through ``cancel_event``
+        - time_to_first_frame (float): Seconds from job start to the first rendered frame (for Manim)
+        - peak_rss_mb (float): Peak resident memory of the job process, when known
+        - stages (dict): Seconds spent in each stage of the job
+        - profile (dict): File name, samples and per-process memory of the profile, with ``profile``
+        - published_profile: What ``publish`` returned for the profile
+    
+    Jobs run on the pre-warmed worker pool when one has been started with
+    ``start_worker_pool``, and in a fresh interpreter otherwise.
     """
-    executor = CodeExecutor()
-    return executor.execute_code(code, timeout, is_manim)
+    executor = CodeExecutor(pool=_worker_pool)
+    return executor.execute_code(
+        code,
+        timeout=timeout,
+        is_manim=is_manim,
+        on_stage=on_stage,
+        cancel_event=cancel_event,
+        concat_scenes=concat_scenes,
+        parallel_segments=parallel_segments,
+        quality=quality,
+        cache_scope=cache_scope,
+        publish=publish,
+        stream_upload=stream_upload,
+        start_hls=start_hls,
+        animated_preview=animated_preview,
+        encoder_profile=encoder_profile,
+        scene_names=scene_names,
+        profile=profile
+    )
 
 
 # Example usage and testing
@@ -0,0 +1,13 @@
+from manim import *
+
+
+class LongWaits(Scene):
+    """Few animations and long waits: frames of a static scene"""
+
+    def construct(self):
+        dot = Dot(color=YELLOW)
+        label = Text("Waiting", font_size=32).next_to(dot, DOWN)
+        self.play(FadeIn(dot), FadeIn(label))
+        self.wait(4)
+        self.play(dot.animate.shift(RIGHT * 2))
+        self.wait(4)
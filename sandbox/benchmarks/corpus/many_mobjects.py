@@ -0,0 +1,15 @@
+from manim import *
+
+
+class ManyMobjects(Scene):
+    """Hundreds of small mobjects animated together"""
+
+    def construct(self):
+        dots = VGroup(*[
+            Dot(radius=0.05, color=[BLUE, GREEN, RED, YELLOW][(row + col) % 4])
+            for row in range(16) for col in range(24)
+        ]).arrange_in_grid(rows=16, cols=24, buff=0.2)
+        self.play(FadeIn(dots, lag_ratio=0.01), run_time=2)
+        self.play(dots.animate.rotate(PI / 4).scale(0.8))
+        self.play(*[dot.animate.shift(UP * 0.2) for dot in dots[::2]])
+        self.play(FadeOut(dots))
@@ -0,0 +1,20 @@
+from manim import *
+
+
+class MathTexHeavy(Scene):
+    """A derivation in MathTex: every step is a LaTeX run"""
+
+    def construct(self):
+        steps = [
+            r"(a + b)^2",
+            r"= (a + b)(a + b)",
+            r"= a^2 + ab + ba + b^2",
+            r"= a^2 + 2ab + b^2",
+            r"\int_0^1 x^2 \, dx = \frac{1}{3}",
+            r"\sum_{k=1}^{n} k = \frac{n(n + 1)}{2}",
+        ]
+        equations = VGroup(*[MathTex(step) for step in steps]).arrange(DOWN, aligned_edge=LEFT)
+        for equation in equations:
+            self.play(Write(equation), run_time=0.75)
+        self.play(Indicate(equations[3]))
+        self.wait(0.5)
@@ -0,0 +1,15 @@
+from manim import *
+
+
+class Shapes(Scene):
+    """Basic shapes and transforms: the cheapest kind of scene"""
+
+    def construct(self):
+        circle = Circle().set_fill(BLUE, opacity=0.5)
+        square = Square().set_fill(GREEN, opacity=0.5)
+        triangle = Triangle().set_fill(RED, opacity=0.5)
+        self.play(Create(circle))
+        self.play(Transform(circle, square))
+        self.play(Transform(circle, triangle))
+        self.play(circle.animate.rotate(PI / 2).scale(1.5))
+        self.play(FadeOut(circle))
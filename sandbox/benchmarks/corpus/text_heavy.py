@@ -0,0 +1,17 @@
+from manim import *
+
+
+class TextHeavy(Scene):
+    """Many Pango Text objects: typesetting cost dominates"""
+
+    def construct(self):
+        title = Text("Sorting algorithms", font_size=48).to_edge(UP)
+        self.play(Write(title))
+        names = ["Bubble sort", "Insertion sort", "Merge sort", "Quick sort", "Heap sort", "Radix sort"]
+        lines = VGroup(*[Text(f"{i + 1}. {name}", font_size=28) for i, name in enumerate(names)])
+        lines.arrange(DOWN, aligned_edge=LEFT).next_to(title, DOWN, buff=0.5)
+        for line in lines:
+            self.play(FadeIn(line, shift=RIGHT), run_time=0.5)
+        summary = Text("Average case: O(n log n) for the fastest", font_size=24).to_edge(DOWN)
+        self.play(Write(summary))
+        self.wait(0.5)
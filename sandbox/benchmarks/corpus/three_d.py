@@ -0,0 +1,14 @@
+from manim import *
+
+
+class ThreeD(ThreeDScene):
+    """Surfaces and camera moves through the 3D renderer"""
+
+    def construct(self):
+        axes = ThreeDAxes()
+        sphere = Sphere(radius=1.5, resolution=(16, 16)).set_color(BLUE)
+        self.set_camera_orientation(phi=70 * DEGREES, theta=30 * DEGREES)
+        self.play(Create(axes))
+        self.play(Create(sphere))
+        self.move_camera(theta=120 * DEGREES, run_time=2)
+        self.play(sphere.animate.scale(0.5))
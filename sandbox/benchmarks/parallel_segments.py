@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark segment-parallel rendering of a single long scene
+
+Renders the same scene in one piece and split into 4 and 8 segments, then
+prints the wall-clock time and speedup of each. Needs Manim, and ffmpeg or
+PyAV to join the segments.
+
+    python benchmarks/parallel_segments.py --segments 4 8 --repeat 3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import worker
+from worker import execute_code_with_requirements, start_worker_pool, stop_worker_pool
+
+LONG_SCENE = """
+from manim import *
+
+class LongScene(Scene):
+    def construct(self):
+        shapes = [Circle(), Square(), Triangle(), Star(), RegularPolygon(6), Annulus()]
+        title = Text("Segment benchmark").to_edge(UP)
+        self.play(Write(title))
+        current = shapes[0].set_fill(BLUE, opacity=0.5)
+        self.play(Create(current))
+        for step in range(1, {steps}):
+            target = shapes[step % len(shapes)].copy().set_fill(
+                [BLUE, GREEN, RED, YELLOW][step % 4], opacity=0.5
+            )
+            self.play(Transform(current, target), run_time=1.5)
+            self.play(current.animate.rotate(PI / 3).scale(0.8), run_time=1)
+            self.play(current.animate.scale(1.25), run_time=0.5)
+        self.play(FadeOut(current), FadeOut(title))
+        self.wait(1)
+"""
+
+
+def render(code: str, segments: int, timeout: int) -> float:
+    start = time.time()
+    result = execute_code_with_requirements(code, timeout, is_manim=True, parallel_segments=segments)
+    elapsed = time.time() - start
+    if not result['success']:
+        raise RuntimeError(f"Render with {segments} segments failed: {result['error']}")
+    output_dir = worker.CodeExecutor().output_dir
+    for filename in result['generated_files']:
+        os.remove(os.path.join(output_dir, filename))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--segments", type=int, nargs="+", default=[4, 8], help="Segment counts to compare")
+    parser.add_argument("--steps", type=int, default=12, help="Shape transitions in the scene (3 plays each)")
+    parser.add_argument("--repeat", type=int, default=3, help="Renders per configuration; the median is reported")
+    parser.add_argument("--pool", type=int, default=0, help="Pre-warmed workers to render on (0 uses fresh interpreters)")
+    parser.add_argument("--timeout", type=int, default=900)
+    args = parser.parse_args()
+
+    # Let the run use as many segments as asked for, whatever the machine default
+    worker.MAX_PARALLEL_SEGMENTS = max(args.segments)
+    if args.pool:
+        start_worker_pool(args.pool)
+
+    code = LONG_SCENE.format(steps=args.steps)
+    print(f"=== Segment-parallel rendering ({os.cpu_count()} CPUs, {3 * args.steps + 1} plays) ===")
+    try:
+        timings = {}
+        for segments in [0] + args.segments:
+            runs = [render(code, segments, args.timeout) for _ in range(args.repeat)]
+            timings[segments] = statistics.median(runs)
+            label = "single process" if segments == 0 else f"{segments} segments"
+            print(f"{label:>16}: {timings[segments]:7.2f}s  (runs: {', '.join(f'{r:.2f}' for r in runs)})")
+
+        print("\nSpeedup over a single process:")
+        for segments in args.segments:
+            print(f"{segments:>3} segments: {timings[0] / timings[segments]:.2f}x")
+    finally:
+        if args.pool:
+            stop_worker_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Benchmark rendering over a corpus of representative scenes
+
+Renders the scenes in benchmarks/corpus (simple shapes, Text-heavy,
+MathTex-heavy, long waits, 3D and many-mobject) through
+``execute_code_with_requirements`` ("direct") and through POST /run-manim on
+a server started for the run ("http"), and measures:
+
+- cold latency: each scene's first render, in a fresh interpreter with an
+  empty glyph cache
+- warm latency: the median of --repeat renders on a pre-warmed worker pool
+- throughput: jobs per minute with 1, 2, 4 and 8 renders submitted at once
+- peak memory of the render process and size of the video, per scene
+
+Videos are published to a temporary local store (STORAGE_BACKEND=local),
+never to S3. The partial movie and render caches are off, so every render
+draws every frame. Results are written as JSON with the commit they were
+measured at; --compare reports the change against an earlier result file
+and exits with status 1 on a regression beyond --tolerance.
+
+    python benchmarks/render_suite.py --output results.json
+    python benchmarks/render_suite.py --paths direct --scenes shapes text_heavy --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCHMARKS_DIR, "corpus")
+APP_DIR = os.path.join(BENCHMARKS_DIR, "..", "app")
+sys.path.append(APP_DIR)
+
+# Compared by --compare; for all but jobs_per_minute lower is better
+COMPARED_METRICS = ('cold_seconds', 'warm_seconds', 'peak_rss_mb', 'bytes', 'jobs_per_minute')
+
+
+def load_corpus(names=None):
+    """Code of each corpus scene, by file name without ``.py``"""
+    corpus = {}
+    for filename in sorted(os.listdir(CORPUS_DIR)):
+        name, ext = os.path.splitext(filename)
+        if ext == ".py" and (not names or name in names):
+            with open(os.path.join(CORPUS_DIR, filename)) as f:
+                corpus[name] = f.read()
+    missing = set(names or []) - set(corpus)
+    if missing:
+        raise SystemExit(f"Unknown corpus scene(s): {', '.join(sorted(missing))}")
+    return corpus
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=BENCHMARKS_DIR, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def measurement(result, seconds):
+    """What one render is reported with, from its /run-manim or executor result"""
+    return {
+        'seconds': round(seconds, 3),
+        'success': bool(result.get('success')),
+        'peak_rss_mb': result.get('peak_rss_mb'),
+        'bytes': (result.get('encoder') or {}).get('bytes'),
+        'error': None if result.get('success') else (result.get('error') or '')[:500]
+    }
+
+
+class DirectPath:
+    """Renders through ``execute_code_with_requirements`` in this process"""
+
+    name = "direct"
+
+    def __init__(self, args):
+        self.args = args
+        import storage
+        import worker
+        self.worker = worker
+        self.storage = storage
+
+    @contextmanager
+    def session(self, pool_size):
+        if pool_size:
+            self.worker.start_worker_pool(pool_size)
+        try:
+            yield
+        finally:
+            if pool_size:
+                self.worker.stop_worker_pool()
+
+    def render(self, code):
+        start = time.perf_counter()
+        result = self.worker.execute_code_with_requirements(
+            code, self.args.timeout, is_manim=True, quality=self.args.quality,
+            # Into the local stand-in store, as the server would upload them
+            publish=self.storage.upload_files_to_s3
+        )
+        return measurement(result, time.perf_counter() - start)
+
+
+class HttpPath:
+    """Renders through POST /run-manim on a server started for each session"""
+
+    name = "http"
+
+    def __init__(self, args, env):
+        self.args = args
+        # Its own glyph cache, so cold renders are not helped by the direct path's
+        self.env = dict(env, GLYPH_CACHE_DIR=env['GLYPH_CACHE_DIR'] + "-http")
+        self.url = None
+
+    @contextmanager
+    def session(self, pool_size):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        env = dict(
+            self.env,
+            WORKER_POOL_SIZE=str(pool_size),
+            MAX_CONCURRENT_JOBS=str(max(self.args.concurrency)),
+            MAX_QUEUED_JOBS=str(max(self.args.concurrency) * self.args.batch * 2),
+            TENANT_MAX_QUEUED="0",
+            REJECT_LATE_JOBS="false",
+            LOCAL_STORAGE_URL=f"http://127.0.0.1:{port}/output"
+        )
+        log_path = os.path.join(self.env['LOCAL_STORAGE_DIR'], f"server-{port}.log")
+        with open(log_path, "w") as log:
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                 "--log-level", "warning"],
+                cwd=APP_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+        self.url = f"http://127.0.0.1:{port}"
+        try:
+            self._wait_ready(server, log_path)
+            yield
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    def _wait_ready(self, server, log_path):
+        deadline = time.time() + 120
+        while time.time() < deadline:
+            if server.poll() is not None:
+                with open(log_path) as f:
+                    raise RuntimeError(f"The API server exited during startup:\n{f.read()[-2000:]}")
+            try:
+                with urllib.request.urlopen(self.url + "/", timeout=2):
+                    return
+            except OSError:
+                time.sleep(0.5)
+        raise RuntimeError("The API server did not start within 120s")
+
+    def render(self, code):
+        body = json.dumps({
+            'code': code,
+            'timeout': self.args.timeout,
+            'quality': self.args.quality,
+            'use_cache': False
+        }).encode()
+        request = urllib.request.Request(
+            self.url + "/run-manim", data=body, headers={'Content-Type': 'application/json'}
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.args.timeout + 60) as response:
+                result = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            result = {'success': False, 'error': f"HTTP {e.code}: {e.read().decode(errors='replace')}"}
+        except OSError as e:
+            result = {'success': False, 'error': str(e)}
+        return measurement(result, time.perf_counter() - start)
+
+
+def summarize(renders):
+    ok = [render for render in renders if render['success']]
+    return {
+        'median': round(statistics.median(r['seconds'] for r in ok), 3) if ok else None,
+        'min': round(min(r['seconds'] for r in ok), 3) if ok else None,
+        'max': round(max(r['seconds'] for r in ok), 3) if ok else None,
+        'failures': len(renders) - len(ok)
+    }
+
+
+def run_path(path, corpus, args):
+    """Cold, warm and throughput measurements of one path"""
+    results = {'scenes': {}, 'throughput': {}}
+    print(f"\n=== {path.name}: cold renders (fresh interpreter, empty glyph cache) ===")
+    with path.session(0):
+        for name, code in corpus.items():
+            render = path.render(code)
+            results['scenes'][name] = {
+                'cold_seconds': render['seconds'] if render['success'] else None,
+                'peak_rss_mb': render['peak_rss_mb'],
+                'bytes': render['bytes'],
+                'renders': [render]
+            }
+            status = "ok" if render['success'] else f"FAILED: {render['error'][:200]}"
+            print(f"{name:>16}: {render['seconds']:7.2f}s  {status}")
+
+    pool_size = max(args.concurrency)
+    print(f"\n=== {path.name}: warm renders ({pool_size} pre-warmed workers) ===")
+    with path.session(pool_size):
+        # One render to settle the pool, not measured
+        path.render(next(iter(corpus.values())))
+        for name, code in corpus.items():
+            renders = [path.render(code) for _ in range(args.repeat)]
+            scene = results['scenes'][name]
+            scene['renders'].extend(renders)
+            scene['warm'] = summarize(renders)
+            scene['warm_seconds'] = scene['warm']['median']
+            peaks = [r['peak_rss_mb'] for r in scene['renders'] if r['peak_rss_mb'] is not None]
+            scene['peak_rss_mb'] = max(peaks) if peaks else None
+            sizes = [r['bytes'] for r in scene['renders'] if r['bytes'] is not None]
+            scene['bytes'] = max(sizes) if sizes else None
+            print(f"{name:>16}: {scene['warm_seconds'] or float('nan'):7.2f}s median of {args.repeat}"
+                  f"  peak {scene['peak_rss_mb'] or 0:.0f} MB  {(scene['bytes'] or 0) / 1024:.0f} KB")
+
+        print(f"\n=== {path.name}: throughput ===")
+        codes = list(corpus.values())
+        for concurrency in args.concurrency:
+            batch = [codes[i % len(codes)] for i in range(concurrency * args.batch)]
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                renders = list(executor.map(path.render, batch))
+            elapsed = time.perf_counter() - start
+            succeeded = sum(r['success'] for r in renders)
+            results['throughput'][str(concurrency)] = {
+                'jobs': len(batch),
+                'seconds': round(elapsed, 3),
+                'jobs_per_minute': round(succeeded * 60 / elapsed, 2),
+                'latency': summarize(renders)
+            }
+            print(f"{concurrency:>3} at once: {succeeded * 60 / elapsed:7.2f} jobs/min"
+                  f"  ({succeeded}/{len(batch)} succeeded in {elapsed:.1f}s)")
+    return results
+
+
+def report(results):
+    """Print a table of the results; the app's own logging buries the lines printed while rendering"""
+    for path_name, path in results['paths'].items():
+        print(f"\n=== {path_name} ===")
+        print(f"{'scene':>16} {'cold s':>8} {'warm s':>8} {'peak MB':>8} {'KB':>8}")
+        for name, scene in path['scenes'].items():
+            cells = [scene.get('cold_seconds'), scene.get('warm_seconds'), scene.get('peak_rss_mb')]
+            cells = [f"{cell:8.2f}" if cell is not None else f"{'-':>8}" for cell in cells]
+            size = f"{scene['bytes'] / 1024:8.0f}" if scene.get('bytes') is not None else f"{'-':>8}"
+            print(f"{name:>16} {' '.join(cells)} {size}")
+        for concurrency, level in path['throughput'].items():
+            print(f"{concurrency:>3} at once: {level['jobs_per_minute']:7.2f} jobs/min, median latency "
+                  f"{level['latency']['median'] or float('nan'):.2f}s, {level['latency']['failures']} failed")
+
+
+def compare(current, baseline, tolerance):
+    """Print each metric against ``baseline``; return the regressions beyond ``tolerance``"""
+    regressions = []
+    print(f"\n=== Compared with {baseline['meta'].get('commit')} ===")
+
+    def check(label, metric, now, before):
+        if now is None or before is None or before == 0:
+            return
+        change = (now - before) / before
+        worse = -change if metric == 'jobs_per_minute' else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{label:>40} {metric:>16}: {before:10.2f} -> {now:10.2f}  ({change:+.1%}){flag}")
+        if flag:
+            regressions.append(f"{label} {metric}")
+
+    for path_name, path in current['paths'].items():
+        old_path = baseline['paths'].get(path_name)
+        if old_path is None:
+            continue
+        for name, scene in path['scenes'].items():
+            old_scene = old_path['scenes'].get(name, {})
+            for metric in COMPARED_METRICS:
+                if metric in scene:
+                    check(f"{path_name} {name}", metric, scene[metric], old_scene.get(metric))
+        for concurrency, level in path['throughput'].items():
+            old_level = old_path['throughput'].get(concurrency, {})
+            check(f"{path_name} {concurrency} at once", 'jobs_per_minute', level['jobs_per_minute'],
+                  old_level.get('jobs_per_minute'))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--paths", nargs="+", choices=["direct", "http"], default=["direct", "http"])
+    parser.add_argument("--scenes", nargs="+", help="Corpus scenes to render (default: all)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="Renders at once")
+    parser.add_argument("--batch", type=int, default=2, help="Renders per throughput level, per concurrent slot")
+    parser.add_argument("--repeat", type=int, default=3, help="Warm renders per scene; the median is reported")
+    parser.add_argument("--quality", default="low", help="Render tier (draft, low, medium or high)")
+    parser.add_argument("--timeout", type=int, default=600)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.scenes)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    work_dir = tempfile.mkdtemp(prefix="manim-bench-")
+    # Before the app modules read their settings
+    env = {
+        'STORAGE_BACKEND': 'local',
+        'LOCAL_STORAGE_DIR': os.path.join(work_dir, "store"),
+        'GLYPH_CACHE_DIR': os.path.join(work_dir, "glyphs"),
+        'PARTIAL_MOVIE_CACHE_DIR': '',
+        'ESTIMATOR_HISTORY_FILE': '',
+        'METRICS_ENABLED': 'false',
+    }
+    os.makedirs(env['LOCAL_STORAGE_DIR'])
+    os.environ.update(env)
+    server_env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [APP_DIR, os.environ.get("PYTHONPATH")])))
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'quality': args.quality,
+            'repeat': args.repeat,
+            'concurrency': args.concurrency,
+            'batch': args.batch,
+            'scenes': list(corpus)
+        },
+        'paths': {}
+    }
+    print(f"Benchmarking {len(corpus)} scene(s) at {args.quality} quality on {os.cpu_count()} CPUs, "
+          f"work directory {work_dir}")
+    for path_name in args.paths:
+        path = DirectPath(args) if path_name == "direct" else HttpPath(args, server_env)
+        results['paths'][path_name] = run_path(path, corpus, args)
+
+    report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📊 Results written to {args.output}")
+    else:
+        print(json.dumps(results))
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print(f"\n✅ No regression beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Replay captured /run-manim requests against a running sandbox
+
+Reads a JSONL file of request bodies, either as captured by a server with
+REQUEST_CAPTURE_FILE set ({"time": ..., "body": {...}} per line) or as plain
+/run-manim bodies, and sends them open-loop: each request goes out at its
+scheduled time whether or not earlier ones have been answered, as users'
+requests do. With --rate, arrivals are Poisson (or evenly spaced with
+--arrivals uniform) at that many requests per second; without it, captured
+requests keep their recorded spacing, sped up by --speed.
+
+Reports latency percentiles, the share of requests that succeeded, failed,
+timed out, were rejected (429 and 503) or errored, and how long renders
+waited for a slot (``stages.queue_wait`` of each response).
+
+    python benchmarks/replay.py captured.jsonl --url http://localhost:8000 --rate 0.5 --count 100
+    python benchmarks/replay.py captured.jsonl --speed 4 --output replay.json
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Outcomes a replayed request is counted under
+OUTCOMES = ('success', 'failure', 'timeout', 'rejected', 'error')
+
+
+def load_requests(path):
+    """Request bodies and their capture times (None for plain bodies), in file order"""
+    requests = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if 'body' in record:
+                requests.append((record.get('time'), record['body']))
+            elif 'code' in record:
+                requests.append((None, record))
+            else:
+                raise SystemExit(f"{path}:{number}: expected a request body or a captured request")
+    if not requests:
+        raise SystemExit(f"{path} has no requests")
+    return requests
+
+
+def schedule(requests, args):
+    """Send time of each request in seconds from the start, and its body"""
+    count = args.count or len(requests)
+    bodies = [requests[i % len(requests)][1] for i in range(count)]
+    if args.rate:
+        rng = random.Random(args.seed)
+        offsets, offset = [], 0.0
+        for _ in bodies:
+            offsets.append(offset)
+            offset += rng.expovariate(args.rate) if args.arrivals == "poisson" else 1 / args.rate
+        return list(zip(offsets, bodies))
+
+    times = [captured for captured, _ in requests]
+    if None in times:
+        raise SystemExit("Requests without capture times need --rate")
+    # Later passes over the file follow on from the end of the one before
+    span = times[-1] - times[0]
+    gap = span / max(1, len(times) - 1)
+    offsets = [
+        ((i // len(times)) * (span + gap) + times[i % len(times)] - times[0]) / args.speed
+        for i in range(count)
+    ]
+    return list(zip(offsets, bodies))
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(p):
+        # Linear interpolation between the closest ranks
+        position = (len(values) - 1) * p / 100
+        low = int(position)
+        high = min(low + 1, len(values) - 1)
+        return round(values[low] + (values[high] - values[low]) * (position - low), 3)
+
+    return {
+        'p50': at(50), 'p90': at(90), 'p95': at(95), 'p99': at(99),
+        'max': round(values[-1], 3), 'mean': round(sum(values) / len(values), 3)
+    }
+
+
+class Replay:
+    """Sends the scheduled requests, each on its own thread, and collects the results"""
+
+    def __init__(self, url, plan, args):
+        self.url = url.rstrip("/") + "/run-manim"
+        self.plan = plan
+        self.args = args
+        self.results = []
+        self._lock = threading.Lock()
+
+    def run(self):
+        threads = []
+        start = time.monotonic()
+        for index, (offset, body) in enumerate(self.plan):
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            thread = threading.Thread(target=self._send, args=(index, offset, body, start), daemon=True)
+            thread.start()
+            threads.append(thread)
+            if (index + 1) % 10 == 0:
+                with self._lock:
+                    done = len(self.results)
+                print(f"  {index + 1}/{len(self.plan)} sent, {done} answered")
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - start
+
+    def _send(self, index, offset, body, start):
+        body = dict(body)
+        if self.args.no_cache:
+            body['use_cache'] = False
+        request = urllib.request.Request(
+            self.url, data=json.dumps(body).encode(), headers={'Content-Type': 'application/json'}
+        )
+        sent = time.monotonic()
+        record = {
+            'index': index,
+            'scheduled': round(offset, 3),
+            # How far behind schedule the request went out; large values mean
+            # this machine, not the server, limited the arrival rate
+            'send_lag': round(sent - start - offset, 3),
+            'status': None,
+            'queue_wait': None
+        }
+        try:
+            with urllib.request.urlopen(request, timeout=self.args.timeout) as response:
+                result = json.loads(response.read())
+            record['status'] = response.status
+            record['queue_wait'] = (result.get('stages') or {}).get('queue_wait')
+            if result.get('timed_out'):
+                record['outcome'] = 'timeout'
+            else:
+                record['outcome'] = 'success' if result.get('success') else 'failure'
+            if not result.get('success'):
+                record['error'] = (result.get('error') or '')[:300]
+        except urllib.error.HTTPError as e:
+            record['status'] = e.code
+            record['outcome'] = 'rejected' if e.code in (429, 503) else 'error'
+            record['error'] = e.read().decode(errors='replace')[:300]
+        except TimeoutError:
+            record['outcome'] = 'timeout'
+            record['error'] = f"No response within {self.args.timeout}s"
+        except (OSError, ValueError) as e:
+            if isinstance(getattr(e, 'reason', None), TimeoutError):
+                record['outcome'] = 'timeout'
+            else:
+                record['outcome'] = 'error'
+            record['error'] = str(e)
+        record['latency'] = round(time.monotonic() - sent, 3)
+        with self._lock:
+            self.results.append(record)
+
+
+def summarize(results, elapsed, plan):
+    counts = {outcome: sum(r['outcome'] == outcome for r in results) for outcome in OUTCOMES}
+    total = len(results)
+    return {
+        'requests': total,
+        'seconds': round(elapsed, 3),
+        'offered_rate': round((len(plan) - 1) / plan[-1][0], 3) if plan[-1][0] > 0 else None,
+        'completed_rate': round(counts['success'] / elapsed, 3) if elapsed > 0 else None,
+        'outcomes': counts,
+        'rates': {outcome: round(count / total, 4) for outcome, count in counts.items()},
+        'latency': percentiles([r['latency'] for r in results]),
+        'success_latency': percentiles([r['latency'] for r in results if r['outcome'] == 'success']),
+        'queue_wait': percentiles([r['queue_wait'] for r in results if r['queue_wait'] is not None]),
+        'send_lag': percentiles([r['send_lag'] for r in results])
+    }
+
+
+def report(summary):
+    print(f"\n=== {summary['requests']} requests in {summary['seconds']:.1f}s ===")
+    if summary['offered_rate'] is not None:
+        print(f"Offered {summary['offered_rate']:.3f} req/s, completed {summary['completed_rate']:.3f} renders/s")
+    for outcome in OUTCOMES:
+        print(f"{outcome:>10}: {summary['outcomes'][outcome]:5d}  ({summary['rates'][outcome]:.1%})")
+    print(f"\n{'seconds':>16} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name in ('latency', 'success_latency', 'queue_wait', 'send_lag'):
+        values = summary[name]
+        if values is None:
+            print(f"{name:>16} {'-':>8}")
+            continue
+        print(f"{name:>16} " + " ".join(f"{values[p]:8.2f}" for p in ('p50', 'p90', 'p95', 'p99', 'max')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("requests", help="JSONL file of captured requests or /run-manim bodies")
+    parser.add_argument("--url", default="http://localhost:8000", help="Sandbox to replay against")
+    parser.add_argument("--rate", type=float, help="Requests per second; default: the captured spacing")
+    parser.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--speed", type=float, default=1.0, help="Speed-up of the captured spacing")
+    parser.add_argument("--count", type=int, help="Requests to send, cycling through the file (default: each once)")
+    parser.add_argument("--timeout", type=float, default=900, help="Seconds to wait for each response")
+    parser.add_argument("--no-cache", action="store_true", help="Send use_cache false so no request is answered from the render cache")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for Poisson arrivals")
+    parser.add_argument("--output", help="Write the summary and every request's result to this JSON file")
+    args = parser.parse_args()
+    if (args.rate is not None and args.rate <= 0) or args.speed <= 0:
+        parser.error("--rate and --speed must be positive")
+
+    plan = schedule(load_requests(args.requests), args)
+    print(f"Replaying {len(plan)} requests over {plan[-1][0]:.0f}s against {args.url}")
+    replay = Replay(args.url, plan, args)
+    elapsed = replay.run()
+    results = sorted(replay.results, key=lambda r: r['index'])
+    summary = summarize(results, elapsed, plan)
+    report(summary)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                'meta': {
+                    'url': args.url,
+                    'file': args.requests,
+                    'rate': args.rate,
+                    'arrivals': args.arrivals if args.rate else 'captured',
+                    'speed': args.speed,
+                    'time': time.strftime("%Y-%m-%dT%H:%M:%S%z")
+                },
+                'summary': summary,
+                'requests': results
+            }, f, indent=2)
+        print(f"\n📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the render cache and its normalized cache keys
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+import ast
+
+import pytest
+
+import cache
+from cache import RenderCache, code_digest, normalize_code, render_cache_key
+
+SETTINGS = {'quality': 'medium', 'concat_scenes': True}
+
+
+def test_key_ignores_comments_blank_lines_and_line_breaks():
+    code = "from manim import *\nclass A(Scene):\n    def construct(self):\n        self.play(Create(Circle()))\n"
+    reformatted = (
+        "# A circle\nfrom manim import *\n\n\nclass A(Scene):\n"
+        "    def construct(self):  # draw it\n        self.play(\n            Create(Circle())\n        )\n"
+    )
+    assert normalize_code(code) == normalize_code(reformatted)
+    assert render_cache_key(code, SETTINGS) == render_cache_key(reformatted, SETTINGS)
+
+
+def test_key_changes_with_code_and_settings():
+    code = "x = 1\n"
+    assert render_cache_key(code, SETTINGS) != render_cache_key("x = 2\n", SETTINGS)
+    assert render_cache_key(code, SETTINGS) != render_cache_key(code, dict(SETTINGS, quality='high'))
+    # Setting order does not matter
+    assert render_cache_key(code, {'b': 1, 'a': 2}) == render_cache_key(code, {'a': 2, 'b': 1})
+
+
+def test_code_that_does_not_parse_is_used_verbatim():
+    assert normalize_code("  def broken(:\n") == "def broken(:"
+
+
+def test_key_from_a_digest_skips_parsing(monkeypatch):
+    code = "from manim import *\nclass A(Scene):\n    pass\n"
+    key = render_cache_key(code, SETTINGS)
+    digest = code_digest(code, ast.parse(code))
+
+    def parse(*args, **kwargs):
+        raise AssertionError("parsed the code again")
+    monkeypatch.setattr(cache.ast, "parse", parse)
+    assert render_cache_key(code, SETTINGS, digest) == key
+
+
+def test_hits_misses_and_copies():
+    render_cache = RenderCache(max_entries=10, ttl_seconds=60)
+    assert render_cache.get('k') is None
+    render_cache.put('k', {'video_url': 'a', 'scenes': []})
+    value = render_cache.get('k')
+    assert value == {'video_url': 'a', 'scenes': []}
+    # Callers may change what they get without touching the cache
+    value['scenes'].append('changed')
+    assert render_cache.get('k')['scenes'] == []
+    stats = render_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 1, 1)
+    assert stats['hit_rate'] == pytest.approx(2 / 3)
+
+
+def test_evicts_least_recently_used():
+    render_cache = RenderCache(max_entries=2, ttl_seconds=60)
+    render_cache.put('a', {'n': 1})
+    render_cache.put('b', {'n': 2})
+    render_cache.get('a')
+    render_cache.put('c', {'n': 3})
+    assert render_cache.get('b') is None
+    assert render_cache.get('a') == {'n': 1}
+    assert render_cache.get('c') == {'n': 3}
+    assert render_cache.stats()['evictions'] == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    render_cache = RenderCache(max_entries=10, ttl_seconds=60)
+    render_cache.put('k', {'n': 1})
+    now[0] += 59
+    assert render_cache.get('k') == {'n': 1}
+    now[0] += 2
+    assert render_cache.get('k') is None
+    assert render_cache.stats()['entries'] == 0
+
+
+def test_disabled_with_no_entries():
+    render_cache = RenderCache(max_entries=0)
+    assert not render_cache.enabled
+    render_cache.put('k', {'n': 1})
+    assert render_cache.get('k') is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for the render time estimator and its calibration
+"""
+
+import os
+import random
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+import pytest
+
+from estimator import FEATURES, PRIOR_COEFFICIENTS, RenderEstimator
+
+FEATURES_2D = {'scenes': 1, 'plays': 4, 'animation_seconds': 6.0, 'animation_seconds_3d': 0.0, 'tex': 2, 'text': 1}
+
+
+def samples(coefficients, count, seed=0):
+    """Feature vectors without 3D frames, and the render times ``coefficients`` give for them"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        vector = {
+            'overhead': 1.0,
+            'frames_2d': rng.uniform(10, 500),
+            'frames_3d': 0.0,
+            'plays': rng.randint(1, 30),
+            'tex': rng.randint(0, 5),
+            'text': rng.randint(0, 10),
+        }
+        yield vector, sum(coefficients[name] * vector[name] for name in FEATURES)
+
+
+def test_estimates_from_the_prior_until_calibrated():
+    estimator = RenderEstimator(history_file="", min_samples=5)
+    estimate = estimator.estimate(FEATURES_2D, 'low')
+    assert not estimate['calibrated']
+    vector = estimate['vector']
+    assert estimate['seconds'] == pytest.approx(sum(PRIOR_COEFFICIENTS[name] * vector[name] for name in FEATURES), abs=1e-3)
+    # Splitting the frames between processes shortens the render
+    assert estimator.estimate(FEATURES_2D, 'low', parallel=2)['seconds'] < estimate['seconds']
+
+
+def test_refit_recovers_the_coefficients():
+    pytest.importorskip("scipy.optimize")
+    truth = {'overhead': 3.0, 'frames_2d': 0.01, 'frames_3d': 0.5, 'plays': 0.2, 'tex': 1.5, 'text': 0.0}
+    estimator = RenderEstimator(history_file="", min_samples=20)
+    for i, (vector, seconds) in enumerate(samples(truth, 40)):
+        estimator.record(vector, seconds)
+        assert estimator.calibrated == (i + 1 >= 20)
+    for name in ('overhead', 'frames_2d', 'plays', 'tex', 'text'):
+        assert estimator.coefficients[name] == pytest.approx(truth[name], abs=1e-6), name
+    # No sample had 3D frames, so that coefficient keeps its prior
+    assert estimator.coefficients['frames_3d'] == PRIOR_COEFFICIENTS['frames_3d']
+
+
+def test_refit_never_goes_negative():
+    pytest.importorskip("scipy.optimize")
+    # Text that makes renders faster cannot be fitted without a negative coefficient
+    truth = {'overhead': 5.0, 'frames_2d': 0.02, 'frames_3d': 0.0, 'plays': 0.1, 'tex': 1.0, 'text': -0.3}
+    estimator = RenderEstimator(history_file="", min_samples=10)
+    for vector, seconds in samples(truth, 30, seed=1):
+        estimator.record(vector, seconds)
+    assert all(value >= 0 for value in estimator.coefficients.values())
+
+
+def test_without_scipy_the_prior_is_scaled(monkeypatch):
+    # A None entry makes the import fail
+    monkeypatch.setitem(sys.modules, "scipy.optimize", None)
+    estimator = RenderEstimator(history_file="", min_samples=3)
+    doubled = {name: 2 * value for name, value in PRIOR_COEFFICIENTS.items()}
+    for vector, seconds in samples(doubled, 3):
+        estimator.record(vector, seconds)
+    assert estimator.calibrated
+    for name in FEATURES:
+        assert estimator.coefficients[name] == pytest.approx(doubled[name])
+
+
+def test_calibration_survives_a_restart(tmp_path):
+    history_file = str(tmp_path / "timings.jsonl")
+    estimator = RenderEstimator(history_file=history_file, min_samples=5)
+    for vector, seconds in samples(PRIOR_COEFFICIENTS, 5):
+        estimator.record(vector, seconds)
+    with open(history_file, "a") as f:
+        f.write('{"vector": {"overhead"')  # Cut off by a crash
+    restarted = RenderEstimator(history_file=history_file, min_samples=5)
+    assert restarted.calibrated
+    assert restarted.stats()['samples'] == 5
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -141,6 +141,25 @@ print("This won't be reached")
     print(f"Execution time: {result['execution_time']:.2f}s")
     print()
 
+def test_timeout():
+    """Test that a job running past its timeout is killed with partial output"""
+    print("=== Testing Timeout ===")
+    
+    code = """
+import time
+print("Started long-running job")
+time.sleep(30)
+print("This won't be reached")
+"""
+    
+    result = execute_code_with_requirements(code, timeout=2)
+    print(f"Success: {result['success']}")
+    print(f"Timed out: {result['timed_out']}")
+    print(f"Output:\n{result['output']}")
+    print(f"Errors:\n{result['error']}")
+    print(f"Execution time: {result['execution_time']:.2f}s")
+    print()
+
 def test_manim_code():
     """Test Manim animation code"""
     print("=== Testing Manim Code ===")
@@ -189,6 +208,7 @@ if __name__ == "__main__":
     test_package_installation()
     test_data_science_code()
     test_error_handling()
+    test_timeout()
     test_manim_code()
     
     print("All tests completed!") 
\ No newline at end of file
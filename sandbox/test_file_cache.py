@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared glyph and partial movie caches
+"""
+
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+import pytest
+
+import file_cache
+from file_cache import SharedFileCache, store
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out waiting"
+        time.sleep(0.01)
+
+
+def add_file(tmp_path, cache_dir, name, size):
+    source = tmp_path / f"source-{name}"
+    source.write_bytes(b"x" * size)
+    store(cache_dir, name, str(source))
+
+
+def test_glyph_cache_stats_count_without_walking(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "glyphs")
+    add_file(tmp_path, cache_dir, "a.svg", 1024)
+    add_file(tmp_path, cache_dir, "b.svg", 1024)
+    glyph_cache = SharedFileCache(cache_dir, max_mb=1)
+    # Files left by earlier runs are counted in the background
+    wait_until(lambda: glyph_cache.stats()['entries'] == 2)
+
+    def walk(*args):
+        raise AssertionError("stats walked the cache directory")
+    monkeypatch.setattr(file_cache.os, "walk", walk)
+    stats = glyph_cache.stats()
+    assert stats['size_mb'] == round(2048 / (1024 * 1024), 2)
+    monkeypatch.undo()
+
+    add_file(tmp_path, cache_dir, "c.svg", 1024)
+    glyph_cache.record(hits=2, misses=1)
+    stats = glyph_cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses']) == (3, 2, 1)
+
+
+def test_sweep_evicts_least_recently_used_and_updates_totals(tmp_path):
+    cache_dir = str(tmp_path / "glyphs")
+    for i, name in enumerate(["old.svg", "new.svg"]):
+        add_file(tmp_path, cache_dir, name, 600 * 1024)
+        os.utime(os.path.join(cache_dir, name), (1000 + i, 1000 + i))
+    # The first sweep runs as the cache starts
+    glyph_cache = SharedFileCache(cache_dir, max_mb=1)
+    wait_until(lambda: glyph_cache.stats()['evictions'] == 1)
+    assert sorted(os.listdir(cache_dir)) == [".sweep.lock", "new.svg"]
+    assert glyph_cache.stats()['entries'] == 1
+
+
+def test_partial_movie_cache_counts_every_scope(tmp_path, monkeypatch):
+    root = str(tmp_path / "partial-movies")
+    monkeypatch.setattr(file_cache, "PARTIAL_MOVIE_CACHE_DIR", root)
+    for conversation in ("c1", "c2", None):
+        scope_dir = file_cache.partial_movie_scope_dir(conversation, "medium", "balanced")
+        add_file(tmp_path, scope_dir, "0123abcd.mp4", 1024)
+    partial_movie_cache = SharedFileCache(root, max_mb=10)
+    wait_until(lambda: partial_movie_cache.stats()['entries'] == 3)
+    partial_movie_cache.record(hits=0, misses=3)
+
+    def walk(*args):
+        raise AssertionError("stats walked the cache directory")
+    monkeypatch.setattr(file_cache.os, "walk", walk)
+    stats = partial_movie_cache.stats()
+    assert (stats['entries'], stats['misses']) == (3, 3)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for cutting long job output down to its head and tail
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+import pytest
+
+import worker
+from worker import read_job_output, read_log
+
+
+def write_lines(path, count):
+    """Write ``count`` numbered lines of 10 bytes each and return the file size"""
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(f"line {i:04d}\n")
+    return os.path.getsize(path)
+
+
+def test_small_log_is_read_whole(tmp_path):
+    path = str(tmp_path / "stdout.log")
+    size = write_lines(path, 10)
+    text, read_size = read_log(path, head_bytes=100, tail_bytes=100)
+    assert read_size == size == 100
+    assert text == "".join(f"line {i:04d}\n" for i in range(10))
+
+
+def test_long_log_keeps_head_and_tail_at_line_ends(tmp_path):
+    path = str(tmp_path / "stdout.log")
+    size = write_lines(path, 1000)
+    # Neither limit falls on a line end
+    text, read_size = read_log(path, head_bytes=35, tail_bytes=25)
+    assert read_size == size == 10000
+    lines = text.splitlines()
+    assert lines[:3] == ["line 0000", "line 0001", "line 0002"]
+    assert lines[-2:] == ["line 0998", "line 0999"]
+    # Everything between is accounted for by the marker
+    omitted = size - 3 * 10 - 2 * 10
+    assert lines[3] == f"[... {omitted} bytes of output left out ...]"
+    assert len(lines) == 6
+
+
+def test_cut_through_multibyte_characters_does_not_fail(tmp_path):
+    path = tmp_path / "stderr.log"
+    path.write_bytes("é".encode() * 1000)
+    text, size = read_log(str(path), head_bytes=11, tail_bytes=11)
+    assert size == 2000
+    assert "bytes of output left out" in text
+
+
+def test_missing_log_is_empty(tmp_path):
+    assert read_log(str(tmp_path / "missing.log"), 10, 10) == ('', 0)
+
+
+def test_job_output_reports_sizes_and_truncation(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker, "JOB_LOG_HEAD_KB", 1)
+    monkeypatch.setattr(worker, "JOB_LOG_TAIL_KB", 1)
+    write_lines(str(tmp_path / "stdout.log"), 1000)
+    write_lines(str(tmp_path / "stderr.log"), 5)
+    output = read_job_output(str(tmp_path))
+    assert (output['stdout_bytes'], output['stderr_bytes']) == (10000, 50)
+    assert output['log_truncated']
+    assert len(output['stdout']) < 2100
+    assert output['stderr'].count("\n") == 5
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
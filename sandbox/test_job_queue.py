@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared job queue: leases, retries, cancellation and follow-ups
+"""
+
+import asyncio
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, RemoteJobManager, SQLiteJobQueue, open_job_queue
+from scheduler import SchedulerFullError
+
+PAYLOAD = {'code': "print('hi')"}
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def queue(request, monkeypatch):
+    """An empty queue in SQLite memory, or in an in-process fake Redis"""
+    if request.param == 'sqlite':
+        return open_job_queue("sqlite://")
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        job_queue.redis.Redis, "from_url",
+        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs)
+    )
+    return open_job_queue("redis://localhost:6379/0")
+
+
+def expire_lease(queue, job_id, worker_id):
+    """Lease ``job_id`` to ``worker_id`` for an instant and find it expired"""
+    leased = queue.lease(worker_id, lease_seconds=0.01)
+    assert leased['job_id'] == job_id
+    time.sleep(0.05)
+    assert queue.requeue_expired() == 1
+
+
+def test_expired_lease_is_requeued(queue):
+    job_id = queue.enqueue(PAYLOAD)
+    expire_lease(queue, job_id, 'w1')
+    record = queue.get(job_id)
+    assert (record['status'], record['worker']) == ('queued', None)
+    leased = queue.lease('w2')
+    assert (leased['job_id'], leased['attempts'], leased['payload']) == (job_id, 2, PAYLOAD)
+
+
+def test_job_fails_after_max_attempts(queue):
+    queue.max_attempts = 2
+    job_id = queue.enqueue(PAYLOAD)
+    expire_lease(queue, job_id, 'w1')
+    expire_lease(queue, job_id, 'w2')
+    record = queue.get(job_id)
+    assert record['status'] == 'failed'
+    assert "abandoned by 2 worker(s)" in record['result']['error']
+    assert queue.lease('w3') is None
+
+
+def test_worker_that_lost_its_lease_cannot_complete(queue):
+    job_id = queue.enqueue(PAYLOAD)
+    expire_lease(queue, job_id, 'w1')
+    queue.lease('w2')
+    assert not queue.heartbeat(job_id, 'w1')
+    assert not queue.complete(job_id, 'w1', {'success': True, 'output': 'stale'})
+    assert queue.get(job_id)['status'] == 'queued'
+    assert queue.complete(job_id, 'w2', {'success': True, 'output': 'fresh'})
+    record = queue.get(job_id)
+    assert (record['status'], record['result']['output']) == ('done', 'fresh')
+
+
+def test_cancel_queued_job(queue):
+    job_id = queue.enqueue(PAYLOAD)
+    assert queue.cancel(job_id)['status'] == 'cancelled'
+    assert queue.get(job_id)['result']['cancelled']
+    assert queue.lease('w1') is None
+    assert queue.stats()['queued'] == 0
+
+
+def test_cancel_running_job(queue):
+    job_id = queue.enqueue(PAYLOAD)
+    queue.lease('w1')
+    # The worker stops the job once its heartbeat says so
+    assert queue.cancel(job_id)['status'] == 'queued'
+    assert not queue.heartbeat(job_id, 'w1')
+    assert queue.complete(job_id, 'w1', {'success': False, 'cancelled': True})
+    assert queue.get(job_id)['status'] == 'cancelled'
+
+
+def test_followup_is_released_when_its_parent_is_done(queue):
+    parent_id = queue.enqueue(PAYLOAD)
+    followup_id = queue.enqueue(PAYLOAD, parent_id=parent_id)
+    assert queue.lease('w1')['job_id'] == parent_id
+    assert queue.lease('w2') is None
+    assert queue.complete(parent_id, 'w1', {'success': True})
+    assert queue.get(parent_id)['result']['followup_job_id'] == followup_id
+    assert queue.lease('w2')['job_id'] == followup_id
+
+
+def test_followup_is_cancelled_when_its_parent_fails(queue):
+    parent_id = queue.enqueue(PAYLOAD)
+    followup_id = queue.enqueue(PAYLOAD, parent_id=parent_id)
+    queue.lease('w1')
+    queue.complete(parent_id, 'w1', {'success': False, 'error': 'boom'})
+    record = queue.get(followup_id)
+    assert record['status'] == 'cancelled'
+    assert parent_id in record['result']['error']
+    assert queue.lease('w2') is None
+
+
+def test_followup_of_a_finished_or_missing_parent(queue):
+    parent_id = queue.enqueue(PAYLOAD)
+    queue.lease('w1')
+    queue.complete(parent_id, 'w1', {'success': True})
+    # A parent that is already done releases it at once
+    followup_id = queue.enqueue(PAYLOAD, parent_id=parent_id)
+    assert queue.lease('w2')['job_id'] == followup_id
+
+    orphan_id = queue.enqueue(PAYLOAD, parent_id='no-such-job')
+    record = queue.get(orphan_id)
+    assert record['status'] == 'cancelled'
+    assert 'no longer on the queue' in record['result']['error']
+
+
+def test_max_queued_counts_only_waiting_jobs(queue):
+    first = queue.enqueue(PAYLOAD, max_queued=2)
+    second = queue.enqueue(PAYLOAD, dedup_key='same', max_queued=2)
+    with pytest.raises(SchedulerFullError):
+        queue.enqueue(PAYLOAD, max_queued=2)
+    # Joining a job already on the queue takes no room
+    assert queue.enqueue(PAYLOAD, dedup_key='same', max_queued=2) == second
+
+    queue.cancel(first)
+    third = queue.enqueue(PAYLOAD, max_queued=2)
+    # A leased job is no longer waiting
+    queue.lease('w1')
+    queue.enqueue(PAYLOAD, max_queued=2)
+    assert queue.stats()['queued'] == 2
+    assert third != second
+
+
+def test_remote_job_manager_enforces_max_queued(queue):
+    job_manager = RemoteJobManager(queue, max_queued=1)
+    job_manager.submit(PAYLOAD)
+    with pytest.raises(SchedulerFullError):
+        job_manager.submit(dict(PAYLOAD, code="print('other')"))
+
+
+
+def test_backend_missing_a_method_cannot_be_created():
+    class Partial(JobQueue):
+        def enqueue(self, payload, **kwargs):
+            return 'id'
+    # Fails when the backend is created, not halfway through a job
+    with pytest.raises(TypeError):
+        Partial()
+
+
+
+def test_remote_followup_keeps_its_parents_tenant(queue):
+    job_manager = RemoteJobManager(queue)
+    parent = job_manager.submit(PAYLOAD, tenant='u1')
+    followup = job_manager.submit_followup(parent, PAYLOAD)
+    assert queue.get(followup.id)['tenant'] == 'u1'
+
+    # A parent pruned from the queue cancels its follow-up instead of failing
+    gone = job_manager.get(parent.id)
+    gone.id = 'no-such-job'
+    orphan = job_manager.submit_followup(gone, PAYLOAD)
+    assert orphan.status == 'cancelled'
+
+
+class OffLoopQueue(SQLiteJobQueue):
+    """A queue that fails any read made on the event loop, where it would stall every request"""
+
+    def get(self, job_id):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return super().get(job_id)
+        raise AssertionError("job queue read on the event loop")
+
+
+def test_job_endpoints_read_the_queue_off_the_event_loop(monkeypatch):
+    pytest.importorskip("dotenv")
+    from fastapi.testclient import TestClient
+    import main
+
+    queue = OffLoopQueue()
+    monkeypatch.setattr(main, "job_manager", RemoteJobManager(queue))
+    client = TestClient(main.app)
+    code = "from manim import *\nclass A(Scene):\n    def construct(self):\n        self.wait()\n"
+    response = client.post("/jobs", json={'code': code, 'use_cache': False})
+    assert response.status_code == 202, response.text
+    job_id = response.json()['job_id']
+    assert response.json()['status'] == 'queued'
+    assert client.get(f"/jobs/{job_id}").json()['status'] == 'queued'
+    assert client.post(f"/jobs/{job_id}/cancel").json()['status'] == 'cancelled'
+    events = client.get(f"/jobs/{job_id}/events").text
+    assert events.count("data: ") == 1 and '"cancelled"' in events
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the pre-flight checks of Manim code
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+import pytest
+
+import preflight
+from cache import render_cache_key
+
+CODE = """from manim import *
+
+class Hello(Scene):
+    def construct(self):
+        self.play(Create(Circel()), run_time=2)
+        self.wait()
+"""
+
+
+def test_manim_names_are_learned_without_a_worker_pool():
+    pytest.importorskip("manim")
+    names = preflight.learn_manim_names()
+    assert 'Circle' in names and 'Scene' in names
+    assert preflight.manim_names() is names
+
+    report = preflight.check(CODE, names)
+    assert not report['ok']
+    assert [(d['code'], d['line']) for d in report['diagnostics']] == [('undefined-name', 5)]
+    assert preflight.check(CODE.replace("Circel", "Circle"), names)['ok']
+
+
+def test_names_are_not_checked_without_manim_names():
+    report = preflight.check(CODE)
+    assert report['ok']
+    assert report['scenes'] == ['Hello']
+    assert report['run_time'] == {'Hello': 3.0}
+
+
+def test_report_carries_the_digest_of_the_parsed_code():
+    settings = {'quality': 'medium'}
+    report = preflight.check(CODE)
+    assert render_cache_key(CODE, settings, report['code_digest']) == render_cache_key(CODE, settings)
+    assert preflight.check("class Broken(:\n")['code_digest'] is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
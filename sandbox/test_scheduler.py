@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Tests for the bounded render scheduler and the 429/503 answers built on it
+"""
+
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+import pytest
+
+from scheduler import RenderScheduler, SchedulerFullError, TenantLimitError
+
+
+class Gate:
+    """Jobs that block until released, counting how many run at once"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.running = 0
+        self.peak = 0
+        self.started = []
+        self._lock = threading.Lock()
+
+    def job(self, name=None):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.started.append(name)
+        self.release.wait(10)
+        with self._lock:
+            self.running -= 1
+        return name
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out waiting"
+        time.sleep(0.01)
+
+
+def test_runs_at_most_max_workers_at_once():
+    scheduler = RenderScheduler(max_workers=2, max_queue=10)
+    gate = Gate()
+    try:
+        futures = [scheduler.submit(gate.job, i) for i in range(6)]
+        wait_until(lambda: gate.running == 2)
+        time.sleep(0.1)
+        assert gate.running == 2
+        assert scheduler.stats()['running'] == 2
+        assert scheduler.stats()['queued'] == 4
+        gate.release.set()
+        assert sorted(future.result(5) for future in futures) == list(range(6))
+        assert gate.peak == 2
+    finally:
+        gate.release.set()
+        scheduler.shutdown()
+
+
+def test_rejects_once_slots_and_queue_are_full():
+    scheduler = RenderScheduler(max_workers=1, max_queue=2)
+    gate = Gate()
+    try:
+        scheduler.submit(gate.job)
+        wait_until(lambda: gate.running == 1)
+        scheduler.submit(gate.job)
+        scheduler.submit(gate.job)
+        with pytest.raises(SchedulerFullError):
+            scheduler.submit(gate.job)
+        # Follow-up work of admitted jobs is never dropped
+        followup = scheduler.submit_followup(gate.job, 'followup')
+        gate.release.set()
+        assert followup.result(5) == 'followup'
+    finally:
+        gate.release.set()
+        scheduler.shutdown()
+
+
+def test_tenant_queue_limit():
+    scheduler = RenderScheduler(max_workers=1, max_queue=10, tenant_max_queued=1)
+    gate = Gate()
+    try:
+        scheduler.submit(gate.job, tenant='a')
+        wait_until(lambda: gate.running == 1)
+        scheduler.submit(gate.job, tenant='a')
+        with pytest.raises(TenantLimitError):
+            scheduler.submit(gate.job, tenant='a')
+        # Other tenants still get in
+        scheduler.submit(gate.job, tenant='b')
+    finally:
+        gate.release.set()
+        scheduler.shutdown()
+
+
+def test_rejects_tenant_weights_that_are_not_positive():
+    with pytest.raises(ValueError, match="u1=0"):
+        RenderScheduler(max_workers=1, max_queue=1, tenant_weights={'u1': 0.0, 'u2': 2.0})
+    with pytest.raises(ValueError, match="u2=-1"):
+        RenderScheduler(max_workers=1, max_queue=1, tenant_weights={'u2': -1.0})
+
+
+def test_shutdown_cancels_queued_jobs():
+    scheduler = RenderScheduler(max_workers=1, max_queue=5)
+    gate = Gate()
+    scheduler.submit(gate.job)
+    wait_until(lambda: gate.running == 1)
+    queued = scheduler.submit(gate.job)
+    scheduler.shutdown()
+    assert queued.cancelled()
+    gate.release.set()
+    with pytest.raises(RuntimeError):
+        scheduler.submit(gate.job)
+
+
+def run_in_order(scheduler, jobs):
+    """Names in the order a one-slot ``scheduler`` starts ``jobs``, queued behind a blocker"""
+    gate = Gate()
+    try:
+        scheduler.submit(gate.job, 'blocker')
+        wait_until(lambda: gate.running == 1)
+        futures = [scheduler.submit(gate.job, name, **options) for name, options in jobs]
+        gate.release.set()
+        for future in futures:
+            future.result(5)
+        return gate.started[1:]
+    finally:
+        gate.release.set()
+        scheduler.shutdown()
+
+
+def test_cancelled_queued_job_gives_its_place_back():
+    scheduler = RenderScheduler(max_workers=1, max_queue=1, tenant_max_queued=1)
+    gate = Gate()
+    try:
+        running = scheduler.submit(gate.job, tenant='a')
+        wait_until(lambda: gate.running == 1)
+        queued = scheduler.submit(gate.job, tenant='a')
+        assert scheduler.cancel(queued)
+        assert not queued.done()
+        assert scheduler.stats()['queued'] == 0
+        assert scheduler.stats()['tenants']['a']['queued'] == 0
+        # Neither the queue nor the tenant's share is full any more
+        scheduler.submit(gate.job, 'next', tenant='a')
+        assert not scheduler.cancel(running)
+        gate.release.set()
+        assert running.result(5) is None
+    finally:
+        gate.release.set()
+        scheduler.shutdown()
+
+
+def test_job_manager_cancel_frees_the_queue():
+    from jobs import JobManager
+
+    scheduler = RenderScheduler(max_workers=1, max_queue=1)
+    job_manager = JobManager(scheduler)
+    gate = Gate()
+    try:
+        scheduler.submit(gate.job)
+        wait_until(lambda: gate.running == 1)
+        job = job_manager.submit({'code': 'x = 1'}, lambda job: {'success': True})
+        with pytest.raises(SchedulerFullError):
+            job_manager.submit({'code': 'x = 2'}, lambda job: {'success': True})
+        job_manager.cancel(job.id)
+        assert job.status == 'cancelled'
+        assert job.future.result(1)['cancelled']
+        later = job_manager.submit({'code': 'x = 2'}, lambda job: {'success': True})
+        gate.release.set()
+        assert later.future.result(5)['success']
+    finally:
+        gate.release.set()
+        scheduler.shutdown()
+
+def test_sjf_runs_shortest_estimate_first():
+    scheduler = RenderScheduler(max_workers=1, max_queue=10, policy='sjf', aging=0)
+    order = run_in_order(scheduler, [
+        ('long', {'estimated_seconds': 30}),
+        ('short', {'estimated_seconds': 1}),
+        ('medium', {'estimated_seconds': 5}),
+        # Counts as instant
+        ('unknown', {}),
+    ])
+    assert order == ['unknown', 'short', 'medium', 'long']
+
+
+def test_sjf_aging_lets_long_waiting_jobs_ahead():
+    scheduler = RenderScheduler(max_workers=1, max_queue=10, policy='sjf', aging=100)
+    gate = Gate()
+    try:
+        scheduler.submit(gate.job, 'blocker')
+        wait_until(lambda: gate.running == 1)
+        futures = [scheduler.submit(gate.job, 'long', estimated_seconds=10)]
+        time.sleep(0.2)
+        # 0.2s of waiting at 100s per second outweighs the 9s difference
+        futures.append(scheduler.submit(gate.job, 'short', estimated_seconds=1))
+        gate.release.set()
+        for future in futures:
+            future.result(5)
+        assert gate.started[1:] == ['long', 'short']
+    finally:
+        gate.release.set()
+        scheduler.shutdown()
+
+
+def test_edf_runs_earliest_deadline_first():
+    scheduler = RenderScheduler(max_workers=1, max_queue=10, policy='edf')
+    now = time.time()
+    order = run_in_order(scheduler, [
+        ('whenever', {}),
+        ('later', {'deadline': now + 60}),
+        ('soon', {'deadline': now + 10}),
+    ])
+    assert order == ['soon', 'later', 'whenever']
+
+
+def test_fifo_ignores_estimates_and_deadlines():
+    scheduler = RenderScheduler(max_workers=1, max_queue=10)
+    order = run_in_order(scheduler, [
+        ('first', {'estimated_seconds': 30}),
+        ('second', {'deadline': time.time() + 1}),
+        ('third', {'estimated_seconds': 1}),
+    ])
+    assert order == ['first', 'second', 'third']
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The API with a one-slot scheduler and no queue, so a second render is turned away"""
+    pytest.importorskip("dotenv")
+    from fastapi.testclient import TestClient
+    import main
+    from jobs import JobManager
+
+    scheduler = RenderScheduler(max_workers=1, max_queue=0, tenant_max_queued=0)
+    monkeypatch.setattr(main, "scheduler", scheduler)
+    monkeypatch.setattr(main, "job_manager", JobManager(scheduler))
+    gate = Gate()
+    yield TestClient(main.app), scheduler, gate
+    gate.release.set()
+    scheduler.shutdown()
+
+
+def test_busy_server_answers_503_with_retry_after(client):
+    client, scheduler, gate = client
+    scheduler.submit(gate.job)
+    wait_until(lambda: gate.running == 1)
+    for endpoint in ("/execute", "/jobs"):
+        response = client.post(endpoint, json={'code': "from manim import *\nclass A(Scene):\n    pass\n"})
+        assert response.status_code == 503, endpoint
+        assert response.headers['Retry-After']
+
+
+def test_tenant_over_its_share_answers_429(client, monkeypatch):
+    client, scheduler, gate = client
+    scheduler.max_queue = 5
+    scheduler.tenant_max_queued = 1
+    scheduler.submit(gate.job)
+    wait_until(lambda: gate.running == 1)
+    body = {'code': "from manim import *\nclass A(Scene):\n    pass\n", 'user_id': 'u1', 'use_cache': False}
+    assert client.post("/jobs", json=body).status_code == 202
+    response = client.post("/jobs", json=dict(body, code=body['code'] + "# another render\nx = 1\n"))
+    assert response.status_code == 429
+    assert response.headers['Retry-After']
+
+
+
+def test_only_requests_with_the_same_timeout_are_coalesced(client):
+    client, scheduler, gate = client
+    scheduler.max_queue = 5
+    scheduler.submit(gate.job)
+    wait_until(lambda: gate.running == 1)
+    body = {'code': "from manim import *\nclass A(Scene):\n    pass\n", 'use_cache': False, 'timeout': 60}
+    first = client.post("/jobs", json=body).json()['job_id']
+    assert client.post("/jobs", json=body).json()['job_id'] == first
+    # A shorter deadline must not be inherited, nor a longer one cut short
+    assert client.post("/jobs", json=dict(body, timeout=30)).json()['job_id'] != first
+
+
+def test_previews_are_only_coalesced_with_previews(client):
+    client, scheduler, gate = client
+    scheduler.max_queue = 5
+    scheduler.submit(gate.job)
+    wait_until(lambda: gate.running == 1)
+    body = {'code': "from manim import *\nclass A(Scene):\n    pass\n", 'use_cache': False, 'quality': 'draft'}
+
+    def submit(**fields):
+        job = client.post("/jobs", json=dict(body, **fields)).json()
+        return client.get(job['status_url']).json()
+
+    plain = submit()
+    # The draft of a preview renders the same video, but a final render has to follow it
+    preview = submit(quality='high', preview=True)
+    assert preview['job_id'] != plain['job_id']
+    assert preview['followup_job_id'] is not None
+    assert plain['followup_job_id'] is None
+    again = submit(quality='high', preview=True)
+    assert again['job_id'] == preview['job_id']
+    assert again['followup_job_id'] == preview['followup_job_id']
+
+
+def test_execute_does_not_use_up_the_anonymous_share(client):
+    client, scheduler, gate = client
+    scheduler.max_queue = 5
+    scheduler.tenant_max_queued = 1
+    scheduler.submit(gate.job)
+    wait_until(lambda: gate.running == 1)
+    # A render without a user or conversation already fills the anonymous share
+    scheduler.submit(gate.job)
+    responses = []
+    thread = threading.Thread(
+        target=lambda: responses.append(client.post("/execute", json={'code': "print('hi')", 'timeout': 10}))
+    )
+    thread.start()
+    wait_until(lambda: scheduler.stats()['tenants'].get('/execute', {}).get('queued') == 1)
+    gate.release.set()
+    thread.join(30)
+    assert responses[0].status_code == 200
+    assert responses[0].json()['output'].strip() == 'hi'
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
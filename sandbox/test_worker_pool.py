@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Tests for the pre-warmed worker pool
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+import pytest
+
+from app import worker
+from app.worker import CodeExecutor, JobWatch, WorkerPool
+from app.job_hooks import read_events
+
+EVENT_SCRIPT = """
+import time
+import job_hooks
+job_hooks.record_event('marker', job={job})
+time.sleep({sleep})
+"""
+
+
+def write_job(job: int, sleep: float = 0) -> str:
+    """A job directory holding a script that records one event"""
+    job_dir = tempfile.mkdtemp(prefix="pool-test-")
+    with open(os.path.join(job_dir, "main.py"), "w") as f:
+        f.write(EVENT_SCRIPT.format(job=job, sleep=sleep))
+    return job_dir
+
+
+def run(pool: WorkerPool, job_dir: str, timeout: float, results: dict, key) -> None:
+    results[key] = pool.run(os.path.join(job_dir, "main.py"), job_dir, JobWatch(job_dir, timeout))
+
+
+def test_pooled_jobs_write_their_own_events():
+    """Each forked job records events in its own directory, not the worker's cwd"""
+    pool = WorkerPool(2)
+    try:
+        job_dirs = [write_job(0, sleep=0.5), write_job(1, sleep=0.5)]
+        results = {}
+        threads = [
+            threading.Thread(target=run, args=(pool, job_dir, 30, results, i)) for i, job_dir in enumerate(job_dirs)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i, job_dir in enumerate(job_dirs):
+            assert results[i]['returncode'] == 0, results[i]['stderr']
+            assert [event['job'] for event in read_events(job_dir)] == [i]
+    finally:
+        pool.shutdown()
+
+
+def test_waiting_for_a_busy_pool_counts_against_the_timeout():
+    """A job that cannot get a worker in time comes back timed out instead of waiting forever"""
+    pool = WorkerPool(1)
+    try:
+        busy_dir = write_job(0, sleep=5)
+        results = {}
+        busy = threading.Thread(target=run, args=(pool, busy_dir, 30, results, 'busy'))
+        busy.start()
+        time.sleep(0.5)
+
+        waiting_dir = write_job(1)
+        start = time.time()
+        run(pool, waiting_dir, 1, results, 'waiting')
+        assert time.time() - start < 3
+        assert results['waiting']['timed_out']
+        assert results['waiting']['returncode'] != 0
+        # It never ran
+        assert read_events(waiting_dir) == []
+
+        busy.join()
+        assert results['busy']['returncode'] == 0
+    finally:
+        pool.shutdown()
+
+
+TWO_SCENES = """
+from manim import *
+
+class First(Scene):
+    def construct(self):
+        self.add(Circle())
+
+class Second(Scene):
+    def construct(self):
+        self.add(Square())
+"""
+
+
+def test_scenes_fan_out_over_idle_workers_only():
+    """A job with several scenes never takes more workers than are idle"""
+    pytest.importorskip("manim")
+    pool = WorkerPool(2)
+    executor = CodeExecutor(output_dir=tempfile.mkdtemp(prefix="pool-test-out-"), pool=pool)
+    try:
+        assert CodeExecutor(output_dir=executor.output_dir).fan_out_width(4) == 4
+        assert executor.fan_out_width(4) == 2
+        busy_dir = write_job(0, sleep=3)
+        results = {}
+        busy = threading.Thread(target=run, args=(pool, busy_dir, 30, results, 'busy'))
+        busy.start()
+        time.sleep(0.5)
+        assert executor.fan_out_width(4) == 1
+
+        # The second scene waits for the first one's worker
+        result = executor.execute_code(TWO_SCENES, timeout=60, is_manim=True)
+        assert result['success'], result['error']
+        assert [scene['success'] for scene in result['scenes']] == [True, True]
+        busy.join()
+    finally:
+        pool.shutdown()
+
+
+ONE_SCENE = """
+from manim import *
+
+class Long(Scene):
+    def construct(self):
+        for _ in range(4):
+            self.play(Create(Circle()), run_time=0.5)
+"""
+
+
+def test_segments_are_capped_at_idle_workers(monkeypatch):
+    """A scene is not split into more segments than there are workers to render them"""
+    pytest.importorskip("manim")
+    monkeypatch.setattr(worker, "MAX_PARALLEL_SEGMENTS", 4)
+    monkeypatch.setattr(worker, "can_concat", lambda: True)
+    pool = WorkerPool(2)
+    executor = CodeExecutor(output_dir=tempfile.mkdtemp(prefix="pool-test-out-"), pool=pool)
+    planned = []
+
+    def prepare_segment_jobs(code, temp_dir, scene_name, segments, *args):
+        # Record the split without planning it; the scene then renders in one piece
+        planned.append(segments)
+        return []
+    monkeypatch.setattr(executor, "prepare_segment_jobs", prepare_segment_jobs)
+    try:
+        assert executor.execute_code(ONE_SCENE, timeout=60, is_manim=True, parallel_segments=4)['success']
+        busy_dir = write_job(0, sleep=3)
+        results = {}
+        busy = threading.Thread(target=run, args=(pool, busy_dir, 30, results, 'busy'))
+        busy.start()
+        time.sleep(0.5)
+        assert executor.execute_code(ONE_SCENE, timeout=60, is_manim=True, parallel_segments=4)['success']
+        assert planned == [2]
+        busy.join()
+    finally:
+        pool.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))